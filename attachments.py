@@ -0,0 +1,177 @@
+import hashlib
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Without Pillow images are attached as-is and only dropped
+    Image = None
+
+CACHE_DIR_NAME = ".email"
+FORMATS = {"jpeg": ("JPEG", ".jpg"), "webp": ("WEBP", ".webp")}
+# Approximate MIME headers and boundary per attached part
+PART_OVERHEAD = 300
+
+
+def file_digest(path: str, chunk_size: int = 64 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encoded_size(size: int) -> int:
+    """
+    Size of size raw bytes once base64-encoded in 76-char CRLF lines
+    """
+    return -(-size // 57) * 78
+
+
+def optimize_image(
+    path: str,
+    cache_dir: str,
+    max_dim: int,
+    quality: int,
+    image_format: str = "jpeg",
+    digest: Optional[str] = None,
+) -> str:
+    """
+    Return a copy of the image downscaled to max_dim and re-encoded at quality
+    Derived files are cached by source hash, so each variant is built once
+    The original is returned when it cannot be processed or is already smaller
+    Transparent images are flattened onto white for formats without alpha
+    """
+    if Image is None:
+        return path
+    pil_format, ext = FORMATS.get(image_format, FORMATS["jpeg"])
+    digest = digest or file_digest(path)
+    target = os.path.join(cache_dir, f"{digest[:32]}_{max_dim}_q{quality}{ext}")
+
+    if not os.path.exists(target):
+        try:
+            with Image.open(path) as img:
+                if getattr(img, "is_animated", False):
+                    return path  # Keep animations intact
+                img.thumbnail((max_dim, max_dim))
+                if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+                    img = img.convert("RGBA")
+                    if pil_format == "JPEG":
+                        background = Image.new("RGB", img.size, (255, 255, 255))
+                        background.paste(img, mask=img.getchannel("A"))
+                        img = background
+                elif img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                os.makedirs(cache_dir, exist_ok=True)
+                temp_path = target + ".tmp"
+                img.save(temp_path, pil_format, quality=quality, optimize=True)
+                os.replace(temp_path, target)
+        except Exception as e:
+            logging.warning(f"Could not optimize image {path}: {str(e)}")
+            return path
+    else:
+        # Reuse keeps the variant out of prune_variants' reach
+        os.utime(target)
+
+    if os.path.getsize(target) >= os.path.getsize(path):
+        return path
+    return target
+
+
+def prune_variants(cache_dir: str, max_age_days: float) -> int:
+    """
+    Delete derived images not built or reused in the last max_age_days
+    Returns how many files were removed
+    """
+    cutoff = time.time() - max_age_days * 86400
+    try:
+        names = os.listdir(cache_dir)
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for name in names:
+        path = os.path.join(cache_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            logging.warning(f"Could not prune {path}: {str(e)}")
+    return removed
+
+
+def plan_attachments(
+    local_images: List[str],
+    html_size: int,
+    max_bytes: Optional[int] = None,
+    max_dim: Optional[int] = None,
+    quality: Optional[int] = None,
+    image_format: Optional[str] = None,
+) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Choose what to attach for each image so the message fits the size budget
+    local_images is in tweet rank order; when over budget the lowest-ranked
+    images are degraded first, then dropped
+    html_size is the HTML body's size in bytes
+    Returns ({original_path: attachment_path}, dropped_paths)
+    Originals in the vault are never modified; variants unused for
+    EMAIL_CACHE_DAYS are pruned from the cache
+    """
+    max_bytes = max_bytes or int(os.getenv("EMAIL_MAX_BYTES", str(20 * 1024 * 1024)))
+    max_dim = max_dim or int(os.getenv("EMAIL_IMAGE_MAX_DIM", "1600"))
+    quality = quality or int(os.getenv("EMAIL_IMAGE_QUALITY", "80"))
+    image_format = image_format or os.getenv("EMAIL_IMAGE_FORMAT", "jpeg").lower()
+
+    # Progressively smaller variants, the first one is applied to every image
+    ladder = [
+        (max_dim, quality),
+        (max_dim * 3 // 4, max(quality - 20, 30)),
+        (max_dim // 2, max(quality - 40, 25)),
+    ]
+    digests = {}
+
+    def variant(path: str, level: int) -> str:
+        if path not in digests:
+            digests[path] = file_digest(path)
+        cache_dir = os.path.join(os.path.dirname(path), CACHE_DIR_NAME)
+        dim, q = ladder[level]
+        return optimize_image(path, cache_dir, dim, q, image_format, digests[path])
+
+    def cost(attached: str) -> int:
+        return encoded_size(os.path.getsize(attached)) + PART_OVERHEAD
+
+    chosen = {path: variant(path, 0) for path in local_images}
+    total = html_size * 4 // 3 + sum(cost(attached) for attached in chosen.values())
+    dropped = []
+
+    if Image is not None:
+        for path in reversed(local_images):
+            level = 0
+            while total > max_bytes and level + 1 < len(ladder):
+                level += 1
+                smaller = variant(path, level)
+                saved = cost(chosen[path]) - cost(smaller)
+                if saved > 0:
+                    total -= saved
+                    chosen[path] = smaller
+            if total <= max_bytes:
+                break
+
+    for path in reversed(local_images):
+        if total <= max_bytes:
+            break
+        total -= cost(chosen.pop(path))
+        dropped.append(path)
+
+    if dropped:
+        logging.warning(f"Dropped {len(dropped)} images to fit the email size budget")
+
+    max_age_days = float(os.getenv("EMAIL_CACHE_DAYS", "7"))
+    cache_dirs = {
+        os.path.join(os.path.dirname(p), CACHE_DIR_NAME) for p in local_images
+    }
+    for cache_dir in cache_dirs:
+        prune_variants(cache_dir, max_age_days)
+    return chosen, dropped
@@ -0,0 +1,442 @@
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import markdown
+
+import pipeline
+import processor
+from html_cache import HtmlCache, markdown_to_html
+from metrics import METRICS_DIR
+from pipeline import HtmlBuilder
+from fetcher import iter_tweets_stream, parse_tweets
+from notifier import iter_message_bytes, rewrite_image_sources
+from renderer import render_markdown
+from search_index import SearchIndex
+from synthetic import make_timeline
+from vault import note_filename
+
+BENCHMARKS: Dict[str, Callable[[int], Dict]] = {}
+DEFAULT_COUNTS = (20, 1000, 100000)
+# Kept with the run metrics, which git ignores
+HISTORY_PATH = os.path.join(METRICS_DIR, "benchmark_history.json")
+# A result slower than this multiple of its recent median counts as a regression
+DEFAULT_THRESHOLD = 1.5
+THRESHOLDS = {
+    # Tiny inputs finish in microseconds and are dominated by timer noise
+    20: 3.0,
+}
+# Runs of history each result is compared against
+HISTORY_WINDOW = 5
+# Distinct image files attached when measuring MIME building
+MIME_IMAGES = 20
+
+
+def benchmark(name: str):
+    """
+    Register a benchmark taking the tweet count and returning its measurements
+    """
+
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return register
+
+
+def repeat_for(count: int) -> int:
+    # Large inputs take seconds per run, where one run is already stable
+    return 3 if count <= 1000 else 1
+
+
+def best_of(func: Callable, repeat: int = 3) -> float:
+    """
+    Return the fastest wall-clock time in seconds over `repeat` runs
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory_mb(func: Callable) -> float:
+    """
+    Return the peak Python heap allocated while running func, in MB
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+@benchmark("parse_tweets")
+def bench_parse_tweets(count: int) -> Dict:
+    body = json.dumps(make_timeline(count)).encode("utf-8")
+
+    def run():
+        # Decode the whole body first, as response.json() does
+        for _ in parse_tweets(json.loads(body)):
+            pass
+
+    seconds = best_of(run, repeat_for(count))
+    return {
+        "seconds": seconds,
+        "per_tweet_us": seconds / count * 1e6,
+        "peak_mb": peak_memory_mb(run),
+    }
+
+
+@benchmark("parse_stream")
+def bench_parse_stream(count: int) -> Dict:
+    body = json.dumps(make_timeline(count)).encode("utf-8")
+
+    def run():
+        for _ in iter_tweets_stream(io.BytesIO(body)):
+            pass
+
+    seconds = best_of(run, repeat_for(count))
+    return {
+        "seconds": seconds,
+        "per_tweet_us": seconds / count * 1e6,
+        "peak_mb": peak_memory_mb(run),
+    }
+
+
+class CountingSink:
+    """
+    Sink that only counts characters, so rendering is measured without storage
+    """
+
+    def __init__(self):
+        self.chars = 0
+
+    def write(self, fragment: str) -> int:
+        self.chars += len(fragment)
+        return len(fragment)
+
+
+def render_items(count: int):
+    tweets = parse_tweets(make_timeline(count))
+    return [
+        (
+            tweet,
+            tweet["text"],
+            [f"images/img_{i}.jpg" for i in range(len(tweet["images"]))],
+        )
+        for tweet in tweets
+    ]
+
+
+@benchmark("render_markdown")
+def bench_render_markdown(count: int) -> Dict:
+    items = render_items(count)
+    seconds = best_of(lambda: render_markdown(items, CountingSink()), repeat_for(count))
+    return {
+        "seconds": seconds,
+        "per_tweet_us": seconds / count * 1e6,
+        "peak_mb": peak_memory_mb(lambda: render_markdown(items, CountingSink())),
+    }
+
+
+@contextmanager
+def stubbed_backends(image_dir: str):
+    """
+    Replace the translation backend and image downloads with local stand-ins,
+    so the pipeline is measured without network access
+    Texts still go through caching, batching and splitting as usual
+    """
+    translate_backend = processor._translate_backend
+    download_image = pipeline.download_image
+    translation_cache = os.environ.get("TRANSLATION_CACHE")
+
+    def download(url, save_dir, *args, **kwargs):
+        return processor.DownloadResult(
+            url, os.path.join(image_dir, os.path.basename(url))
+        )
+
+    processor._translate_backend = str.upper
+    pipeline.download_image = download
+    os.environ["TRANSLATION_CACHE"] = "off"
+    try:
+        yield
+    finally:
+        processor._translate_backend = translate_backend
+        pipeline.download_image = download_image
+        if translation_cache is None:
+            os.environ.pop("TRANSLATION_CACHE", None)
+        else:
+            os.environ["TRANSLATION_CACHE"] = translation_cache
+
+
+def sample_markdown(count: int) -> str:
+    buffer = io.StringIO()
+    render_markdown(render_items(count), buffer)
+    return buffer.getvalue()
+
+
+@benchmark("generate_markdown")
+def bench_generate_markdown(count: int) -> Dict:
+    tweets = parse_tweets(make_timeline(count))
+    with tempfile.TemporaryDirectory() as vault, stubbed_backends(vault):
+
+        def run():
+            # The translate, download and render pipeline main runs
+            pipeline.generate_markdown(tweets, vault)
+
+        seconds = best_of(run, repeat_for(count))
+        return {
+            "seconds": seconds,
+            "per_tweet_us": seconds / count * 1e6,
+            "peak_mb": peak_memory_mb(run),
+        }
+
+
+@benchmark("html_convert")
+def bench_html_convert(count: int) -> Dict:
+    items = render_items(count)
+
+    def run():
+        # Fragment by fragment, as main converts the digest for the email
+        html_builder = HtmlBuilder()
+        render_markdown(items, html_builder)
+        html_builder.close()
+
+    seconds = best_of(run, repeat_for(count))
+    return {"seconds": seconds, "per_tweet_us": seconds / count * 1e6}
+
+
+@benchmark("html_cached")
+def bench_html_cached(count: int) -> Dict:
+    items = render_items(count)
+    buffer = io.StringIO()
+    render_markdown(items, buffer)
+    content = buffer.getvalue()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Resending a digest whose fragments were converted for the vault note
+        cache = HtmlCache(os.path.join(tmp, "html.sqlite"), max_entries=2 * count)
+        markdown_to_html(content, cache)
+        seconds = best_of(lambda: markdown_to_html(content, cache), repeat_for(count))
+        cache.close()
+    return {"seconds": seconds, "per_tweet_us": seconds / count * 1e6}
+
+
+@benchmark("mime_build")
+def bench_mime_build(count: int) -> Dict:
+    # Tile the body from a 1k tweet digest, converting 100k tweets is measured above
+    sample = min(count, 1000)
+    html_content = markdown.markdown(sample_markdown(sample)) * (count // sample)
+    with tempfile.TemporaryDirectory() as image_dir:
+        local_images = []
+        for idx in range(min(count, MIME_IMAGES)):
+            path = os.path.join(image_dir, f"img_{idx}.jpg")
+            with open(path, "wb") as f:
+                f.write(os.urandom(256 * 1024))
+            local_images.append(path)
+        headers = [("From", "a@example.com"), ("To", "b@example.com")]
+
+        def run():
+            html = rewrite_image_sources(html_content, local_images)
+            for _ in iter_message_bytes(headers, html, local_images):
+                pass
+
+        seconds = best_of(run)
+        return {
+            "seconds": seconds,
+            "images": len(local_images),
+            "peak_mb": peak_memory_mb(run),
+        }
+
+
+@benchmark("search_index")
+def bench_search_index(count: int) -> Dict:
+    items = render_items(count)
+    per_note = 20
+    with tempfile.TemporaryDirectory() as vault:
+        # One note per day of per_note tweets, like the daily job writes
+        start = datetime(2020, 1, 1)
+        for day, offset in enumerate(range(0, len(items), per_note)):
+            date = (start + timedelta(days=day)).strftime("%Y-%m-%d")
+            with open(
+                os.path.join(vault, note_filename(date)), "w", encoding="utf-8"
+            ) as f:
+                render_markdown(items[offset : offset + per_note], f, date)
+
+        index = SearchIndex(vault)
+        try:
+            build = best_of(index.update, 1)
+            # A second update only stats the notes
+            incremental = best_of(index.update, 1)
+            # A selective term, like looking up one author or topic
+            query = best_of(lambda: index.search("user7", limit=20))
+            # Synthetic texts share ten words, so this ranks every tweet
+            common = best_of(
+                lambda: index.search("market", min_likes=100000, order="likes")
+            )
+        finally:
+            index.close()
+    return {
+        "seconds": query,
+        "build_seconds": build,
+        "update_seconds": incremental,
+        "common_query_ms": common * 1e3,
+    }
+
+
+def check_render_scaling(small: int = 1000, large: int = 10000, slack: float = 2.0):
+    """
+    Rendering large digests must stay linear: time and peak memory per tweet at
+    `large` may not exceed `slack` times the per-tweet cost at `small`
+    """
+    results = {n: bench_render_markdown(n) for n in (small, large)}
+    ratio = results[large]["per_tweet_us"] / results[small]["per_tweet_us"]
+    # Streaming to a sink keeps the peak flat instead of growing with the digest
+    memory_ratio = results[large]["peak_mb"] / max(results[small]["peak_mb"], 1e-3)
+    logging.info(
+        f"render scaling {small}->{large}: time/tweet x{ratio:.2f}, "
+        f"peak memory x{memory_ratio:.2f}"
+    )
+    return ratio <= slack and memory_ratio <= slack * large / small
+
+
+def environment() -> str:
+    # Timings are only comparable between runs on the same interpreter and machine
+    return " ".join(
+        (
+            platform.python_implementation(),
+            platform.python_version(),
+            platform.machine(),
+        )
+    )
+
+
+def load_history(path: str) -> List[Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def find_regressions(
+    results: Dict[str, Dict[str, Dict]],
+    history: List[Dict],
+    threshold: Optional[float] = None,
+    window: int = HISTORY_WINDOW,
+) -> List[str]:
+    """
+    Compare each result against the median of its last `window` recorded runs
+    from the same environment and describe the ones slower than the threshold
+    """
+    runs = [run for run in history if run.get("environment") == environment()]
+    regressions = []
+    for name, by_count in results.items():
+        for count, result in by_count.items():
+            past = [
+                run["results"][name][count]["seconds"]
+                for run in runs
+                if count in run["results"].get(name, {})
+            ][-window:]
+            if not past:
+                continue
+            baseline = statistics.median(past)
+            # An explicit threshold applies to every size
+            limit = threshold or THRESHOLDS.get(int(count), DEFAULT_THRESHOLD)
+            if result["seconds"] > baseline * limit:
+                regressions.append(
+                    f"{name} [{count} tweets]: {result['seconds']:.4f}s vs "
+                    f"median {baseline:.4f}s (limit x{limit})"
+                )
+    return regressions
+
+
+def record_run(path: str, history: List[Dict], results: Dict, regressions: List[str]):
+    history.append(
+        {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "environment": environment(),
+            "results": results,
+            "regressions": regressions,
+        }
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=1)
+    os.replace(temp_path, path)
+
+
+def run_benchmarks(counts, names=None) -> Dict[str, Dict[str, Dict]]:
+    results = {}
+    for count in counts:
+        for name, func in BENCHMARKS.items():
+            if names and name not in names:
+                continue
+            result = func(count)
+            results.setdefault(name, {})[str(count)] = result
+            details = ", ".join(f"{k}={v:.3f}" for k, v in result.items())
+            logging.info(f"{name} [{count} tweets]: {details}")
+    return results
+
+
+def main(
+    counts=DEFAULT_COUNTS,
+    names=None,
+    history_path: Optional[str] = HISTORY_PATH,
+    threshold: Optional[float] = None,
+) -> int:
+    """
+    Run the benchmarks, append them to the history file and return the exit
+    status: 1 when a benchmark regressed or rendering stopped scaling linearly
+    """
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    results = run_benchmarks(counts, names)
+
+    status = 0
+    regressions = []
+    if history_path:
+        history = load_history(history_path)
+        regressions = find_regressions(results, history, threshold)
+        record_run(history_path, history, results, regressions)
+    for regression in regressions:
+        logging.error(f"Regression: {regression}")
+        status = 1
+
+    if not names or "render_markdown" in names:
+        if not check_render_scaling():
+            logging.error("render_markdown no longer scales linearly")
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Daily Pulse benchmarks")
+    parser.add_argument("counts", nargs="*", type=int, default=DEFAULT_COUNTS)
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS))
+    parser.add_argument("--history", default=HISTORY_PATH)
+    parser.add_argument("--no-history", action="store_true")
+    parser.add_argument("--threshold", type=float)
+    args = parser.parse_args()
+    sys.exit(
+        main(
+            args.counts,
+            args.only,
+            None if args.no_history else args.history,
+            args.threshold,
+        )
+    )
@@ -0,0 +1,97 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+
+from vault import run_id
+
+RUNS_DIR = ".runs"
+# Stage outputs in pipeline order, a rerun resumes from the first one missing
+STAGES = ("tweets", "translations", "images", "note", "email")
+SNAPSHOT_NAME = "response.json.gz"
+
+
+class RunCheckpoint:
+    """
+    Gzipped JSON outputs of each stage of one day's run, kept in
+    <obsidian_dir>/.runs/<run date>[-<HHMM slot>]/<stage>.json.gz
+    Every file is written atomically, so a crash never leaves a partial stage
+    """
+
+    def __init__(
+        self,
+        obsidian_dir: str,
+        run_date: Optional[str] = None,
+        slot: Optional[str] = None,
+    ):
+        self.runs_dir = os.path.join(obsidian_dir, RUNS_DIR)
+        self.run_date = run_date or datetime.now().strftime("%Y-%m-%d")
+        self.slot = slot
+        self.run_id = run_id(self.run_date, slot)
+        self.path = os.path.join(self.runs_dir, self.run_id)
+
+    def stage_path(self, stage: str) -> str:
+        return os.path.join(self.path, f"{stage}.json.gz")
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.path, SNAPSHOT_NAME)
+
+    def done(self, stage: str) -> bool:
+        return os.path.exists(self.stage_path(stage))
+
+    def load(self, stage: str, default: Any = None) -> Any:
+        """
+        Return the stage's saved output, or default if it is missing or unreadable
+        """
+        try:
+            with gzip.open(self.stage_path(stage), "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable checkpoint {stage}: {str(e)}")
+            return default
+
+    def save(self, stage: str, data: Any):
+        os.makedirs(self.path, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=self.path, suffix=".tmp", delete=False
+        ) as raw:
+            with gzip.open(raw, "wt", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(raw.name, self.stage_path(stage))
+
+    def clear(self, stages: Optional[List[str]] = None):
+        """
+        Forget the given stages, or the whole run
+        """
+        for stage in stages or STAGES:
+            try:
+                os.remove(self.stage_path(stage))
+            except FileNotFoundError:
+                pass
+
+    def resume_stage(self) -> Optional[str]:
+        """
+        First stage without saved output, None when the run already completed
+        """
+        return next((stage for stage in STAGES if not self.done(stage)), None)
+
+    def prune(self, keep_days: int):
+        """
+        Delete run directories older than keep_days
+        """
+        cutoff = (datetime.now() - timedelta(days=keep_days)).strftime("%Y-%m-%d")
+        try:
+            names = os.listdir(self.runs_dir)
+        except FileNotFoundError:
+            return
+        for name in names:
+            # Run directories start with the ISO date, so they sort chronologically
+            if name < cutoff and name != self.run_id:
+                shutil.rmtree(os.path.join(self.runs_dir, name), ignore_errors=True)
@@ -0,0 +1,301 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from dotenv import load_dotenv
+
+STATUS_NAME = ".daemon_status.json"
+DEFAULT_TIMES = "08:00"
+
+
+class Job(NamedTuple):
+    name: str
+    times: List[str]  # HH:MM, local time
+    run: Callable[[], bool]
+
+
+def parse_time(value: str) -> timedelta:
+    """
+    Offset from midnight of an HH:MM time
+    """
+    parsed = datetime.strptime(value.strip(), "%H:%M")
+    return timedelta(hours=parsed.hour, minutes=parsed.minute)
+
+
+def next_run(times: List[str], after: datetime) -> datetime:
+    """
+    First of the daily times strictly after the given moment
+    """
+    midnight = after.replace(hour=0, minute=0, second=0, microsecond=0)
+    return min(
+        midnight + day + parse_time(value)
+        for day in (timedelta(0), timedelta(days=1))
+        for value in times
+        if midnight + day + parse_time(value) > after
+    )
+
+
+class Daemon:
+    """
+    Runs jobs at their daily times in one long-lived process
+
+    Everything kept at module level survives between runs: the pooled HTTP
+    session, translation caches, seen indexes and imported modules. Runs
+    happen one at a time; a run that overlaps a later slot absorbs it.
+    Health and last-run results are written to a JSON status file, refreshed
+    every poll seconds even while a job is running.
+    """
+
+    def __init__(
+        self,
+        jobs: List[Job],
+        status_path: str,
+        poll: float = 30.0,
+        clock: Callable[[], datetime] = datetime.now,
+    ):
+        self.jobs = jobs
+        self.status_path = status_path
+        self.poll = poll
+        self._clock = clock
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        now = clock()
+        self.status: Dict = {
+            "pid": os.getpid(),
+            "started": now.isoformat(timespec="seconds"),
+            "heartbeat": None,
+            "poll": poll,
+            "running": None,
+            "jobs": {
+                job.name: {
+                    "times": job.times,
+                    "next_run": next_run(job.times, now).isoformat(),
+                    "runs": 0,
+                    "failures": 0,
+                    "last_run": None,
+                }
+                for job in jobs
+            },
+        }
+
+    def write_status(self):
+        with self._lock:
+            self.status["heartbeat"] = self._clock().isoformat(timespec="seconds")
+            os.makedirs(
+                os.path.dirname(os.path.abspath(self.status_path)), exist_ok=True
+            )
+            temp_path = self.status_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.status, f, indent=2)
+            os.replace(temp_path, self.status_path)
+
+    def run_job(self, job: Job) -> bool:
+        state = self.status["jobs"][job.name]
+        started = self._clock()
+        with self._lock:
+            self.status["running"] = job.name
+        self.write_status()
+        logging.info(f"Daemon starting {job.name}")
+        error = None
+        timer = time.perf_counter()
+        try:
+            ok = bool(job.run())
+        except Exception as e:
+            logging.error(f"Daemon job {job.name} failed: {str(e)}")
+            ok, error = False, str(e)
+        duration = time.perf_counter() - timer
+
+        finished = self._clock()
+        with self._lock:
+            self.status["running"] = None
+            state["runs"] += 1
+            state["failures"] += 0 if ok else 1
+            state["next_run"] = next_run(job.times, finished).isoformat()
+            state["last_run"] = {
+                "started": started.isoformat(timespec="seconds"),
+                "finished": finished.isoformat(timespec="seconds"),
+                "seconds": round(duration, 3),
+                "ok": ok,
+                "error": error,
+            }
+        self.write_status()
+        logging.info(
+            f"Daemon finished {job.name} in {duration:.1f}s "
+            f"({'ok' if ok else 'failed'}), next run {state['next_run']}"
+        )
+        return ok
+
+    def run_pending(self) -> int:
+        """
+        Run every job whose time has come, returning how many ran
+        """
+        ran = 0
+        for job in self.jobs:
+            if self._stop.is_set():
+                break
+            due = datetime.fromisoformat(self.status["jobs"][job.name]["next_run"])
+            if self._clock() >= due:
+                self.run_job(job)
+                ran += 1
+        return ran
+
+    def seconds_to_next_run(self) -> float:
+        due = min(
+            datetime.fromisoformat(state["next_run"])
+            for state in self.status["jobs"].values()
+        )
+        return max(0.0, (due - self._clock()).total_seconds())
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.poll):
+            self.write_status()
+
+    def serve_forever(self, run_now: bool = False):
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+        self.write_status()
+        if run_now and self.jobs:
+            # Run the upcoming slot early rather than every slot at once
+            soonest = min(state["next_run"] for state in self.status["jobs"].values())
+            for job in self.jobs:
+                if self.status["jobs"][job.name]["next_run"] == soonest:
+                    self.run_job(job)
+        try:
+            while not self._stop.is_set():
+                self.run_pending()
+                self._stop.wait(min(self.poll, self.seconds_to_next_run()))
+        finally:
+            with self._lock:
+                self.status["stopped"] = self._clock().isoformat(timespec="seconds")
+            self.write_status()
+            logging.info("Daemon stopped")
+
+    def stop(self, *args):
+        self._stop.set()
+
+
+def check_status(status_path: str, now: Optional[datetime] = None) -> Optional[Dict]:
+    """
+    The daemon's status if its heartbeat is recent, None when it looks dead
+    """
+    try:
+        with open(status_path, "r", encoding="utf-8") as f:
+            status = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if status.get("stopped") or not status.get("heartbeat"):
+        return None
+    age = (now or datetime.now()) - datetime.fromisoformat(status["heartbeat"])
+    return status if age.total_seconds() <= 3 * status.get("poll", 30) else None
+
+
+def digest_jobs(times: List[str]) -> List[Job]:
+    """
+    One job for a single daily time, else one per slot, each keeping its own
+    checkpoint and note so a later slot is not taken for the completed day
+    """
+    # The pipeline is imported here, so --status answers without loading it
+    import main
+
+    if len(times) == 1:
+        return [Job("digest", times, main.main)]
+    return [
+        Job(f"digest@{value}", [value], partial(main.main, slot=value))
+        for value in times
+    ]
+
+
+def profile_jobs(config: str, times: List[str]) -> List[Job]:
+    """
+    One job per time slot, running the profiles scheduled then together so
+    they share fetching, translation and downloads
+    """
+    import profiles
+
+    slots: Dict[str, List[str]] = {}
+    for profile in profiles.load_profiles(config):
+        for value in profile.times or times:
+            slots.setdefault(value, []).append(profile.name)
+
+    def runner(names: List[str], value: str) -> Callable[[], bool]:
+        args = [arg for name in names for arg in ("--only", name)]
+        if len(slots) > 1:
+            # Several runs a day each write their own notes
+            args += ["--slot", value]
+        return lambda: profiles.main([config] + args) == 0
+
+    return [
+        Job(f"profiles@{value}", [value], runner(names, value))
+        for value, names in sorted(slots.items())
+    ]
+
+
+def main(argv=None) -> int:
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Run Daily Pulse on a schedule")
+    parser.add_argument(
+        "--times",
+        default=os.getenv("DAEMON_TIMES", DEFAULT_TIMES),
+        help="comma-separated HH:MM local times (DAEMON_TIMES)",
+    )
+    parser.add_argument(
+        "--profiles",
+        default=os.getenv("DAEMON_PROFILES"),
+        help="run the profiles in this file instead of the single digest",
+    )
+    parser.add_argument("--status-file", default=os.getenv("DAEMON_STATUS"))
+    parser.add_argument("--poll", type=float, default=30.0)
+    parser.add_argument(
+        "--run-now", action="store_true", help="run the next slot now, at start"
+    )
+    parser.add_argument(
+        "--status", action="store_true", help="print the daemon status and exit"
+    )
+    args = parser.parse_args(argv)
+
+    status_path = args.status_file
+    if not status_path:
+        if args.profiles:
+            base_dir = os.path.dirname(os.path.abspath(args.profiles))
+        else:
+            base_dir = os.getenv("OBSIDIAN_DIR") or "."
+        status_path = os.path.join(base_dir, STATUS_NAME)
+
+    if args.status:
+        status = check_status(status_path)
+        if status is None:
+            print(f"Daemon is not running (status file {status_path})")
+            return 1
+        print(json.dumps(status, indent=2))
+        return 0
+
+    times = [value.strip() for value in args.times.split(",") if value.strip()]
+    for value in times:
+        parse_time(value)
+    if args.profiles:
+        jobs = profile_jobs(args.profiles, times)
+    else:
+        jobs = digest_jobs(times)
+
+    daemon = Daemon(jobs, status_path, poll=args.poll)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    for job in jobs:
+        logging.info(f"Scheduled {job.name} at {', '.join(job.times)}")
+    daemon.serve_forever(run_now=args.run_now)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+import logging
+import os
+import queue
+import re
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, NamedTuple, Tuple
+
+from metrics import metrics
+from rate_limit import backoff_delay
+
+LINE_START_DOT = re.compile(rb"(?m)^\.")
+
+
+class DeliveryResult(NamedTuple):
+    recipient: str
+    ok: bool
+    error: str = ""
+    attempts: int = 1
+
+
+class SMTPPool:
+    """
+    Small pool of authenticated SMTP connections shared by delivery workers
+    Connections that fail are closed and replaced on the next checkout
+    """
+
+    def __init__(self, factory: Callable[[], smtplib.SMTP], size: int = 3):
+        self.factory = factory
+        self.size = size
+        self.created = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                server = self.factory()
+                with self._lock:
+                    self.created += 1
+            try:
+                yield server
+            except BaseException:
+                _close_quietly(server)
+                raise
+            self._idle.put(server)
+
+    def close(self):
+        while True:
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                server.quit()
+            except Exception:
+                _close_quietly(server)
+
+
+def sendmail_streamed(
+    server: smtplib.SMTP,
+    from_addr: str,
+    to_addrs: List[str],
+    chunks: Iterable[bytes],
+) -> Dict[str, Tuple[int, bytes]]:
+    """
+    sendmail() that streams the DATA section from chunks instead of one string
+    Chunks must end at line boundaries so dot-stuffing can work per chunk
+    Returns the refused recipients like sendmail() does
+    """
+    server.ehlo_or_helo_if_needed()
+    code, resp = server.mail(from_addr)
+    if code != 250:
+        _rset_quietly(server)
+        raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+
+    refused = {}
+    for addr in to_addrs:
+        code, resp = server.rcpt(addr)
+        if code not in (250, 251):
+            refused[addr] = (code, resp)
+    if len(refused) == len(to_addrs):
+        _rset_quietly(server)
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    code, resp = server.docmd("DATA")
+    if code != 354:
+        _rset_quietly(server)
+        raise smtplib.SMTPDataError(code, resp)
+
+    size = 0
+    for chunk in chunks:
+        chunk = LINE_START_DOT.sub(b"..", chunk)
+        server.send(chunk)
+        size += len(chunk)
+    server.send(b".\r\n")
+    metrics.incr("smtp.messages")
+    metrics.incr("smtp.bytes", size)
+
+    code, resp = server.getreply()
+    if code != 250:
+        _rset_quietly(server)
+        raise smtplib.SMTPDataError(code, resp)
+    return refused
+
+
+def _rset_quietly(server: smtplib.SMTP):
+    # The server may already have dropped the connection after an error reply
+    try:
+        server.rset()
+    except smtplib.SMTPServerDisconnected:
+        pass
+
+
+def _close_quietly(server: smtplib.SMTP):
+    try:
+        server.close()
+    except Exception:
+        pass
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Whether an SMTP failure is worth retrying: 4xx replies and dropped connections
+    """
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    # Dropped or timed out sockets; other OSErrors (a missing attachment, a
+    # permission error) fail the same way on every attempt
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+def batch_recipients(recipients: List[str], batch_size: int) -> List[List[str]]:
+    return [
+        recipients[start : start + batch_size]
+        for start in range(0, len(recipients), batch_size)
+    ]
+
+
+def deliver_batch(
+    pool: SMTPPool,
+    sender: str,
+    batch: List[str],
+    message_factory: Callable[[List[str]], Iterable[bytes]],
+    retries: int = 3,
+    backoff: float = 1.0,
+) -> Dict[str, DeliveryResult]:
+    """
+    Send one message to a batch of recipients, retrying transient failures
+    Recipients refused with a 4xx reply are retried, 5xx refusals are final
+    """
+    results = {}
+    pending = list(batch)
+    for attempt in range(retries + 1):
+        try:
+            with pool.connection() as server, metrics.timer("smtp.send"):
+                try:
+                    refused = sendmail_streamed(
+                        server, sender, pending, message_factory(pending)
+                    )
+                except smtplib.SMTPRecipientsRefused as e:
+                    refused = e.recipients
+        except Exception as e:
+            if attempt < retries and is_transient(e):
+                metrics.incr("smtp.retries")
+                logging.warning(f"Transient SMTP failure, retrying: {str(e)}")
+                time.sleep(backoff_delay(attempt, backoff))
+                continue
+            for recipient in pending:
+                results[recipient] = DeliveryResult(
+                    recipient, False, str(e), attempt + 1
+                )
+            return results
+
+        retry = []
+        for recipient in pending:
+            if recipient not in refused:
+                results[recipient] = DeliveryResult(recipient, True, "", attempt + 1)
+                continue
+            code, reply = refused[recipient]
+            if 400 <= code < 500 and attempt < retries:
+                retry.append(recipient)
+            else:
+                error = f"{code} {reply.decode('utf-8', 'replace')}"
+                results[recipient] = DeliveryResult(
+                    recipient, False, error, attempt + 1
+                )
+        if not retry:
+            return results
+        pending = retry
+        time.sleep(backoff_delay(attempt, backoff))
+    return results
+
+
+def deliver(
+    pool: SMTPPool,
+    sender: str,
+    recipients: List[str],
+    message_factory: Callable[[List[str]], Iterable[bytes]],
+    batch_size: int = 50,
+    max_workers: int = 3,
+    retries: int = 3,
+    backoff: float = 1.0,
+) -> Dict[str, DeliveryResult]:
+    """
+    Deliver a message to every recipient in concurrent batches of batch_size
+    message_factory builds a fresh message stream for each batch's recipients
+    Returns every recipient's DeliveryResult
+    """
+    recipients = list(dict.fromkeys(recipients))
+    batches = batch_recipients(recipients, batch_size)
+    if not batches:
+        return {}
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+        for batch_results in executor.map(
+            lambda batch: deliver_batch(
+                pool, sender, batch, message_factory, retries, backoff
+            ),
+            batches,
+        ):
+            results.update(batch_results)
+
+    failed = [result for result in results.values() if not result.ok]
+    for result in failed:
+        logging.error(f"Delivery to {result.recipient} failed: {result.error}")
+    logging.info(
+        f"Delivered to {len(results) - len(failed)}/{len(results)} recipients "
+        f"over {pool.created} connections"
+    )
+    return results
+
+
+def smtp_ssl_factory(host: str, port: int, user: str, password: str, timeout=60):
+    """
+    Connection factory opening and authenticating an SMTP_SSL session
+    """
+
+    def connect() -> smtplib.SMTP:
+        with metrics.timer("smtp.connect"):
+            server = smtplib.SMTP_SSL(host, port, timeout=timeout)
+            try:
+                server.login(user, password)
+            except Exception:
+                _close_quietly(server)
+                raise
+        return server
+
+    return connect
+
+
+def delivery_settings() -> Dict[str, int]:
+    return {
+        "batch_size": int(os.getenv("SMTP_MAX_RECIPIENTS", "50")),
+        "max_workers": int(os.getenv("SMTP_POOL_SIZE", "3")),
+        "retries": int(os.getenv("SMTP_RETRIES", "3")),
+    }
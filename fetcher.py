@@ -1,166 +1,463 @@
+import gzip
+import io
 import os
+import re
+import logging
+import ijson
 import requests
+import urllib3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional
 from dotenv import load_dotenv
+from http_client import get_session
+from metrics import metrics
+from near_duplicates import drop_near_duplicates
+from rate_limit import RequestScheduler, scheduler_from_env
 
 # Load environment variables
 load_dotenv()
 
+SEARCH_URL = "https://twitter241.p.rapidapi.com/search-v3"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def split_query(base_query: str, parts: int) -> List[str]:
+    """
+    Split a "(a OR b OR c) filters" query into up to `parts` narrower sub-queries
+    sharing the same trailing filters
+    """
+    match = re.match(r"^\s*\((.*)\)\s*(.*)$", base_query or "")
+    if parts <= 1 or not match:
+        return [base_query]
+
+    inner, filters = match.groups()
+    terms = [
+        term for term in re.findall(r'"[^"]*"|[^\s()]+', inner) if term.upper() != "OR"
+    ]
+    parts = min(parts, len(terms))
+    if parts <= 1:
+        return [base_query]
+
+    size = -(-len(terms) // parts)  # ceil division
+    queries = []
+    for start in range(0, len(terms), size):
+        group = " OR ".join(terms[start : start + size])
+        queries.append(f"({group}) {filters}".strip())
+    return queries
+
+
+def find_bottom_cursor(json_data) -> Optional[str]:
+    """
+    Locate the "Bottom" pagination cursor in a search response
+    """
+    cursor = json_data.get("cursor") if isinstance(json_data, dict) else None
+    if isinstance(cursor, dict) and cursor.get("bottom"):
+        return cursor["bottom"]
+
+    stack = [json_data]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, dict):
+            cursor_type = obj.get("cursor_type") or obj.get("cursorType")
+            if cursor_type == "Bottom" and obj.get("value"):
+                return obj["value"]
+            stack.extend(v for v in obj.values() if isinstance(v, (dict, list)))
+        elif isinstance(obj, list):
+            stack.extend(v for v in obj if isinstance(v, (dict, list)))
+    return None
+
+
+def fetch_page(
+    session: requests.Session,
+    query: str,
+    cursor: Optional[str] = None,
+    count: int = 20,
+    url: str = SEARCH_URL,
+    scheduler: Optional[RequestScheduler] = None,
+):
+    """
+    Request one page of search results, returns the unread streaming response or None
+    The scheduler paces the request, picks the API key and retries throttling
+    """
+    querystring = {"type": "Top", "count": count, "query": query}
+    if cursor:
+        querystring["cursor"] = cursor
+
+    headers = {"x-rapidapi-host": os.getenv("RAPIDAPI_HOST")}
+    scheduler = scheduler or scheduler_from_env()
+
+    metrics.incr("http.requests")
+    try:
+        # The scheduler times the request itself, apart from its waits
+        response = scheduler.request(
+            session,
+            url,
+            headers=headers,
+            params=querystring,
+            timeout=30,
+            stream=True,
+        )
+    except requests.RequestException as e:
+        metrics.incr("http.errors")
+        logging.error(f"Request failed for query {query!r}: {str(e)}")
+        return None
+
+    if response is None:
+        metrics.incr("http.errors")
+        return None
+    if response.status_code != 200:
+        metrics.incr("http.errors")
+        logging.error(
+            f"Search returned {response.status_code} for query {query!r}: "
+            f"{response.text}"
+        )
+        return None
+    return response
+
+
+def read_page(response: requests.Response, snapshot_path: Optional[str] = None):
+    """
+    Parse a search response into (tweets, bottom_cursor)
+    The body is parsed straight off the socket unless a snapshot is requested,
+    in which case the raw bytes are also saved gzipped to snapshot_path
+    """
+    with response, metrics.timer("http.read"):
+        response.raw.decode_content = True
+        body = response.raw
+        if snapshot_path:
+            body = io.BytesIO(response.raw.read())
+            os.makedirs(os.path.dirname(snapshot_path) or ".", exist_ok=True)
+            with gzip.open(snapshot_path, "wb") as f:
+                f.write(body.getbuffer())
+
+        state = {}
+        tweets = list(iter_tweets_stream(body, state))
+        # Bytes received on the wire, before content decoding
+        metrics.incr("http.bytes", response.raw.tell())
+        metrics.incr("http.tweets", len(tweets))
+        return tweets, state.get("cursor")
+
+
+def fetch_query(
+    session: requests.Session,
+    query: str,
+    target_count: int,
+    cutoff: Optional[datetime] = None,
+    page_size: int = 20,
+    max_pages: int = 50,
+    url: str = SEARCH_URL,
+    snapshot_path: Optional[str] = None,
+    scheduler: Optional[RequestScheduler] = None,
+    exclude: Optional[Callable[[Dict], bool]] = None,
+) -> Optional[List[Dict]]:
+    """
+    Follow bottom cursors for one query until target_count tweets are collected,
+    the results fall behind the cutoff, or the timeline runs out
+    Tweets matching exclude (e.g. already published) do not count towards the
+    target, so paging continues past them; neither do near-duplicates, which
+    are dropped page by page
+    """
+    near_duplicates = os.getenv("NEAR_DUPLICATES") != "off"
+    tweets = []
+    seen_ids = set()
+    seen_cursors = set()
+    cursor = None
+    scheduler = scheduler or scheduler_from_env()
+
+    for page in range(max_pages):
+        response = fetch_page(session, query, cursor, page_size, url, scheduler)
+        if response is None:
+            # Keep what earlier pages produced, only a failed first page is fatal
+            return tweets if page else None
+
+        try:
+            page_tweets, next_cursor = read_page(
+                response, snapshot_path if page == 0 else None
+            )
+        except (ValueError, ijson.JSONError) as e:
+            logging.error(f"Malformed response for query {query!r}: {str(e)}")
+            return tweets if page else None
+        except (urllib3.exceptions.HTTPError, requests.RequestException) as e:
+            # The body is read after the scheduler returned, so its errors land here
+            metrics.incr("http.errors")
+            logging.error(f"Reading response failed for query {query!r}: {str(e)}")
+            return tweets if page else None
+
+        new_tweets = [t for t in page_tweets if t["id"] not in seen_ids]
+        for tweet in new_tweets:
+            seen_ids.add(tweet["id"])
+            if exclude is None or not exclude(tweet):
+                tweets.append(tweet)
+        if near_duplicates:
+            tweets = drop_near_duplicates(tweets)
+
+        if len(tweets) >= target_count or not new_tweets:
+            break
+        if cutoff and not any(_is_after(t, cutoff) for t in new_tweets):
+            break
+
+        cursor = next_cursor
+        if not cursor or cursor in seen_cursors:
+            break
+        seen_cursors.add(cursor)
+
+    return tweets[:target_count]
+
+
+def _is_after(tweet: Dict, cutoff: datetime) -> bool:
+    try:
+        return datetime.strptime(tweet.get("date", ""), DATE_FORMAT) >= cutoff
+    except ValueError:
+        # Undated tweets should not stop paging on their own
+        return True
+
+
+def fetch_tweets(
+    target_count: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    url: str = SEARCH_URL,
+    snapshot_path: Optional[str] = None,
+    base_query: Optional[str] = None,
+    scheduler: Optional[RequestScheduler] = None,
+    exclude: Optional[Callable[[Dict], bool]] = None,
+):
+    """
+    Fetch the last 24 hours of search results, split across concurrent sub-queries
+    base_query replaces SEARCH_BASE_QUERY, scheduler is shared between callers
+    exclude skips tweets before the limit, see fetch_query
+    snapshot_path keeps the first page of the first query as gzipped raw JSON
+    Returns the merged tweet list de-duplicated by rest_id, or None if every query failed
+    """
+    target_count = target_count or int(os.getenv("FETCH_TARGET_COUNT", "20"))
+    max_workers = max_workers or int(os.getenv("FETCH_MAX_WORKERS", "4"))
+    page_size = int(os.getenv("FETCH_PAGE_SIZE", "20"))
+    parts = int(os.getenv("SEARCH_SUBQUERIES", "1"))
 
-def fetch_tweets():
     # Calculate yesterday's date (24 hours ago)
     yesterday = datetime.utcnow() - timedelta(days=1)
     yesterday_date = yesterday.strftime("%Y-%m-%d")
+    cutoff = datetime.now() - timedelta(days=1)
 
-    # Construct the final query with the date
-    final_query = f"{os.getenv('SEARCH_BASE_QUERY')} since:{yesterday_date}"
+    # Construct the final queries with the date
+    queries = [
+        f"{query} since:{yesterday_date}"
+        for query in split_query(
+            base_query or os.getenv("SEARCH_BASE_QUERY") or "", parts
+        )
+    ]
+    per_query = -(-target_count // len(queries))
 
-    url = "https://twitter241.p.rapidapi.com/search-v3"
-    querystring = {"type": "Top", "count": 20, "query": final_query}
+    session = get_session(max_workers)
+    # One scheduler for every query, so they share the keys' rate limits
+    scheduler = scheduler or scheduler_from_env()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(queries))) as pool:
+        futures = [
+            pool.submit(
+                fetch_query,
+                session,
+                query,
+                per_query,
+                cutoff,
+                page_size,
+                url=url,
+                snapshot_path=snapshot_path if idx == 0 else None,
+                scheduler=scheduler,
+                exclude=exclude,
+            )
+            for idx, query in enumerate(queries)
+        ]
+        results = [future.result() for future in futures]
 
-    headers = {
-        "x-rapidapi-key": os.getenv("RAPIDAPI_KEY"),
-        "x-rapidapi-host": os.getenv("RAPIDAPI_HOST"),
-    }
+    if all(result is None for result in results):
+        return None
 
-    response = requests.get(url, headers=headers, params=querystring)
+    return merge_tweets(results, target_count)
 
-    # Debug output
-    print(f"Status Code: {response.status_code}")
 
-    if response.status_code == 200:
-        response_json = response.json()
-        # Write the full response to debug file
-        import json
+def merge_tweets(results: List[Optional[List[Dict]]], limit: int) -> List[Dict]:
+    """
+    Merge per-query tweet lists, dropping duplicate rest_ids and texts that
+    are near-identical across queries (fetch_query already drops them within one)
+    A single query keeps the API ranking, several are ranked by likes
+    """
+    merged = {}
+    for tweets in results:
+        for tweet in tweets or []:
+            merged.setdefault(tweet["id"], tweet)
 
-        with open("debug_response.json", "w", encoding="utf-8") as f:
-            json.dump(response_json, f, indent=2, ensure_ascii=False)
-        # Parse tweets and return the list
-        return parse_tweets(response_json)
-    else:
-        print(f"Error Response: {response.text}")
-        return None
+    tweets = list(merged.values())
+    if os.getenv("NEAR_DUPLICATES") != "off":
+        tweets = drop_near_duplicates(tweets)
+    if len(results) > 1:
+        tweets.sort(key=lambda t: t.get("likes", 0), reverse=True)
+    return tweets[:limit]
 
 
-def parse_tweets(json_data):
+def parse_tweets(json_data) -> List[Dict]:
     """
-    Deep traverse the JSON tree to find Tweet nodes and extract relevant information
+    Find Tweet entries in the response and extract relevant information
     """
-    tweets_list = []
+    return list(iter_tweets(json_data))
+
 
-    def traverse(obj):
+def iter_tweets(json_data) -> Iterator[Dict]:
+    """
+    Lazily yield tweet records in document order
+    Walks the tree with an explicit stack and never descends into an extracted tweet
+    """
+    stack = [json_data]
+    while stack:
+        obj = stack.pop()
         if isinstance(obj, dict):
-            # Look for timeline entries that contain tweets
             if obj.get("__typename") == "TimelineTimelineEntry":
-                content = obj.get("content", {})
-                if content.get("__typename") == "TimelineTimelineItem":
-                    item_content = content.get("content", {})
-                    if item_content.get("__typename") == "TimelineTweet":
-                        # Extract tweet data from TimelineTweet
-                        tweet_data = item_content.get("tweet_results", {}).get(
-                            "result", {}
-                        )
-                        if tweet_data and tweet_data.get("__typename") == "Tweet":
-                            # Get user info
-                            core_data = tweet_data.get("core", {})
-                            user_results = core_data.get("user_results", {}).get(
-                                "result", {}
-                            )
-                            user_info = (
-                                user_results.get("core", {}) if user_results else {}
-                            )
-
-                            # Get tweet details
-                            details = tweet_data.get("details", {})
-                            counts = tweet_data.get("counts", {})
-
-                            # 真实 JSON 结构提取逻辑
-                            images = []
-                            # tweet_node 是包含 core, details, media_entities 等字段的层级
-                            media_entities = tweet_data.get("media_entities", [])
-                            if isinstance(media_entities, list):
-                                for media in media_entities:
-                                    try:
-                                        # 顺藤摸瓜提取 original_img_url
-                                        img_url = (
-                                            media.get("media_results", {})
-                                            .get("result", {})
-                                            .get("media_info", {})
-                                            .get("original_img_url")
-                                        )
-                                        if img_url:
-                                            images.append(img_url)
-                                    except Exception:
-                                        pass
-
-                            # Extract required fields
-                            author = user_info.get("screen_name", "")
-
-                            # Prioritize long text from note_tweet, fallback to legacy full_text
-                            long_text = (
-                                tweet_data.get("note_tweet", {})
-                                .get("note_tweet_results", {})
-                                .get("result", {})
-                                .get("text")
-                            )
-                            if long_text:
-                                text = long_text
-                            else:
-                                text = details.get("full_text", "")
-
-                            # Convert timestamp to readable date
-                            timestamp_ms = details.get("created_at_ms")
-                            import datetime
-
-                            date = (
-                                datetime.datetime.fromtimestamp(
-                                    timestamp_ms / 1000.0
-                                ).strftime("%Y-%m-%d %H:%M:%S")
-                                if timestamp_ms
-                                else ""
-                            )
-                            likes = counts.get("favorite_count", 0)
-                            tweet_id = tweet_data.get("rest_id", "")
-                            url = (
-                                f"https://twitter.com/{author}/status/{tweet_id}"
-                                if author and tweet_id
-                                else ""
-                            )
-
-                            # Only add if it's a valid tweet (skip retweets for now)
-                            if text and author:
-                                tweet_info = {
-                                    "author": author,
-                                    "text": text,
-                                    "date": date,
-                                    "likes": likes,
-                                    "url": url,
-                                    "images": images,
-                                }
-                                tweets_list.append(tweet_info)
-
-            # Recursively traverse all values in the dictionary
-            for value in obj.values():
-                if value is not None:  # Added null check
-                    traverse(value)
-
+                tweet_data = _entry_tweet(obj)
+                if tweet_data is not None:
+                    tweet_info = extract_tweet(tweet_data)
+                    if tweet_info:
+                        yield tweet_info
+                    continue
+            children = obj.values()
         elif isinstance(obj, list):
-            # Recursively traverse all items in the list
-            for item in obj:
-                if item is not None:  # Added null check
-                    traverse(item)
+            children = obj
+        else:
+            continue
+        # Push in reverse so children pop in their original order
+        stack.extend(
+            child
+            for child in reversed(list(children))
+            if isinstance(child, (dict, list))
+        )
 
-    traverse(json_data)
-    return tweets_list
 
+def iter_tweets_stream(fp, state: Optional[Dict] = None) -> Iterator[Dict]:
+    """
+    Incrementally parse a search response from a byte stream such as response.raw
+    Only instructions[].entries[] objects are materialized, one at a time
+    The bottom cursor, if any, is stored in state["cursor"]
+    """
+    if state is None:
+        state = {}
+    builder = None
+    entry_prefix = None
 
-if __name__ == "__main__":
-    data = fetch_tweets()
-    if data:
-        parsed_tweets = parse_tweets(data)
-        if parsed_tweets:
-            print(parsed_tweets[0])  # Print only the first parsed tweet
-        else:
-            print("No tweets found or parsed.")
+    for prefix, event, value in ijson.parse(fp, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if event == "end_map" and prefix == entry_prefix:
+                entry = builder.value
+                builder = None
+                content = entry.get("content", {})
+                cursor_type = content.get("cursor_type") or content.get("cursorType")
+                if cursor_type == "Bottom" and content.get("value"):
+                    state["cursor"] = content["value"]
+                else:
+                    yield from iter_tweets(entry)
+        elif event == "start_map" and prefix.endswith("instructions.item.entries.item"):
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+            entry_prefix = prefix
+        elif prefix == "cursor.bottom" and event == "string" and value:
+            state["cursor"] = value
+
+
+def _entry_tweet(entry: Dict) -> Optional[Dict]:
+    """
+    Return the tweet result of a TimelineTweet entry, or None for other entries
+    """
+    content = entry.get("content") or {}
+    if content.get("__typename") != "TimelineTimelineItem":
+        return None
+    item_content = content.get("content") or {}
+    if item_content.get("__typename") != "TimelineTweet":
+        return None
+    # Extract tweet data from TimelineTweet
+    tweet_data = (item_content.get("tweet_results") or {}).get("result") or {}
+    if tweet_data.get("__typename") != "Tweet":
+        return None
+    return tweet_data
+
+
+def extract_tweet(tweet_data: Dict) -> Optional[Dict]:
+    """
+    Build the tweet record from a Tweet result node, None if it has no text or author
+    """
+    # Get user info
+    core_data = tweet_data.get("core", {})
+    user_results = core_data.get("user_results", {}).get("result", {})
+    user_info = user_results.get("core", {}) if user_results else {}
+
+    # Get tweet details
+    details = tweet_data.get("details", {})
+    counts = tweet_data.get("counts", {})
+
+    # 真实 JSON 结构提取逻辑
+    images = []
+    # tweet_node 是包含 core, details, media_entities 等字段的层级
+    media_entities = tweet_data.get("media_entities", [])
+    if isinstance(media_entities, list):
+        for media in media_entities:
+            try:
+                # 顺藤摸瓜提取 original_img_url
+                img_url = (
+                    media.get("media_results", {})
+                    .get("result", {})
+                    .get("media_info", {})
+                    .get("original_img_url")
+                )
+                if img_url:
+                    images.append(img_url)
+            except Exception:
+                pass
+
+    # Extract required fields
+    author = user_info.get("screen_name", "")
+
+    # Prioritize long text from note_tweet, fallback to legacy full_text
+    long_text = (
+        tweet_data.get("note_tweet", {})
+        .get("note_tweet_results", {})
+        .get("result", {})
+        .get("text")
+    )
+    if long_text:
+        text = long_text
     else:
+        text = details.get("full_text", "")
+
+    # Only keep valid tweets (skip retweets for now)
+    if not (text and author):
+        return None
+
+    # Convert timestamp to readable date
+    timestamp_ms = details.get("created_at_ms")
+    date = (
+        datetime.fromtimestamp(timestamp_ms / 1000.0).strftime(DATE_FORMAT)
+        if timestamp_ms
+        else ""
+    )
+    likes = counts.get("favorite_count", 0)
+    tweet_id = tweet_data.get("rest_id", "")
+    url = (
+        f"https://twitter.com/{author}/status/{tweet_id}" if author and tweet_id else ""
+    )
+
+    return {
+        "id": tweet_id,
+        "author": author,
+        "text": text,
+        "date": date,
+        "likes": likes,
+        "url": url,
+        "images": images,
+    }
+
+
+if __name__ == "__main__":
+    parsed_tweets = fetch_tweets()
+    if parsed_tweets is None:
         print("Failed to fetch data from API.")
+    elif parsed_tweets:
+        print(parsed_tweets[0])  # Print only the first parsed tweet
+    else:
+        print("No tweets found or parsed.")
@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+from metrics import metrics
+from sqlite_cache import SqliteCache
+from vault import TWEET_HEADER
+
+CACHE_NAME = ".html_cache.sqlite"
+# Matches renderer.SEPARATOR, the rule written between tweet sections
+SEPARATOR = "---\n\n"
+
+
+def fragment_key(fragment: str) -> str:
+    return hashlib.sha256(fragment.encode("utf-8")).hexdigest()
+
+
+class HtmlCache(SqliteCache):
+    """
+    Persistent SQLite cache of converted markdown fragments with an in-memory
+    LRU in front of it, keyed by the sha256 of the fragment's markdown
+    """
+
+    table = "fragments"
+    value_column = "html"
+
+    def __init__(self, path: str, memory_size: int = 4096, max_entries: int = 50000):
+        super().__init__(path, memory_size, max_entries)
+
+    def schema(self):
+        return [
+            """
+            CREATE TABLE IF NOT EXISTS fragments (
+                key TEXT PRIMARY KEY,
+                html TEXT NOT NULL,
+                used REAL NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS fragments_used ON fragments (used)",
+        ]
+
+    def get(self, fragment: str) -> Optional[str]:
+        return self.lookup((fragment_key(fragment),))
+
+    def put(self, fragment: str, html: str):
+        self.store((fragment_key(fragment),), html)
+
+
+_caches: Dict[str, Optional[HtmlCache]] = {}
+_caches_lock = threading.Lock()
+
+
+def get_html_cache(obsidian_dir: Optional[str]) -> Optional[HtmlCache]:
+    """
+    Open (once per process) the HTML fragment cache kept next to the vault
+    HTML_CACHE overrides the location, "off" disables caching
+    """
+    path = os.getenv("HTML_CACHE")
+    if not path and obsidian_dir:
+        path = os.path.join(obsidian_dir, CACHE_NAME)
+    if not path or path == "off":
+        return None
+    with _caches_lock:
+        if path not in _caches:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                _caches[path] = HtmlCache(path)
+            except Exception as e:
+                logging.warning(f"HTML cache unavailable: {str(e)}")
+                _caches[path] = None
+        return _caches[path]
+
+
+def split_digest(content: str) -> List[str]:
+    """
+    Split a digest into the fragments render_markdown wrote: the header, each
+    tweet section and the rules between them
+    Documents in another format come back as a single fragment
+    """
+    starts = [match.start() for match in TWEET_HEADER.finditer(content)]
+    if not starts:
+        return [content]
+    fragments = [content[: starts[0]]] if starts[0] else []
+    for start, end in zip(starts, starts[1:] + [len(content)]):
+        section = content[start:end]
+        if end < len(content) and section.endswith("\n\n" + SEPARATOR):
+            fragments.extend([section[: -len(SEPARATOR)], SEPARATOR])
+        else:
+            fragments.append(section)
+    return fragments
+
+
+def convert_fragment(converter, fragment: str, cache: Optional[HtmlCache]) -> str:
+    """
+    HTML for one fragment, from the cache when it was converted before
+    converter is a markdown.Markdown instance, reset between fragments
+    """
+    html = cache.get(fragment) if cache is not None else None
+    if html is not None:
+        metrics.incr("html.cache_hits")
+        return html
+    metrics.incr("html.cache_misses")
+    with metrics.timer("html.convert"):
+        html = converter.reset().convert(fragment)
+    if cache is not None:
+        cache.put(fragment, html)
+    return html
+
+
+def markdown_to_html(content: str, cache: Optional[HtmlCache] = None) -> str:
+    """
+    Convert a digest fragment by fragment, only parsing fragments the cache
+    has not seen; matches markdown.markdown(content) for digests
+    """
+    import markdown
+
+    converter = markdown.Markdown()
+    parts = [convert_fragment(converter, f, cache) for f in split_digest(content)]
+    if cache is not None:
+        cache.flush()
+    return "\n".join(part for part in parts if part)
@@ -0,0 +1,28 @@
+import threading
+
+import requests
+
+_session = None
+_pool_size = 0
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size: int = 10) -> requests.Session:
+    """
+    Return the process-wide HTTP session so every request reuses pooled keep-alive connections
+    The pool grows when a caller needs more concurrent connections than it holds
+    """
+    global _session, _pool_size
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _pool_size = 0
+        if pool_size > _pool_size:
+            # Requests already holding the old adapter finish on its pool
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size
+            )
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            _pool_size = pool_size
+        return _session
@@ -0,0 +1,260 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import zipfile
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+from dotenv import load_dotenv
+
+from checkpoint import RUNS_DIR, RunCheckpoint
+from image_store import ImageStore
+from vault import IMAGE_REF, NOTE_NAME
+
+REFS_NAME = ".image_refs.json"
+ARCHIVE_DIR = ".image_archive"
+IMAGE_DIR = "images"
+
+
+class GcResult(NamedTuple):
+    referenced: int
+    removed: List[str]
+    archived: List[str]
+    freed_bytes: int
+
+
+class ReferenceIndex:
+    """
+    Which images each note in the vault links to, kept in one JSON file
+
+    A note is reparsed only when its mtime or size changes, so marking the
+    vault's live images reads just the notes written since the last sweep.
+    """
+
+    def __init__(self, obsidian_dir: str, path: Optional[str] = None):
+        self.obsidian_dir = obsidian_dir
+        self.path = path or os.path.join(obsidian_dir, REFS_NAME)
+        self.parsed = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._notes: Dict[str, Dict] = json.load(f)
+        except FileNotFoundError:
+            self._notes = {}
+        except ValueError as e:
+            logging.warning(f"Ignoring unreadable reference index {self.path}: {e}")
+            self._notes = {}
+
+    def update(self) -> Dict[str, str]:
+        """
+        Rescan changed notes and return image filename -> date (YYYY-MM-DD) of
+        the newest note linking to it
+        """
+        names = sorted(
+            name
+            for name in os.listdir(self.obsidian_dir)
+            if name.endswith(".md") and not name.startswith(".")
+        )
+        notes = {}
+        for name in names:
+            stat = os.stat(os.path.join(self.obsidian_dir, name))
+            entry = self._notes.get(name)
+            if not (
+                entry
+                and entry["mtime"] == stat.st_mtime
+                and entry["size"] == stat.st_size
+            ):
+                entry = self._scan(name, stat)
+            notes[name] = entry
+        if notes != self._notes:
+            self._notes = notes
+            self.save()
+
+        references: Dict[str, str] = {}
+        for entry in notes.values():
+            for filename in entry["images"]:
+                references[filename] = max(references.get(filename, ""), entry["date"])
+        return references
+
+    def _scan(self, name: str, stat: os.stat_result) -> Dict:
+        with open(os.path.join(self.obsidian_dir, name), "r", encoding="utf-8") as f:
+            content = f.read()
+        self.parsed += 1
+        images = set()
+        for ref in IMAGE_REF.findall(content):
+            path = os.path.normpath(ref.strip())
+            if os.path.dirname(path) == IMAGE_DIR:
+                images.add(os.path.basename(path))
+        # Daily notes are dated by name, rollups and other notes by mtime
+        match = NOTE_NAME.match(name)
+        if match:
+            note_date = match.group(1)
+        else:
+            note_date = date.fromtimestamp(stat.st_mtime).isoformat()
+        return {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "date": note_date,
+            "images": sorted(images),
+        }
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self._notes, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+
+
+def checkpoint_images(obsidian_dir: str) -> List[str]:
+    """
+    Images downloaded by runs that have not written their note yet
+    """
+    filenames = []
+    try:
+        run_ids = os.listdir(os.path.join(obsidian_dir, RUNS_DIR))
+    except FileNotFoundError:
+        return filenames
+    for run_id in run_ids:
+        images = RunCheckpoint(obsidian_dir, run_id).load("images", {})
+        filenames.extend(os.path.basename(path) for path in images.values())
+    return filenames
+
+
+def pack(archive_path: str, image_dir: str, filenames: List[str]):
+    """
+    Append images to a zip archive, stored uncompressed as they already are
+    """
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+    mode = "a" if os.path.exists(archive_path) else "w"
+    with zipfile.ZipFile(archive_path, mode, zipfile.ZIP_STORED) as archive:
+        packed = set(archive.namelist())
+        for filename in filenames:
+            # Names are content hashes, so a packed name holds the same bytes
+            if filename not in packed:
+                archive.write(os.path.join(image_dir, filename), filename)
+
+
+def collect_garbage(
+    obsidian_dir: str,
+    archive_orphans: bool = False,
+    archive_after: Optional[int] = None,
+    grace_hours: float = 24.0,
+    dry_run: bool = False,
+    today: Optional[date] = None,
+) -> GcResult:
+    """
+    Mark the images linked from any note or pending run checkpoint, then
+    delete (or archive) every other image older than grace_hours
+    archive_after moves images whose newest note is older than that many days
+    into monthly archives under .image_archive
+    Dot files (the store index, its lock, partial downloads) are never touched
+    """
+    image_dir = os.path.join(obsidian_dir, IMAGE_DIR)
+    archive_dir = os.path.join(obsidian_dir, ARCHIVE_DIR)
+    references = ReferenceIndex(obsidian_dir).update()
+    live = set(references) | set(checkpoint_images(obsidian_dir))
+
+    try:
+        names = sorted(os.listdir(image_dir))
+    except FileNotFoundError:
+        names = []
+    cutoff = time.time() - grace_hours * 3600
+    orphans, archived, freed = [], [], 0
+    packs: Dict[str, List[str]] = {}
+    if archive_after is not None:
+        oldest = ((today or date.today()) - timedelta(days=archive_after)).isoformat()
+    for name in names:
+        path = os.path.join(image_dir, name)
+        if name.startswith(".") or not os.path.isfile(path):
+            continue
+        if name not in live:
+            # Images of a run still in progress are not linked from a note yet
+            if os.path.getmtime(path) < cutoff:
+                orphans.append(name)
+                if archive_orphans:
+                    packs.setdefault("orphans", []).append(name)
+        elif archive_after is not None and references.get(name, oldest) < oldest:
+            packs.setdefault(references[name][:7], []).append(name)
+
+    removed = orphans if not archive_orphans else []
+    for name in set(orphans).union(*packs.values()):
+        freed += os.path.getsize(os.path.join(image_dir, name))
+    if dry_run:
+        archived = [n for group in packs.values() for n in group]
+        return GcResult(len(live), removed, archived, freed)
+
+    for group, filenames in sorted(packs.items()):
+        pack(os.path.join(archive_dir, f"images-{group}.zip"), image_dir, filenames)
+        archived.extend(filenames)
+    gone = sorted(set(orphans) | set(archived))
+    for name in gone:
+        os.remove(os.path.join(image_dir, name))
+    if gone:
+        # Dropped images are downloaded again if a later note needs them
+        ImageStore(image_dir).forget(gone)
+    logging.info(
+        f"Image GC: {len(live)} referenced, {len(removed)} removed, "
+        f"{len(archived)} archived, {freed / 1024 / 1024:.1f} MB freed"
+    )
+    return GcResult(len(live), removed, archived, freed)
+
+
+def restore(obsidian_dir: str, archive_name: str) -> int:
+    """
+    Unpack an archive back into the image directory, returning the file count
+    """
+    image_dir = os.path.join(obsidian_dir, IMAGE_DIR)
+    with zipfile.ZipFile(os.path.join(obsidian_dir, ARCHIVE_DIR, archive_name)) as f:
+        names = [n for n in f.namelist() if os.path.basename(n) == n]
+        f.extractall(image_dir, names)
+    return len(names)
+
+
+def main(argv=None) -> int:
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Sweep unreferenced vault images")
+    parser.add_argument("--vault", default=os.getenv("OBSIDIAN_DIR"))
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument(
+        "--archive-orphans",
+        action="store_true",
+        help="pack unreferenced images into an archive instead of deleting them",
+    )
+    parser.add_argument(
+        "--archive-after",
+        type=int,
+        metavar="DAYS",
+        help="pack images only linked from notes older than DAYS",
+    )
+    parser.add_argument("--grace-hours", type=float, default=24.0)
+    parser.add_argument("--restore", metavar="ARCHIVE", help="unpack an archive")
+    args = parser.parse_args(argv)
+    if not args.vault:
+        parser.error("--vault or OBSIDIAN_DIR is required")
+
+    if args.restore:
+        logging.info(f"Restored {restore(args.vault, args.restore)} images")
+        return 0
+    result = collect_garbage(
+        args.vault,
+        archive_orphans=args.archive_orphans,
+        archive_after=args.archive_after,
+        grace_hours=args.grace_hours,
+        dry_run=args.dry_run,
+    )
+    if args.dry_run:
+        for name in result.removed:
+            print(f"remove {name}")
+        for name in result.archived:
+            print(f"archive {name}")
+        print(f"{result.freed_bytes / 1024 / 1024:.1f} MB would be freed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
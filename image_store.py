@@ -0,0 +1,162 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+try:
+    import fcntl
+except ImportError:  # Windows, fall back to the in-process lock only
+    fcntl = None
+
+INDEX_NAME = ".index.json"
+LOCK_NAME = ".index.lock"
+# Query parameters that only pick a rendition of the same image (?name=small)
+SIZE_PARAMS = {"name"}
+
+
+def canonical_url(url: str) -> str:
+    """
+    Normalize an image URL so size variants of one image map to the same entry
+    Other query parameters may identify the image (?id=, ?format=) and are kept
+    """
+    parts = urlsplit(url.strip())
+    query = urlencode(
+        [
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if key.lower() not in SIZE_PARAMS
+        ]
+    )
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path, query, "")
+    )
+
+
+def image_extension(url: str) -> str:
+    path = urlsplit(url).path.lower()
+    if path.endswith((".png", ".gif", ".jpeg", ".jpg", ".webp")):
+        return path[path.rfind(".") :]
+    return ".jpg"  # Default extension
+
+
+class ImageStore:
+    """
+    Content-addressed image directory: files are named after the SHA-256 of their
+    bytes and a persistent index maps canonical source URLs to those files
+    """
+
+    def __init__(self, image_dir: str):
+        self.image_dir = image_dir
+        self.index_path = os.path.join(image_dir, INDEX_NAME)
+        self._lock = threading.Lock()
+        self._index = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable image index {self.index_path}: {e}")
+            return {}
+
+    def get(self, url: str) -> Optional[str]:
+        """
+        Return the local path already holding this URL's image, if any
+        """
+        with self._lock:
+            entry = self._index.get(canonical_url(url))
+        if not entry:
+            return None
+        path = os.path.join(self.image_dir, entry["file"])
+        return path if os.path.exists(path) else None
+
+    def temp_file(self):
+        """
+        Open a temporary file inside the store, so the final rename stays on one filesystem
+        """
+        os.makedirs(self.image_dir, exist_ok=True)
+        return tempfile.NamedTemporaryFile(
+            dir=self.image_dir, prefix=".dl_", suffix=".part", delete=False
+        )
+
+    def put(self, url: str, temp_path: str, digest: str) -> str:
+        """
+        Move a fully written temp file into the store under its content hash
+        An identical file already in the store is reused and the temp file dropped
+        """
+        filename = f"img_{digest[:32]}{image_extension(url)}"
+        path = os.path.join(self.image_dir, filename)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, path)
+
+        entry = {"file": filename, "sha256": digest}
+        with self._lock:
+            self._index[canonical_url(url)] = entry
+        self._save({canonical_url(url): entry})
+        return path
+
+    def import_file(self, url: str, source_path: str) -> str:
+        """
+        Copy an image already downloaded elsewhere into the store under url
+        """
+        cached = self.get(url)
+        if cached:
+            return cached
+        digest = hashlib.sha256()
+        with self.temp_file() as f, open(source_path, "rb") as source:
+            for chunk in iter(lambda: source.read(64 * 1024), b""):
+                digest.update(chunk)
+                f.write(chunk)
+        return self.put(url, f.name, digest.hexdigest())
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.image_dir, LOCK_NAME), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self, updates: Dict[str, Dict]):
+        """
+        Merge updates into the on-disk index, re-reading it under the file lock so
+        concurrent writers (threads or processes) never drop each other's entries
+        """
+        with self._lock, self._file_lock():
+            index = self._load()
+            index.update(updates)
+            self._index.update(index)
+            self._write(index)
+
+    def forget(self, filenames) -> int:
+        """
+        Drop the index entries pointing at the given files, returning how many
+        """
+        filenames = set(filenames)
+        with self._lock, self._file_lock():
+            index = self._load()
+            kept = {k: v for k, v in index.items() if v["file"] not in filenames}
+            self._index = kept
+            if len(kept) < len(index):
+                self._write(kept)
+            return len(index) - len(kept)
+
+    def _write(self, index: Dict[str, Dict]):
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.image_dir, suffix=".tmp", delete=False, encoding="utf-8"
+        ) as f:
+            json.dump(index, f, ensure_ascii=False, sort_keys=True, indent=0)
+        os.replace(f.name, self.index_path)
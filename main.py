@@ -1,43 +1,162 @@
+import io
 import logging
 import os
+import sys
+from typing import Optional
+from checkpoint import STAGES, RunCheckpoint
 from fetcher import fetch_tweets
-from processor import generate_markdown, save_to_obsidian
-from notifier import send_email
+from html_cache import get_html_cache
+from metrics import METRICS_DIR, metrics, write_report
+from pipeline import HtmlBuilder, run_pipeline
+from processor import open_obsidian_note
+from notifier import receiver_emails, send_email
+from renderer import Tee
+from seen_index import get_seen_index
+from vault import note_filename
 
 
-def main():
+def main(force_fetch: bool = False, slot: Optional[str] = None) -> bool:
     # Configure logging
     logging.basicConfig(
         level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
     )
 
-    # Fetch tweets
-    logging.info("Fetching tweets...")
-    tweets = fetch_tweets()
-
-    if not tweets:
-        logging.warning("No tweets found or fetched")
-        return
-
-    # Generate markdown content and download images
-    logging.info("Generating markdown content and downloading images...")
     obsidian_dir = os.getenv("OBSIDIAN_DIR")
     if not obsidian_dir:
         logging.error("OBSIDIAN_DIR environment variable not set")
-        return
+        return False
+
+    # Time every stage and write the run's metrics record, even for failed runs
+    metrics.reset()
+    try:
+        return run(obsidian_dir, force_fetch, slot)
+    finally:
+        if os.getenv("METRICS") != "off":
+            write_report(os.path.join(obsidian_dir, METRICS_DIR))
+
+
+def run(
+    obsidian_dir: str, force_fetch: bool = False, slot: Optional[str] = None
+) -> bool:
+    """
+    Fetch, publish and send the daily digest, resuming from the last checkpoint
+    A slot (HH:MM) keys the checkpoint and note, for digests run several times a day
+    Returns whether the day's run is complete, or had nothing to publish
+    """
+    profile = os.getenv("METRICS_PROFILE") == "on"
+
+    # Each stage saves its output, so a rerun picks up where a failed run stopped
+    checkpoint = RunCheckpoint(obsidian_dir, slot=slot)
+    checkpoint.prune(int(os.getenv("CHECKPOINT_KEEP_DAYS", "7")))
+    if force_fetch or os.getenv("FORCE_REFETCH") == "1":
+        # Translations and images are keyed by text and URL, so they stay valid
+        checkpoint.clear(["tweets", "note", "email", "delivered"])
+    stage = checkpoint.resume_stage()
+    if stage is None:
+        logging.info(f"Run for {checkpoint.run_id} already completed")
+        return True
+    if stage != STAGES[0]:
+        logging.info(f"Resuming run for {checkpoint.run_id} at the {stage} stage")
+
+    note_name = note_filename(checkpoint.run_date, slot)
+    seen_index = None
+    if os.getenv("SEEN_INDEX") != "off":
+        with metrics.stage("seen_index", profile):
+            seen_index = get_seen_index(obsidian_dir, os.getenv("SEEN_INDEX"))
+
+    # Fetch tweets
+    tweets = checkpoint.load("tweets")
+    if tweets is None:
+        logging.info("Fetching tweets...")
+        snapshot_path = None
+        if os.getenv("FETCH_SNAPSHOT") == "on":
+            snapshot_path = checkpoint.snapshot_path
+        # Already published tweets are skipped while paging, so they do not
+        # take the place of new ones under the target count
+        exclude = None
+        if seen_index is not None:
+            exclude = lambda tweet: seen_index.seen(tweet, note_name)
+        with metrics.stage("fetch", profile):
+            tweets = fetch_tweets(snapshot_path=snapshot_path, exclude=exclude)
+        if not tweets:
+            if tweets is not None and seen_index is not None:
+                logging.warning("All fetched tweets were already published")
+                return True
+            logging.warning("No tweets found or fetched")
+            return False
+        checkpoint.save("tweets", tweets)
+    metrics.incr("tweets.fetched", len(tweets))
 
-    md_content, local_images = generate_markdown(tweets, obsidian_dir)
+    # Checkpointed tweets may predate notes written since, so check them again
+    if seen_index is not None:
+        tweets = seen_index.filter(tweets, note_name)
+        metrics.incr("tweets.published", len(tweets))
+        if not tweets:
+            logging.warning("All fetched tweets were already published")
+            return True
 
-    # Save to Obsidian
-    logging.info("Saving to Obsidian...")
-    save_to_obsidian(md_content)
+    note_path = os.path.join(obsidian_dir, note_name)
+    if checkpoint.done("note") and os.path.exists(note_path):
+        local_images = checkpoint.load("note")["images"]
+        with open(note_path, "r", encoding="utf-8") as f:
+            md_content = f.read()
+        html_content = None
+    else:
+        # Translate, download and render as overlapping stages; every fragment
+        # goes to the vault note, the email buffer and the HTML builder at once
+        # A note lost since its checkpoint (e.g. a CI run that was not
+        # committed) is rebuilt from the saved translations and images
+        logging.info("Generating markdown content and downloading images...")
+        translations = checkpoint.load("translations", {})
+        images = checkpoint.load("images", {})
+        email_buffer = io.StringIO()
+        html_builder = HtmlBuilder(get_html_cache(obsidian_dir))
+        try:
+            with metrics.stage("pipeline", profile), open_obsidian_note(
+                obsidian_dir, note_name
+            ) as note:
+                local_images = run_pipeline(
+                    tweets,
+                    obsidian_dir,
+                    Tee(note, email_buffer, html_builder),
+                    translations=translations,
+                    images=images,
+                )
+        except Exception as e:
+            logging.error(f"Failed to save to Obsidian: {str(e)}")
+            return False
+        finally:
+            # Partial results still spare the next attempt some work
+            checkpoint.save("translations", translations)
+            checkpoint.save("images", images)
+            html_content = html_builder.close()
+        md_content = email_buffer.getvalue()
+        checkpoint.save("note", {"file": note_name, "images": local_images})
 
-    # Send email with embedded images
-    logging.info("Sending email with embedded images...")
-    send_email(md_content, local_images)
+    # Send email with embedded images, only to recipients an earlier attempt
+    # did not reach
+    delivered = checkpoint.load("delivered", [])
+    recipients = receiver_emails()
+    pending = [r for r in recipients if r not in delivered]
+    if pending or not recipients:
+        logging.info("Sending email with embedded images...")
+        with metrics.stage("email", profile):
+            results = send_email(
+                md_content, local_images, html_content, recipients=pending or None
+            )
+        delivered += [r for r, result in (results or {}).items() if result.ok]
+        checkpoint.save("delivered", delivered)
+        if not results or not all(result.ok for result in results.values()):
+            logging.error("Email delivery incomplete, rerun to retry")
+            return False
+    checkpoint.save("email", sorted(delivered))
+    # Tweets count as published once the run is complete
+    if seen_index is not None:
+        seen_index.add(tweets, note_name)
 
     logging.info("Daily Pulse automation completed successfully!")
+    return True
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(0 if main(force_fetch="--refetch" in sys.argv[1:]) else 1)
@@ -0,0 +1,137 @@
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+METRICS_DIR = ".metrics"
+LATEST_NAME = "latest.json"
+HISTORY_NAME = "history.jsonl"
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters, timers and per-stage wall times for one run
+    Timers keep count, total and max, so recording stays O(1) per observation
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.counters: Dict[str, float] = {}
+            self.timers: Dict[str, Dict[str, float]] = {}
+            self.stages: Dict[str, float] = {}
+            self.profiles: Dict[str, cProfile.Profile] = {}
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = {"count": 0, "total": 0.0, "max": 0.0}
+            timer["count"] += 1
+            timer["total"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    @contextmanager
+    def stage(self, name: str, profile: bool = False):
+        """
+        Time one stage of the run, optionally under cProfile
+        cProfile only sees the calling thread, so pool workers show up as waits
+        """
+        profiler = cProfile.Profile() if profile else None
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed
+                if profiler is not None:
+                    self.profiles[name] = profiler
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            timers = {
+                name: dict(timer, mean=timer["total"] / timer["count"])
+                for name, timer in self.timers.items()
+            }
+            return {
+                "started": datetime.fromtimestamp(self.started).isoformat(
+                    timespec="seconds"
+                ),
+                "duration": time.time() - self.started,
+                "stages": dict(self.stages),
+                "counters": dict(self.counters),
+                "timers": timers,
+            }
+
+
+# Registry shared by every module of the run
+metrics = Metrics()
+
+
+def write_report(
+    metrics_dir: str, record: Optional[Dict] = None, keep: Optional[int] = None
+) -> Dict:
+    """
+    Write the run's metrics record to latest.json and append it to a rolling
+    JSON-lines history of the last `keep` runs
+    The profile of the slowest profiled stage is dumped next to them
+    """
+    keep = keep or int(os.getenv("METRICS_HISTORY", "90"))
+    record = record or metrics.snapshot()
+    os.makedirs(metrics_dir, exist_ok=True)
+
+    if metrics.profiles:
+        slowest = max(metrics.profiles, key=lambda name: record["stages"].get(name, 0))
+        profile_path = os.path.join(metrics_dir, f"profile-{slowest}.prof")
+        metrics.profiles[slowest].dump_stats(profile_path)
+        record["profile"] = profile_path
+
+    latest_path = os.path.join(metrics_dir, LATEST_NAME)
+    with open(latest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+    os.replace(latest_path + ".tmp", latest_path)
+
+    history_path = os.path.join(metrics_dir, HISTORY_NAME)
+    try:
+        with open(history_path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        lines = []
+    lines.append(json.dumps(record, separators=(",", ":")) + "\n")
+    with open(history_path + ".tmp", "w", encoding="utf-8") as f:
+        f.writelines(lines[-keep:])
+    os.replace(history_path + ".tmp", history_path)
+
+    slowest = max(record["stages"], key=record["stages"].get, default=None)
+    if slowest:
+        logging.info(
+            f"Run took {record['duration']:.1f}s, slowest stage {slowest} "
+            f"{record['stages'][slowest]:.1f}s"
+        )
+    return record
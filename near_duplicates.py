@@ -0,0 +1,136 @@
+import logging
+import os
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Dict, List, Optional, Set
+
+from metrics import metrics
+from seen_index import MIN_FINGERPRINT_CHARS, normalize_text
+
+SIGNATURE_BITS = 64
+SHINGLE_SIZE = 4
+# BIT_TABLES[j] maps a byte to its bit j
+BIT_TABLES = [bytes((b >> j) & 1 for b in range(256)) for j in range(8)]
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """
+    Overlapping character n-grams, which work for languages without spaces
+    """
+    if len(text) <= size:
+        return {text}
+    return {text[i : i + size] for i in range(len(text) - size + 1)}
+
+
+def simhash(features: Set[str]) -> int:
+    """
+    64-bit SimHash: each bit is set when most feature hashes have it set, so
+    similar feature sets get signatures a few bits apart
+    """
+    if not features:
+        return 0
+    data = b"".join(
+        blake2b(feature.encode("utf-8"), digest_size=8).digest() for feature in features
+    )
+    signature = 0
+    # Count set bits column by column: byte k of every hash is a strided slice,
+    # and translate() maps each byte to bit j of itself
+    for k in range(8):
+        column = data[k::8]
+        for j, table in enumerate(BIT_TABLES):
+            if 2 * column.translate(table).count(1) > len(features):
+                signature |= 1 << (k * 8 + j)
+    return signature
+
+
+@lru_cache(maxsize=8192)
+def text_signature(normalized: str) -> int:
+    """
+    SimHash of a normalized text, memoized as callers paging through results
+    check the same tweets again with every page
+    """
+    return simhash(shingles(normalized))
+
+
+class SimHashIndex:
+    """
+    LSH index finding signatures within max_distance bits of each other
+
+    Signatures are split into max_distance + 1 bands. Two signatures that
+    differ in at most max_distance bits agree on at least one whole band, so
+    only signatures sharing a band bucket are compared.
+    """
+
+    def __init__(self, max_distance: int = 6, bits: int = SIGNATURE_BITS):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        bounds = [bits * i // bands for i in range(bands + 1)]
+        self._bands = [
+            (start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])
+        ]
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in self._bands]
+        self._signatures: Dict[int, int] = {}
+
+    def add(self, key: int, signature: int):
+        self._signatures[key] = signature
+        for buckets, (shift, mask) in zip(self._buckets, self._bands):
+            buckets.setdefault((signature >> shift) & mask, []).append(key)
+
+    def query(self, signature: int) -> List[int]:
+        """
+        Keys of indexed signatures within max_distance bits
+        """
+        candidates = set()
+        for buckets, (shift, mask) in zip(self._buckets, self._bands):
+            candidates.update(buckets.get((signature >> shift) & mask, ()))
+        return sorted(
+            key
+            for key in candidates
+            if (self._signatures[key] ^ signature).bit_count() <= self.max_distance
+        )
+
+
+def drop_near_duplicates(
+    tweets: List[Dict], max_distance: Optional[int] = None
+) -> List[Dict]:
+    """
+    Keep the most-liked tweet of every group of near-identical texts
+    Texts are compared without links, mentions, case or spacing; kept tweets
+    stay in their original order
+    """
+    if max_distance is None:
+        max_distance = int(os.getenv("NEAR_DUP_DISTANCE", "6"))
+    if max_distance < 0 or len(tweets) < 2:
+        return tweets
+
+    index = SimHashIndex(max_distance)
+    parent = list(range(len(tweets)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    with metrics.timer("dedup.simhash"):
+        for position, tweet in enumerate(tweets):
+            text = normalize_text(tweet.get("text", ""))
+            # Short texts ("gm", a lone link) would match each other by accident
+            if len(text) < MIN_FINGERPRINT_CHARS:
+                continue
+            signature = text_signature(text)
+            for other in index.query(signature):
+                parent[find(other)] = find(position)
+            index.add(position, signature)
+
+    best: Dict[int, int] = {}
+    for position, tweet in enumerate(tweets):
+        root = find(position)
+        kept = best.get(root)
+        if kept is None or tweet.get("likes", 0) > tweets[kept].get("likes", 0):
+            best[root] = position
+    keep = set(best.values())
+    if len(keep) < len(tweets):
+        metrics.incr("tweets.near_duplicates", len(tweets) - len(keep))
+        logging.info(f"Dropped {len(tweets) - len(keep)} near-duplicate tweets")
+    return [tweet for position, tweet in enumerate(tweets) if position in keep]
@@ -1,31 +1,137 @@
-import smtplib
 import os
 import logging
-import markdown
+import mimetypes
 import re
+import uuid
+from base64 import encodebytes
+from email import policy
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.image import MIMEImage
 from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from attachments import plan_attachments
+from delivery import SMTPPool, deliver, delivery_settings, smtp_ssl_factory
+from html_cache import get_html_cache, markdown_to_html
 
+IMG_TAG = re.compile(r'(<img\b[^>]*?\bsrc=")([^"]*)("[^>]*>)')
+# Multiple of 57 raw bytes, so every base64 chunk is whole 76-char lines
+BASE64_CHUNK = 57 * 1024
 
-def send_email(md_content: str, local_images: list):
+
+def rewrite_image_sources(
+    html_content: str, local_images: List[str], dropped: Iterable[str] = ()
+) -> str:
+    """
+    Point every <img> whose file is a local image at its CID, in a single pass
+    Tags of dropped images are removed
+    """
+    cids = {os.path.basename(img_path) for img_path in local_images}
+    removed = {os.path.basename(img_path) for img_path in dropped}
+
+    def to_cid(match):
+        filename = match.group(2).rsplit("/", 1)[-1]
+        if filename in removed:
+            return ""
+        if filename not in cids:
+            return match.group(0)
+        return f"{match.group(1)}cid:{filename}{match.group(3)}"
+
+    return IMG_TAG.sub(to_cid, html_content)
+
+
+def _fold_headers(headers: Iterable[Tuple[str, str]]) -> bytes:
+    """
+    Serialize headers with RFC 2047 encoding and CRLF line folding
+    """
+    smtp = policy.SMTP
+    return b"".join(
+        smtp.fold_binary(*smtp.header_store_parse(name, value))
+        for name, value in headers
+    )
+
+
+def iter_message_bytes(
+    headers: List[Tuple[str, str]],
+    html_content: str,
+    local_images: List[str],
+    attachments: Optional[Dict[str, str]] = None,
+) -> Iterator[bytes]:
+    """
+    Lazily generate a multipart message with the HTML body and inline images
+    attachments maps an image to the file actually attached in its place
+    Images are read and base64-encoded chunk by chunk as the output is consumed
+    Every yielded chunk ends at a CRLF line boundary
+    """
+    boundary = f"===============daily-pulse-{uuid.uuid4().hex}=="
+    yield _fold_headers(
+        headers
+        + [
+            ("MIME-Version", "1.0"),
+            ("Content-Type", f'multipart/mixed; boundary="{boundary}"'),
+        ]
+    )
+    yield b"\r\n"
+
+    delimiter = f"--{boundary}\r\n".encode("ascii")
+    # Attach content as HTML
+    yield delimiter
+    yield MIMEText(html_content, "html", "utf-8").as_bytes(policy=policy.SMTP)
+
+    # Attach images
+    attachments = attachments or {}
+    for img_path in local_images:
+        filename = os.path.basename(img_path)
+        attached_path = attachments.get(img_path, img_path)
+        content_type = mimetypes.guess_type(attached_path)[0] or "image/jpeg"
+        yield b"\r\n" + delimiter
+        yield _fold_headers(
+            [
+                ("Content-Type", content_type),
+                ("MIME-Version", "1.0"),
+                ("Content-Transfer-Encoding", "base64"),
+                ("Content-ID", f"<{filename}>"),
+            ]
+        )
+        yield b"\r\n"
+        with open(attached_path, "rb") as f:
+            for chunk in iter(lambda: f.read(BASE64_CHUNK), b""):
+                yield encodebytes(chunk).replace(b"\n", b"\r\n")
+
+    yield f"\r\n--{boundary}--\r\n".encode("ascii")
+
+
+def receiver_emails() -> List[str]:
+    """
+    Recipients listed in RECEIVER_EMAIL, comma-separated
+    """
+    return [
+        email.strip()
+        for email in os.getenv("RECEIVER_EMAIL", "").split(",")
+        if email.strip()
+    ]
+
+
+def send_email(
+    md_content: str,
+    local_images: list,
+    html_content: str = None,
+    subject: str = None,
+    recipients: List[str] = None,
+):
     """
     Send email with markdown content and embedded images
+    html_content skips the markdown conversion when it was already done
+    recipients replaces the RECEIVER_EMAIL list
+    Returns each recipient's DeliveryResult, or None if nothing could be sent
     """
     smtp_server = os.getenv("SMTP_SERVER") or ""
     smtp_port_str = os.getenv("SMTP_PORT") or ""
     sender_email = os.getenv("SENDER_EMAIL") or ""
     sender_password = os.getenv("SENDER_PASSWORD") or ""
-    receiver_emails = [
-        email.strip()
-        for email in os.getenv("RECEIVER_EMAIL", "").split(",")
-        if email.strip()
-    ]
+    recipients = recipients or receiver_emails()
 
     if (
         not all([smtp_server, smtp_port_str, sender_email, sender_password])
-        or not receiver_emails
+        or not recipients
     ):
         logging.error("Missing email configuration in environment variables")
         return
@@ -38,42 +144,46 @@ def send_email(md_content: str, local_images: list):
 
     try:
         # Convert markdown to HTML
-        html_content = markdown.markdown(md_content)
-
-        # Replace image paths with CID references
-        for img_path in local_images:
-            filename = os.path.basename(img_path)
-            # Replace relative path format like "images/img_xxx.jpg" with cid reference
-            html_content = re.sub(
-                rf'src="[^"]*{filename}"', f'src="cid:{filename}"', html_content
-            )
-
-        # Create message
-        msg = MIMEMultipart()
-        msg["From"] = sender_email
-        msg["To"] = ", ".join(receiver_emails)
+        if html_content is None:
+            # Tweet sections converted before (for the note, an earlier send or
+            # another digest) come from the fragment cache
+            cache = get_html_cache(os.getenv("OBSIDIAN_DIR"))
+            html_content = markdown_to_html(md_content, cache)
+
+        # Downscale attachments to fit the size budget, originals stay in the vault
+        attachments, dropped = plan_attachments(
+            local_images, len(html_content.encode("utf-8"))
+        )
+        local_images = [img for img in local_images if img in attachments]
+
+        # Replace image paths like "images/img_xxx.jpg" with CID references
+        html_content = rewrite_image_sources(html_content, local_images, dropped)
+
         current_date = datetime.now().strftime("%Y-%m-%d")
-        msg["Subject"] = f"[Daily Pulse] X 热门资讯 - {current_date}"
-
-        # Attach content as HTML
-        msg.attach(MIMEText(html_content, "html", "utf-8"))
-
-        # Attach images
-        for img_path in local_images:
-            filename = os.path.basename(img_path)
-            with open(img_path, "rb") as f:
-                img_data = f.read()
-            msg_image = MIMEImage(img_data)
-            msg_image.add_header("Content-ID", f"<{filename}>")
-            msg.attach(msg_image)
-
-        # Connect to server and send email
-        server = smtplib.SMTP_SSL(smtp_server, smtp_port)
-        server.login(sender_email, sender_password)
-        text = msg.as_string()
-        server.sendmail(sender_email, receiver_emails, text)
-        server.quit()
-
-        logging.info("Email sent successfully")
+        subject = subject or f"[Daily Pulse] X 热门资讯 - {current_date}"
+
+        def message_for(batch: List[str]) -> Iterator[bytes]:
+            # Each batch only sees its own recipients in the To header
+            headers = [
+                ("From", sender_email),
+                ("To", ", ".join(batch)),
+                ("Subject", subject),
+            ]
+            return iter_message_bytes(headers, html_content, local_images, attachments)
+
+        # Stream the message over a small pool of authenticated connections
+        settings = delivery_settings()
+        pool = SMTPPool(
+            smtp_ssl_factory(smtp_server, smtp_port, sender_email, sender_password),
+            settings["max_workers"],
+        )
+        try:
+            results = deliver(pool, sender_email, recipients, message_for, **settings)
+        finally:
+            pool.close()
+
+        if all(result.ok for result in results.values()):
+            logging.info("Email sent successfully")
+        return results
     except Exception as e:
         logging.error(f"Failed to send email: {str(e)}")
@@ -0,0 +1,219 @@
+import io
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from html_cache import HtmlCache, convert_fragment
+from http_client import get_session
+from image_store import ImageStore
+from metrics import metrics
+from processor import (
+    DownloadResult,
+    download_image,
+    get_translation_cache,
+    translate_many,
+)
+from renderer import render_markdown
+
+_DONE = object()
+
+
+class HtmlBuilder:
+    """
+    Sink converting each rendered markdown fragment to HTML on a worker thread,
+    so the email body is ready as soon as the vault note is written
+    Digest fragments are self-contained blocks, so converting them one by one
+    and joining with newlines matches converting the whole document
+    Fragments found in cache are not parsed again
+    """
+
+    def __init__(self, cache: Optional[HtmlCache] = None):
+        self._cache = cache
+        self._fragments = queue.Queue()
+        self._parts: List[str] = []
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        # Imported on first use to keep one-shot startup fast
+        import markdown
+
+        converter = markdown.Markdown()
+        while True:
+            fragment = self._fragments.get()
+            if fragment is _DONE:
+                return
+            try:
+                html = convert_fragment(converter, fragment, self._cache)
+            except BaseException as e:
+                self._error = e
+                continue
+            if html:
+                self._parts.append(html)
+
+    def write(self, fragment: str) -> int:
+        self._fragments.put(fragment)
+        return len(fragment)
+
+    def close(self) -> str:
+        """
+        Wait for pending fragments and return the assembled HTML
+        """
+        self._fragments.put(_DONE)
+        self._thread.join()
+        if self._cache is not None:
+            self._cache.flush()
+        if self._error is not None:
+            raise self._error
+        return "\n".join(self._parts)
+
+
+def run_pipeline(
+    tweets: Iterable[Dict],
+    obsidian_dir: str,
+    sink,
+    translate_workers: Optional[int] = None,
+    image_workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    translations: Optional[Dict[str, str]] = None,
+    images: Optional[Dict[str, str]] = None,
+) -> List[str]:
+    """
+    Translate, download and render tweets as overlapping stages
+    Each tweet is handed to the translation and image pools as soon as it is
+    read from tweets, and rendered in input order once its inputs are ready
+    translations (text -> translation) and images (url -> local path) hold the
+    results of an earlier attempt; they are reused and filled in place
+    Returns the local image paths referenced by the digest
+    """
+    translate_workers = translate_workers or int(
+        os.getenv("TRANSLATE_MAX_WORKERS", "4")
+    )
+    image_workers = image_workers or int(os.getenv("IMAGE_MAX_WORKERS", "8"))
+    chunk_size = chunk_size or int(os.getenv("PIPELINE_CHUNK_SIZE", "10"))
+
+    image_dir = os.path.join(obsidian_dir, "images")
+    store = ImageStore(image_dir)
+    session = get_session(image_workers)
+    cache = get_translation_cache(obsidian_dir)
+
+    # Bounded hand-off between the submitting and rendering sides
+    planned: "queue.Queue" = queue.Queue(maxsize=chunk_size * 8)
+    stopped = threading.Event()
+    local_images: List[str] = []
+    translations = {} if translations is None else translations
+    images = {} if images is None else images
+
+    def translate_chunk(texts: List[str]) -> List[str]:
+        missing = [text for text in texts if text not in translations]
+        metrics.incr("translate.checkpoint_hits", len(texts) - len(missing))
+        for text, translated in zip(missing, translate_many(missing, cache)):
+            # Texts that fell back to the original are retried on the next run
+            if translated != text:
+                translations[text] = translated
+        return [translations.get(text, text) for text in texts]
+
+    def download(url: str) -> DownloadResult:
+        path = images.get(url)
+        if path and os.path.exists(path):
+            return DownloadResult(url, path)
+        result = download_image(url, image_dir, session, store=store)
+        if result.ok:
+            images[url] = result.path
+        return result
+
+    with ThreadPoolExecutor(translate_workers) as translate_pool, ThreadPoolExecutor(
+        image_workers
+    ) as image_pool:
+        downloads: Dict[str, Future] = {}
+
+        def submit():
+            try:
+                chunk: List[Tuple[Dict, List[Future]]] = []
+
+                def flush():
+                    texts = [tweet.get("text", "") for tweet, _ in chunk]
+                    translated = translate_pool.submit(translate_chunk, texts)
+                    for pos, (tweet, futures) in enumerate(chunk):
+                        planned.put((tweet, translated, pos, futures))
+                    chunk.clear()
+
+                for tweet in tweets:
+                    if stopped.is_set():
+                        return
+                    futures = []
+                    for url in tweet.get("images", []):
+                        if url not in downloads:
+                            downloads[url] = image_pool.submit(download, url)
+                        futures.append(downloads[url])
+                    chunk.append((tweet, futures))
+                    if len(chunk) >= chunk_size:
+                        flush()
+                if chunk:
+                    flush()
+                planned.put(_DONE)
+            except BaseException as e:
+                planned.put(e)
+
+        def items():
+            while True:
+                entry = planned.get()
+                if entry is _DONE:
+                    return
+                if isinstance(entry, BaseException):
+                    raise entry
+                tweet, translated, pos, futures = entry
+                with metrics.timer("render.wait"):
+                    results = [future.result() for future in futures]
+                    translated_text = translated.result()[pos]
+                image_paths = []
+                for result in results:
+                    if result.ok:
+                        if result.path not in local_images:
+                            local_images.append(result.path)
+                        # Use relative path in markdown
+                        image_paths.append(os.path.relpath(result.path, obsidian_dir))
+                yield tweet, translated_text, image_paths
+
+        producer = threading.Thread(target=submit, daemon=True)
+        producer.start()
+        try:
+            with metrics.timer("render.total"):
+                render_markdown(items(), sink)
+        finally:
+            # Unblock the producer if rendering stopped early
+            stopped.set()
+            while producer.is_alive():
+                try:
+                    planned.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+    logging.info(
+        f"Pipeline rendered {len(local_images)} images from {len(downloads)} URLs"
+    )
+    return local_images
+
+
+def generate_markdown(
+    tweets: List[Dict],
+    obsidian_dir: str,
+    translations: Optional[List[str]] = None,
+) -> Tuple[str, List[str]]:
+    """
+    Render the digest into a string with run_pipeline, downloading its images
+    translations, if given, holds one translated text per tweet
+    Returns: (markdown_content, list_of_local_image_paths)
+    """
+    known = None
+    if translations is not None:
+        known = {
+            tweet.get("text", ""): text for tweet, text in zip(tweets, translations)
+        }
+    buffer = io.StringIO()
+    local_images = run_pipeline(tweets, obsidian_dir, buffer, translations=known)
+    return buffer.getvalue(), local_images
@@ -1,120 +1,270 @@
 import os
 import logging
+import hashlib
 import requests
-import uuid
-from datetime import datetime
-from typing import List, Dict, Tuple
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, NamedTuple, Optional, Tuple
 import re
-from deep_translator import GoogleTranslator
+from http_client import get_session
+from image_store import ImageStore
+from metrics import metrics
+from vault import note_filename
+from translation_cache import CACHE_NAME, TranslationCache
 
-translator = GoogleTranslator(source="auto", target="zh-CN")
+CHUNK_SIZE = 64 * 1024
 
+# deep_translator is imported on first use, see _translate_backend
+TRANSLATE_SOURCE = "auto"
+TRANSLATE_TARGET = "zh-CN"
 
-def download_image(url: str, save_dir: str) -> str:
+# Marker placed between texts packed into one translation request
+BATCH_SEPARATOR = "\n\n||\n\n"
+BATCH_SPLIT = re.compile(r"\s*\|\s*\|\s*")
+
+_caches: Dict[str, Optional[TranslationCache]] = {}
+_caches_lock = threading.Lock()
+_local = threading.local()
+
+
+class DownloadResult(NamedTuple):
+    url: str
+    path: str = ""
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.path) and not self.error
+
+
+def download_image(
+    url: str,
+    save_dir: str,
+    session: Optional[requests.Session] = None,
+    timeout: Tuple[float, float] = (5, 30),
+    store: Optional[ImageStore] = None,
+) -> DownloadResult:
     """
-    Download image from URL and save to local directory
+    Stream image from URL into the content-addressed store in save_dir
+    URLs already in the store are returned without touching the network
     """
+    store = store or ImageStore(save_dir)
+    cached = store.get(url)
+    if cached:
+        metrics.incr("image.store_hits")
+        return DownloadResult(url, cached)
+
+    session = session or get_session()
+    temp_path = ""
     try:
-        # Ensure the save directory exists
-        os.makedirs(save_dir, exist_ok=True)
+        # Hash while writing to a temp file so a failed transfer never leaves a truncated image
+        digest = hashlib.sha256()
+        size = 0
+        with metrics.timer("image.download"), session.get(
+            url, stream=True, timeout=timeout
+        ) as response:
+            response.raise_for_status()
+            with store.temp_file() as f:
+                temp_path = f.name
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+
+        metrics.incr("image.bytes", size)
+        return DownloadResult(url, store.put(url, temp_path, digest.hexdigest()))
+    except Exception as e:
+        metrics.incr("image.failures")
+        logging.error(f"Failed to download image {url}: {str(e)}")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        return DownloadResult(url, error=str(e))
 
-        # Download the image
-        response = requests.get(url)
-        response.raise_for_status()
 
-        # Generate a unique filename
-        ext = ".jpg"  # Default extension
-        if url.lower().endswith((".png", ".gif", ".jpeg", ".jpg")):
-            ext = url[url.rfind(".") :]
+def get_translation_cache(obsidian_dir: str) -> Optional[TranslationCache]:
+    """
+    Open (once per process) the translation cache kept next to the vault
+    TRANSLATION_CACHE overrides the location, "off" disables caching
+    """
+    path = os.getenv("TRANSLATION_CACHE") or os.path.join(obsidian_dir, CACHE_NAME)
+    if path == "off":
+        return None
+    with _caches_lock:
+        if path not in _caches:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                _caches[path] = TranslationCache(path)
+            except Exception as e:
+                logging.warning(f"Translation cache unavailable: {str(e)}")
+                _caches[path] = None
+        return _caches[path]
 
-        filename = f"img_{str(uuid.uuid4())}{ext}"
-        filepath = os.path.join(save_dir, filename)
 
-        # Save the image
-        with open(filepath, "wb") as f:
-            f.write(response.content)
+def _translate_backend(text: str) -> str:
+    """
+    Translate through a per-thread GoogleTranslator, whose request state is not thread-safe
+    """
+    backend = getattr(_local, "translator", None)
+    if backend is None:
+        # Imported here: it pulls in BeautifulSoup and is slow to load
+        from deep_translator import GoogleTranslator
 
-        return filepath
-    except Exception as e:
-        logging.error(f"Failed to download image {url}: {str(e)}")
-        return ""
+        backend = _local.translator = GoogleTranslator(
+            source=TRANSLATE_SOURCE, target=TRANSLATE_TARGET
+        )
+    return backend.translate(text)
 
 
-def generate_markdown(tweets: List[Dict], obsidian_dir: str) -> Tuple[str, List[str]]:
+def translate_text(text: str, cache: Optional[TranslationCache] = None) -> str:
     """
-    Convert tweets list to formatted markdown content and download images
-    Returns: (markdown_content, list_of_local_image_paths)
+    Translate text to the target language, falling back to the original on failure
+    Cached translations are returned without a network call
     """
-    # Generate header with date
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    md_content = f"# Daily Pulse - {current_date}\n\n"
+    if cache is not None:
+        cached = cache.get(text, TRANSLATE_TARGET)
+        if cached is not None:
+            return cached
 
-    local_images = []  # Track downloaded images
+    try:
+        with metrics.timer("translate.request"):
+            translated_text = _translate_backend(text)
+    except Exception as e:
+        metrics.incr("translate.failures")
+        logging.warning(
+            f"Translation failed for tweet: {str(e)}, keeping original text"
+        )
+        return text  # Fallback to original text
 
-    for idx, tweet in enumerate(tweets):
-        author = tweet.get("author", "Unknown")
-        text = tweet.get("text", "")
-        date = tweet.get("date", "")
-        likes = tweet.get("likes", 0)
-        url = tweet.get("url", "")
-        images = tweet.get("images", [])
+    if cache is not None and translated_text:
+        cache.set(text, TRANSLATE_TARGET, translated_text)
+    return translated_text
 
-        # Translate text
-        translated_text = text
+
+def pack_batches(texts: List[str], max_chars: int) -> List[List[int]]:
+    """
+    Group text indexes so each joined batch stays within the backend's size limit
+    Texts that contain the separator or exceed the limit alone get a batch of their own
+    """
+    batches = []
+    current, size = [], 0
+    for idx, text in enumerate(texts):
+        cost = len(text) + len(BATCH_SEPARATOR)
+        if BATCH_SEPARATOR.strip() in text or cost > max_chars:
+            batches.append([idx])
+            continue
+        if current and size + cost > max_chars:
+            batches.append(current)
+            current, size = [], 0
+        current.append(idx)
+        size += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _translate_batch(texts: List[str], cache: Optional[TranslationCache]) -> List[str]:
+    """
+    Translate several texts in one request, retrying them one by one when the
+    backend fails or does not keep the separators intact
+    """
+    if len(texts) > 1:
         try:
-            translated_text = translator.translate(text)
+            with metrics.timer("translate.request"):
+                joined = _translate_backend(BATCH_SEPARATOR.join(texts))
+            parts = BATCH_SPLIT.split(joined or "")
+            if len(parts) == len(texts) and all(p.strip() for p in parts):
+                parts = [p.strip() for p in parts]
+                if cache is not None:
+                    for text, part in zip(texts, parts):
+                        cache.set(text, TRANSLATE_TARGET, part)
+                return parts
+            metrics.incr("translate.batch_fallbacks")
+            logging.info("Batched translation lost its separators, retrying singly")
         except Exception as e:
-            logging.warning(
-                f"Translation failed for tweet: {str(e)}, keeping original text"
-            )
-            translated_text = text  # Fallback to original text
+            metrics.incr("translate.batch_fallbacks")
+            logging.warning(f"Batched translation failed: {str(e)}, retrying singly")
+    return [translate_text(text, cache) for text in texts]
 
-        # Add section for each tweet
-        md_content += f"### [{author}]({url})\n\n"
-        md_content += f"**发布时间:** {date} | ❤️ {likes}\n\n"
-        md_content += f"> {text}\n\n"
-        md_content += f"> 🇨🇳 译文：{translated_text}\n\n"
 
-        # Add images if any (between translation and link), download them and update path
-        for img_url in images:
-            local_path = download_image(img_url, os.path.join(obsidian_dir, "images"))
-            if local_path:
-                local_images.append(local_path)
-                # Use relative path in markdown
-                rel_path = os.path.relpath(local_path, obsidian_dir)
-                md_content += f"![Image]({rel_path})\n\n"
-
-        md_content += "[🔗 查看原帖]({})\n\n".format(url)
+def translate_many(
+    texts: List[str],
+    cache: Optional[TranslationCache] = None,
+    max_workers: Optional[int] = None,
+    max_chars: Optional[int] = None,
+) -> List[str]:
+    """
+    Translate texts with packed, concurrent requests
+    Returns translations in input order, each falling back to its original text
+    """
+    results = list(texts)
+    pending = {}  # Unique uncached text -> indexes in texts
+    for idx, text in enumerate(texts):
+        cached = cache.get(text, TRANSLATE_TARGET) if cache is not None else None
+        if cached is not None:
+            results[idx] = cached
+        elif text.strip():
+            pending.setdefault(text, []).append(idx)
+    metrics.incr("translate.cache_hits", len(texts) - sum(map(len, pending.values())))
+    metrics.incr("translate.cache_misses", len(pending))
+    if not pending:
+        if cache is not None:
+            cache.flush()
+        return results
 
-        # Add separator except for the last tweet
-        if idx < len(tweets) - 1:
-            md_content += "---\n\n"
+    max_workers = max_workers or int(os.getenv("TRANSLATE_MAX_WORKERS", "4"))
+    max_chars = max_chars or int(os.getenv("TRANSLATE_BATCH_CHARS", "4500"))
+    unique = list(pending)
+    batches = [[unique[i] for i in batch] for batch in pack_batches(unique, max_chars)]
 
-    return md_content, local_images
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as pool:
+        for batch, translated in zip(
+            batches, pool.map(lambda b: _translate_batch(b, cache), batches)
+        ):
+            for text, translated_text in zip(batch, translated):
+                for idx in pending[text]:
+                    results[idx] = translated_text
+    if cache is not None:
+        # New translations and hits are written in one transaction
+        cache.flush()
+    return results
 
 
-def save_to_obsidian(md_content: str):
+@contextmanager
+def open_obsidian_note(
+    obsidian_dir: Optional[str] = None, filename: Optional[str] = None
+):
     """
-    Save markdown content to obsidian vault
+    Open a note in the vault for streamed writing, today's daily note by default
+    Content goes to a temp file that replaces the note only if writing succeeds
     """
-    obsidian_dir = os.getenv("OBSIDIAN_DIR")
+    obsidian_dir = obsidian_dir or os.getenv("OBSIDIAN_DIR")
     if not obsidian_dir:
-        logging.error("OBSIDIAN_DIR environment variable not set")
-        return
+        raise ValueError("OBSIDIAN_DIR environment variable not set")
 
     # Generate filename with current date
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    filename = f"{current_date}-Daily-Pulse.md"
-    filepath = os.path.join(obsidian_dir, filename)
+    filepath = os.path.join(obsidian_dir, filename or note_filename())
 
+    # Ensure directory exists
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    temp_path = filepath + ".tmp"
     try:
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as f:
+            yield f
+        os.replace(temp_path, filepath)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    logging.info(f"Successfully saved to Obsidian: {filepath}")
 
-        # Write content to file
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(md_content)
 
-        logging.info(f"Successfully saved to Obsidian: {filepath}")
+def save_to_obsidian(md_content: str, filename: Optional[str] = None):
+    """
+    Save markdown content to obsidian vault
+    """
+    try:
+        with open_obsidian_note(filename=filename) as f:
+            # Write content to file
+            f.write(md_content)
     except Exception as e:
         logging.error(f"Failed to save to Obsidian: {str(e)}")
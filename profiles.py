@@ -0,0 +1,324 @@
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from dotenv import load_dotenv
+
+from fetcher import fetch_tweets
+from html_cache import HtmlCache, get_html_cache
+from http_client import get_session
+from image_store import ImageStore
+from metrics import METRICS_DIR, metrics, write_report
+from notifier import send_email
+from pipeline import HtmlBuilder, run_pipeline
+from processor import (
+    download_image,
+    get_translation_cache,
+    open_obsidian_note,
+    translate_many,
+)
+from rate_limit import scheduler_from_env
+from renderer import Tee
+from seen_index import SeenIndex, get_seen_index
+from vault import note_filename
+
+PROFILES_FILE = "profiles.json"
+
+
+class Profile(NamedTuple):
+    name: str
+    query: str
+    vault: str
+    recipients: List[str] = []
+    target_count: int = 20
+    times: List[str] = []  # HH:MM runs in daemon mode, DAEMON_TIMES if empty
+
+
+def load_profiles(path: str) -> List[Profile]:
+    """
+    Read profiles from a JSON file: {"profiles": [{"name", "query", "vault",
+    "recipients", "target_count", "times"}, ...]}
+    Vault paths are relative to the file, recipients default to RECEIVER_EMAIL
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    profiles = []
+    for idx, entry in enumerate(data.get("profiles", [])):
+        for field in ("name", "query", "vault"):
+            if not entry.get(field):
+                raise ValueError(f"Profile {idx} in {path} has no {field}")
+        recipients, times = entry.get("recipients") or [], entry.get("times") or []
+        if isinstance(recipients, str):
+            recipients = recipients.split(",")
+        if isinstance(times, str):
+            times = times.split(",")
+        profiles.append(
+            Profile(
+                name=entry["name"],
+                query=entry["query"],
+                vault=os.path.join(base_dir, entry["vault"]),
+                recipients=[r.strip() for r in recipients if r.strip()],
+                target_count=int(entry.get("target_count", 20)),
+                times=[t.strip() for t in times if t.strip()],
+            )
+        )
+
+    for field in ("name", "vault"):
+        values = [getattr(profile, field) for profile in profiles]
+        if len(set(values)) != len(values):
+            raise ValueError(f"Profiles in {path} must have distinct {field}s")
+    return profiles
+
+
+def fetch_profiles(
+    profiles: List[Profile],
+    seen_indexes: Optional[Dict[str, SeenIndex]] = None,
+    slot: Optional[str] = None,
+) -> Dict[str, Optional[List[Dict]]]:
+    """
+    Fetch every distinct query once, concurrently, under one rate limit scheduler
+    A query skips tweets that every profile sharing it has already published
+    Returns each profile's tweets
+    """
+    scheduler = scheduler_from_env()
+    seen_indexes = seen_indexes or {}
+    searches: Dict[tuple, List[Profile]] = {}
+    for profile in profiles:
+        searches.setdefault((profile.query, profile.target_count), []).append(profile)
+
+    def excluder(sharing: List[Profile]) -> Optional[Callable[[Dict], bool]]:
+        indexes = [seen_indexes.get(profile.name) for profile in sharing]
+        if None in indexes:
+            return None
+        note = note_filename(slot=slot)
+        return lambda tweet: all(index.seen(tweet, note) for index in indexes)
+
+    with ThreadPoolExecutor(max_workers=len(searches)) as pool:
+        futures = {
+            search: pool.submit(
+                fetch_tweets,
+                search[1],
+                base_query=search[0],
+                scheduler=scheduler,
+                exclude=excluder(sharing),
+            )
+            for search, sharing in searches.items()
+        }
+        return {p.name: futures[(p.query, p.target_count)].result() for p in profiles}
+
+
+def translate_shared(tweets: List[Dict], obsidian_dir: str) -> Dict[str, str]:
+    """
+    Translate each distinct tweet text once for every profile
+    """
+    texts = list(dict.fromkeys(tweet.get("text", "") for tweet in tweets))
+    cache = get_translation_cache(obsidian_dir)
+    return dict(zip(texts, translate_many(texts, cache)))
+
+
+def download_shared(
+    needed: Dict[str, List[str]], max_workers: Optional[int] = None
+) -> Dict[str, Dict[str, str]]:
+    """
+    Download each image URL once and copy it into every vault that shows it
+    needed maps URL -> vaults; returns vault -> {URL: local path}
+    """
+    max_workers = max_workers or int(os.getenv("IMAGE_MAX_WORKERS", "8"))
+    stores = {
+        vault: ImageStore(os.path.join(vault, "images"))
+        for vaults in needed.values()
+        for vault in vaults
+    }
+    session = get_session(max_workers)
+
+    def fetch(url: str) -> Dict[str, str]:
+        vaults = needed[url]
+        # A vault that already holds the image spares the download
+        source = next(filter(None, (stores[v].get(url) for v in vaults)), None)
+        if source is None:
+            store = stores[vaults[0]]
+            result = download_image(url, store.image_dir, session, store=store)
+            if not result.ok:
+                return {}
+            source = result.path
+        return {vault: stores[vault].import_file(url, source) for vault in vaults}
+
+    images: Dict[str, Dict[str, str]] = {vault: {} for vault in stores}
+    if not needed:
+        return images
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for url, paths in zip(needed, pool.map(fetch, needed)):
+            for vault, path in paths.items():
+                images[vault][url] = path
+    return images
+
+
+def publish_profile(
+    profile: Profile,
+    tweets: List[Dict],
+    translations: Dict[str, str],
+    images: Dict[str, str],
+    seen_index: Optional[SeenIndex] = None,
+    html_cache: Optional[HtmlCache] = None,
+    slot: Optional[str] = None,
+) -> bool:
+    """
+    Write the profile's note and email it, with translations and images that
+    are already prepared
+    """
+    note_name = note_filename(slot=slot)
+    email_buffer = io.StringIO()
+    html_builder = HtmlBuilder(html_cache)
+    try:
+        with open_obsidian_note(profile.vault, note_name) as note:
+            local_images = run_pipeline(
+                tweets,
+                profile.vault,
+                Tee(note, email_buffer, html_builder),
+                translations=translations,
+                images=images,
+            )
+    except Exception as e:
+        logging.error(f"[{profile.name}] Failed to save to Obsidian: {str(e)}")
+        return False
+    finally:
+        html_content = html_builder.close()
+    if seen_index is not None:
+        seen_index.add(tweets, note_name)
+
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    results = send_email(
+        email_buffer.getvalue(),
+        local_images,
+        html_content,
+        subject=f"[Daily Pulse · {profile.name}] X 热门资讯 - {current_date}",
+        recipients=profile.recipients or None,
+    )
+    return bool(results) and all(result.ok for result in results.values())
+
+
+def run_profiles(
+    profiles: List[Profile], slot: Optional[str] = None
+) -> Dict[str, bool]:
+    """
+    Build every profile's digest from one shared pass of fetching, translation
+    and image downloads, then render and deliver the digests concurrently
+    A slot (HH:MM) gives each of several runs a day its own notes
+    Returns whether each profile succeeded: False when its fetch, note or
+    delivery failed, True when it was delivered or had nothing new to publish
+    """
+    seen_indexes: Dict[str, SeenIndex] = {}
+    if os.getenv("SEEN_INDEX") != "off":
+        for profile in profiles:
+            seen_indexes[profile.name] = get_seen_index(profile.vault)
+    with metrics.stage("fetch"):
+        fetched = fetch_profiles(profiles, seen_indexes, slot)
+
+    outcomes: Dict[str, bool] = {}
+    selected: Dict[str, List[Dict]] = {}
+    for profile in profiles:
+        tweets = fetched[profile.name]
+        if tweets is None:
+            logging.error(f"[{profile.name}] Failed to fetch tweets")
+            outcomes[profile.name] = False
+            continue
+        if tweets and profile.name in seen_indexes:
+            # A query shared with other profiles may return what only this
+            # profile has published
+            tweets = seen_indexes[profile.name].filter(tweets, note_filename(slot=slot))
+        if not tweets:
+            logging.warning(f"[{profile.name}] No new tweets to publish")
+            outcomes[profile.name] = True
+            continue
+        selected[profile.name] = tweets
+    if not selected:
+        return outcomes
+
+    by_name = {profile.name: profile for profile in profiles}
+    unique = {}
+    needed: Dict[str, List[str]] = {}
+    for name, tweets in selected.items():
+        for tweet in tweets:
+            unique.setdefault(tweet["id"], tweet)
+            for url in tweet.get("images", []):
+                vaults = needed.setdefault(url, [])
+                if by_name[name].vault not in vaults:
+                    vaults.append(by_name[name].vault)
+    total = sum(len(tweets) for tweets in selected.values())
+    logging.info(
+        f"{len(selected)} profiles share {len(unique)} unique tweets out of {total}"
+    )
+    metrics.incr("profiles.tweets", total)
+    metrics.incr("profiles.unique_tweets", len(unique))
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        # Translation and downloads do not depend on each other
+        first_vault = by_name[next(iter(selected))].vault
+        # Image paths are relative to each vault, so tweets shared between
+        # profiles render to the same fragments
+        html_cache = get_html_cache(first_vault)
+        translated = pool.submit(translate_shared, list(unique.values()), first_vault)
+        downloaded = pool.submit(download_shared, needed)
+        with metrics.stage("translate_and_download"):
+            translations, images = translated.result(), downloaded.result()
+
+    with metrics.stage("publish"), ThreadPoolExecutor(len(selected)) as pool:
+        futures = {
+            name: pool.submit(
+                publish_profile,
+                by_name[name],
+                tweets,
+                translations,
+                images.get(by_name[name].vault, {}),
+                seen_indexes.get(name),
+                html_cache,
+                slot,
+            )
+            for name, tweets in selected.items()
+        }
+        outcomes.update((name, future.result()) for name, future in futures.items())
+    return {profile.name: outcomes[profile.name] for profile in profiles}
+
+
+def main(argv=None) -> int:
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Daily Pulse for several profiles")
+    parser.add_argument(
+        "config", nargs="?", default=os.getenv("PROFILES_FILE", PROFILES_FILE)
+    )
+    parser.add_argument("--only", action="append", help="profile name to run")
+    parser.add_argument("--slot", help="HH:MM run of several a day, keys the notes")
+    args = parser.parse_args(argv)
+
+    profiles = load_profiles(args.config)
+    if args.only:
+        profiles = [profile for profile in profiles if profile.name in args.only]
+    if not profiles:
+        logging.error(f"No profiles to run in {args.config}")
+        return 1
+
+    metrics.reset()
+    try:
+        results = run_profiles(profiles, args.slot)
+    finally:
+        if os.getenv("METRICS") != "off":
+            config_dir = os.path.dirname(os.path.abspath(args.config))
+            write_report(os.path.join(config_dir, METRICS_DIR))
+    for name, ok in results.items():
+        logging.info(f"[{name}] {'ok' if ok else 'failed'}")
+    return 0 if all(results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
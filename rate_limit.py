@@ -0,0 +1,255 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from metrics import metrics
+
+# Statuses worth another attempt, possibly with another key
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# The key is invalid or not subscribed to the API
+KEY_REJECTED_STATUSES = {401, 403}
+RATE_LIMIT_PREFIX = "x-ratelimit-"
+
+
+class TokenBucket:
+    """
+    Token bucket allowing `rate` requests per second with bursts of `capacity`
+    Not thread-safe on its own, the scheduler serializes access
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self._clock = clock
+        self.updated = clock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """
+        Seconds until a token is available
+        """
+        self._refill(self._clock() if now is None else now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def reserve(self, now: Optional[float] = None) -> float:
+        """
+        Take a token, returning how long to wait before using it
+        Tokens may go negative, so concurrent callers queue up behind each other
+        """
+        wait = self.delay(now)
+        self.tokens -= 1
+        return wait
+
+    def hold(self, seconds: float):
+        """
+        Hand out no tokens for the next `seconds`
+        """
+        self._refill(self._clock())
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class ApiKey:
+    def __init__(self, value: str, bucket: TokenBucket):
+        self.value = value
+        self.bucket = bucket
+        self.blocked_until = 0.0
+        self.rejected = False
+        self.remaining: Optional[int] = None
+
+
+def parse_rate_limit(headers) -> Tuple[Optional[int], Optional[float]]:
+    """
+    Lowest remaining quota and its reset delay in seconds across the
+    x-ratelimit-*-remaining / x-ratelimit-*-reset header pairs RapidAPI sends
+    """
+    headers = {name.lower(): value for name, value in headers.items()}
+    remaining, reset = None, None
+    for name, value in headers.items():
+        if not (name.startswith(RATE_LIMIT_PREFIX) and name.endswith("-remaining")):
+            continue
+        try:
+            count = int(value)
+        except ValueError:
+            continue
+        if remaining is None or count < remaining:
+            remaining = count
+            try:
+                reset = float(headers.get(name[: -len("remaining")] + "reset"))
+            except (TypeError, ValueError):
+                reset = None
+    return remaining, reset
+
+
+def retry_after(headers) -> Optional[float]:
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float, cap: float = 60.0) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+class RequestScheduler:
+    """
+    Paces API requests with one token bucket per key and retries throttled or
+    failed requests
+
+    Each request goes to the key that can send soonest, so several keys add
+    up their throughput. Keys whose quota headers reach zero, or that get a
+    429, are parked until their reset; rejected keys (401/403) are dropped.
+    """
+
+    def __init__(
+        self,
+        keys: List[str],
+        rate: float = 5.0,
+        burst: Optional[float] = None,
+        retries: int = 4,
+        backoff: float = 0.5,
+        max_wait: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.keys = [ApiKey(key, TokenBucket(rate, burst, clock)) for key in keys]
+        self.retries = retries
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def _wait(self, metric: str, seconds: float):
+        # Waits are recorded apart from http.latency, which times the requests
+        metrics.observe(metric, seconds)
+        self._sleep(seconds)
+
+    def _reserve(self) -> Optional[Tuple[ApiKey, float]]:
+        with self._lock:
+            now = self._clock()
+            best, best_wait = None, None
+            for key in self.keys:
+                if key.rejected:
+                    continue
+                wait = max(key.blocked_until - now, key.bucket.delay(now))
+                if best is None or wait < best_wait:
+                    best, best_wait = key, wait
+            if best is None or best_wait > self.max_wait:
+                return None
+            best.bucket.reserve(now)
+            return best, best_wait
+
+    def _observe(self, key: ApiKey, response: requests.Response):
+        remaining, reset = parse_rate_limit(response.headers)
+        with self._lock:
+            if remaining is not None:
+                key.remaining = remaining
+            if response.status_code in KEY_REJECTED_STATUSES:
+                key.rejected = True
+                logging.warning(f"RapidAPI key ...{key.value[-4:]} was rejected")
+                return
+            if remaining is not None and remaining <= 0:
+                # Quota used up, park the key until its window resets
+                key.blocked_until = self._clock() + (reset or self.max_wait)
+                metrics.incr("http.keys_exhausted")
+                logging.warning(
+                    f"RapidAPI key ...{key.value[-4:]} exhausted, "
+                    f"resets in {reset or self.max_wait:.0f}s"
+                )
+            elif response.status_code == 429:
+                delay = retry_after(response.headers)
+                if delay is None:
+                    delay = backoff_delay(0, self.backoff) + self.backoff
+                key.blocked_until = max(key.blocked_until, self._clock() + delay)
+                key.bucket.hold(delay)
+
+    def request(
+        self,
+        session: requests.Session,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> Optional[requests.Response]:
+        """
+        GET url with the next available key, retrying 429s, 5xx replies and
+        connection errors
+        Returns the last response, or None when no key can be used in time
+        A rejection of the last usable key is returned as is, so its reply is
+        not lost
+        """
+        for attempt in range(self.retries + 1):
+            picked = self._reserve()
+            if picked is None:
+                if all(key.rejected for key in self.keys):
+                    logging.error("Every RapidAPI key was rejected")
+                else:
+                    logging.error("No RapidAPI key available within the wait limit")
+                return None
+            key, wait = picked
+            if wait > 0:
+                self._wait("http.throttle", wait)
+
+            try:
+                # Time to response headers, the body is timed as it is parsed
+                with metrics.timer("http.latency"):
+                    response = session.get(
+                        url,
+                        headers={**(headers or {}), "x-rapidapi-key": key.value},
+                        **kwargs,
+                    )
+            except requests.RequestException as e:
+                if attempt == self.retries:
+                    raise
+                metrics.incr("http.retries")
+                logging.warning(f"Request failed: {str(e)}, retrying")
+                self._wait("http.backoff", backoff_delay(attempt, self.backoff))
+                continue
+
+            self._observe(key, response)
+            status = response.status_code
+            retryable = status in RETRY_STATUSES or status in KEY_REJECTED_STATUSES
+            if status in KEY_REJECTED_STATUSES and all(k.rejected for k in self.keys):
+                retryable = False
+            if not retryable or attempt == self.retries:
+                return response
+            response.close()
+            metrics.incr("http.retries")
+            if status == 429:
+                metrics.incr("http.rate_limited")
+            elif status >= 500:
+                self._wait("http.backoff", backoff_delay(attempt, self.backoff))
+            logging.warning(f"Search returned {status}, retrying")
+        return None
+
+
+def scheduler_from_env() -> RequestScheduler:
+    """
+    Scheduler for the comma-separated keys in RAPIDAPI_KEY, paced to the plan's
+    RAPIDAPI_RATE requests per second
+    """
+    keys = [k.strip() for k in (os.getenv("RAPIDAPI_KEY") or "").split(",")]
+    rate = float(os.getenv("RAPIDAPI_RATE", "5"))
+    burst = os.getenv("RAPIDAPI_BURST")
+    return RequestScheduler(
+        [key for key in keys if key] or [""],
+        rate=rate,
+        burst=float(burst) if burst else None,
+        retries=int(os.getenv("RAPIDAPI_RETRIES", "4")),
+        max_wait=float(os.getenv("RAPIDAPI_MAX_WAIT", "60")),
+    )
@@ -0,0 +1,67 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Precompiled fragments of the daily digest, filled with str.format
+HEADER_TEMPLATE = "# {title} - {date}\n\n".format
+TWEET_TEMPLATE = (
+    "### [{author}]({url})\n\n"
+    "**发布时间:** {date} | ❤️ {likes}\n\n"
+    "> {text}\n\n"
+    "> 🇨🇳 译文：{translated}\n\n"
+).format
+IMAGE_TEMPLATE = "![Image]({path})\n\n".format
+LINK_TEMPLATE = "[🔗 查看原帖]({url})\n\n".format
+SEPARATOR = "---\n\n"
+
+
+class Tee:
+    """
+    File-like sink that forwards every write to several sinks
+    """
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def write(self, fragment: str) -> int:
+        for sink in self.sinks:
+            sink.write(fragment)
+        return len(fragment)
+
+
+def render_tweet(tweet: Dict, translated_text: str, image_paths: List[str]) -> str:
+    """
+    Render one tweet section, images go between the translation and the link
+    """
+    url = tweet.get("url", "")
+    parts = [
+        TWEET_TEMPLATE(
+            author=tweet.get("author", "Unknown"),
+            url=url,
+            date=tweet.get("date", ""),
+            likes=tweet.get("likes", 0),
+            text=tweet.get("text", ""),
+            translated=translated_text,
+        )
+    ]
+    parts.extend(IMAGE_TEMPLATE(path=path) for path in image_paths)
+    parts.append(LINK_TEMPLATE(url=url))
+    return "".join(parts)
+
+
+def render_markdown(
+    items: Iterable[Tuple[Dict, str, List[str]]],
+    sink,
+    current_date: Optional[str] = None,
+    title: str = "Daily Pulse",
+):
+    """
+    Write the digest for (tweet, translated_text, image_paths) items to sink
+    Sections are written as they are rendered, separated by a rule
+    """
+    current_date = current_date or datetime.now().strftime("%Y-%m-%d")
+    sink.write(HEADER_TEMPLATE(title=title, date=current_date))
+    for idx, (tweet, translated_text, image_paths) in enumerate(items):
+        # Separator between tweets, none after the last one
+        if idx:
+            sink.write(SEPARATOR)
+        sink.write(render_tweet(tweet, translated_text, image_paths))
@@ -0,0 +1,245 @@
+import argparse
+import heapq
+import io
+import json
+import logging
+import os
+import sys
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from checkpoint import RunCheckpoint
+from notifier import receiver_emails, send_email
+from processor import save_to_obsidian
+from renderer import render_markdown
+from vault import NOTE_NAME, iter_note_files, parse_note
+
+SUMMARY_NAME = ".day_summaries.json"
+PERIODS = {"weekly": "Weekly Pulse", "monthly": "Monthly Pulse"}
+
+
+class Rollup(NamedTuple):
+    filename: str
+    label: str
+    markdown: str
+    records: List[Dict]
+    local_images: List[str]
+
+
+def period_bounds(kind: str, day: date) -> Tuple[date, date, str]:
+    """
+    First and last day of the week (ISO, Monday first) or month containing day,
+    with the period's label
+    """
+    if kind == "weekly":
+        start = day - timedelta(days=day.weekday())
+        year, week, _ = day.isocalendar()
+        return start, start + timedelta(days=6), f"{year}-W{week:02d}"
+    start = day.replace(day=1)
+    following = (start + timedelta(days=32)).replace(day=1)
+    return start, following - timedelta(days=1), start.strftime("%Y-%m")
+
+
+def rollup_filename(kind: str, label: str) -> str:
+    return f"{label}-{PERIODS[kind].replace(' ', '-')}.md"
+
+
+class DaySummaries:
+    """
+    Cache of each daily note's top tweets by likes, kept in one JSON file
+
+    An entry is reused while its note's mtime and size are unchanged and it
+    holds at least as many tweets as requested, so a rollup only reparses the
+    notes written or edited since the last one.
+    """
+
+    def __init__(self, obsidian_dir: str, path: Optional[str] = None):
+        self.obsidian_dir = obsidian_dir
+        self.path = path or os.path.join(obsidian_dir, SUMMARY_NAME)
+        self.parsed = 0
+        self._dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries: Dict[str, Dict] = json.load(f)
+        except FileNotFoundError:
+            self._entries = {}
+        except ValueError as e:
+            logging.warning(f"Ignoring unreadable day summaries {self.path}: {e}")
+            self._entries = {}
+
+    def top(self, name: str, size: int) -> List[Dict]:
+        """
+        The note's size most-liked tweets, most liked first
+        """
+        stat = os.stat(os.path.join(self.obsidian_dir, name))
+        entry = self._entries.get(name)
+        if (
+            entry
+            and entry["mtime"] == stat.st_mtime
+            and entry["size"] == stat.st_size
+            and (entry["top_size"] >= size or entry["complete"])
+        ):
+            return entry["top"][:size]
+
+        with open(os.path.join(self.obsidian_dir, name), "r", encoding="utf-8") as f:
+            records = parse_note(f.read())
+        records.sort(key=lambda r: r["likes"], reverse=True)
+        self.parsed += 1
+        self._dirty = True
+        self._entries[name] = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "top_size": size,
+            "complete": len(records) <= size,
+            "top": records[:size],
+        }
+        return records[:size]
+
+    def save(self):
+        if not self._dirty:
+            return
+        # Forget notes that no longer exist
+        names = set(iter_note_files(self.obsidian_dir))
+        entries = {k: v for k, v in self._entries.items() if k in names}
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+        self._dirty = False
+
+
+def notes_between(obsidian_dir: str, start: date, end: date) -> List[str]:
+    first, last = start.isoformat(), end.isoformat()
+    return [
+        name
+        for name in iter_note_files(obsidian_dir)
+        if first <= NOTE_NAME.match(name).group(1) <= last
+    ]
+
+
+def top_tweets(summaries: List[List[Dict]], size: int) -> List[Dict]:
+    """
+    Merge per-day lists sorted by likes into the period's size most-liked
+    unique tweets
+
+    The heap holds one cursor per day and stops after size unique tweets. A
+    tweet seen on several days is kept where it had the most likes, which is
+    its first appearance in the merged order.
+    """
+    merged: Iterator[Dict] = heapq.merge(
+        *summaries, key=lambda r: r["likes"], reverse=True
+    )
+    seen = set()
+
+    def unique():
+        for record in merged:
+            key = record["id"] or record["url"]
+            if key not in seen:
+                seen.add(key)
+                yield record
+
+    return list(islice(unique(), size))
+
+
+def build_rollup(
+    obsidian_dir: str,
+    kind: str,
+    day: date,
+    size: Optional[int] = None,
+    summaries: Optional[DaySummaries] = None,
+) -> Rollup:
+    """
+    Render the period's top tweets in the daily digest format
+    """
+    size = size or int(os.getenv("ROLLUP_SIZE", "30"))
+    start, end, label = period_bounds(kind, day)
+    summaries = summaries or DaySummaries(obsidian_dir)
+    tops = [
+        summaries.top(name, size) for name in notes_between(obsidian_dir, start, end)
+    ]
+    summaries.save()
+    records = top_tweets(tops, size)
+
+    # Translations and images come from the daily notes, nothing is refetched
+    local_images = []
+    for record in records:
+        for path in record["images"]:
+            full_path = os.path.join(obsidian_dir, path)
+            if os.path.exists(full_path) and full_path not in local_images:
+                local_images.append(full_path)
+    buffer = io.StringIO()
+    render_markdown(
+        ((record, record["translated"], record["images"]) for record in records),
+        buffer,
+        f"{label} ({start.isoformat()} ~ {end.isoformat()})",
+        PERIODS[kind],
+    )
+    logging.info(
+        f"{PERIODS[kind]} {label}: {len(records)} tweets from {len(tops)} notes, "
+        f"{summaries.parsed} reparsed"
+    )
+    return Rollup(
+        rollup_filename(kind, label), label, buffer.getvalue(), records, local_images
+    )
+
+
+def main(argv=None) -> int:
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Weekly and monthly top digests")
+    parser.add_argument("kind", choices=sorted(PERIODS))
+    parser.add_argument(
+        "--date",
+        help="any day of the period, YYYY-MM-DD (default: yesterday, so a run "
+        "on Monday or the 1st covers the period that just ended)",
+    )
+    parser.add_argument("--top", type=int, help="tweets per digest (ROLLUP_SIZE)")
+    parser.add_argument("--no-email", action="store_true")
+    args = parser.parse_args(argv)
+
+    obsidian_dir = os.getenv("OBSIDIAN_DIR")
+    if not obsidian_dir:
+        logging.error("OBSIDIAN_DIR environment variable not set")
+        return 1
+    if args.date:
+        day = datetime.strptime(args.date, "%Y-%m-%d").date()
+    else:
+        day = date.today() - timedelta(days=1)
+
+    rollup = build_rollup(obsidian_dir, args.kind, day, args.top)
+    if not rollup.records:
+        logging.warning(f"No tweets found for {rollup.label}")
+        return 1
+    save_to_obsidian(rollup.markdown, rollup.filename)
+    if not args.no_email:
+        subject = f"[{PERIODS[args.kind]}] X 热门资讯 - {rollup.label}"
+        # A rerun only sends to the recipients an earlier attempt did not reach
+        checkpoint = RunCheckpoint(obsidian_dir)
+        stage = f"rollup-{args.kind}-{rollup.label}"
+        delivered = checkpoint.load(stage, [])
+        recipients = receiver_emails()
+        pending = [r for r in recipients if r not in delivered]
+        if not pending and recipients:
+            logging.info(f"{PERIODS[args.kind]} {rollup.label} already delivered")
+            return 0
+        results = send_email(
+            rollup.markdown,
+            rollup.local_images,
+            subject=subject,
+            recipients=pending or None,
+        )
+        delivered += [r for r, result in (results or {}).items() if result.ok]
+        checkpoint.save(stage, delivered)
+        # Any recipient that was not delivered fails the run
+        if not results or not all(result.ok for result in results.values()):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shlex
+import sqlite3
+import sys
+from typing import Dict, List, Optional, Tuple, Union
+
+from dotenv import load_dotenv
+
+from vault import iter_note_files, parse_note
+
+INDEX_NAME = ".search_index.sqlite"
+
+# CJK has no spaces between words, so each character is indexed as its own token
+# and searched as a phrase; everything else goes through the unicode61 tokenizer
+CJK_CHAR = re.compile(
+    r"([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff])"
+)
+ORDERS = {
+    "rank": "rank",
+    "likes": "t.likes DESC",
+    "date": "t.date DESC",
+}
+
+
+def segment(text: str) -> str:
+    return CJK_CHAR.sub(r" \1 ", text or "")
+
+
+def match_expression(query: Union[str, List[str]]) -> str:
+    """
+    Turn a search box query into an FTS5 MATCH expression
+    Every word or "quoted phrase" must match; a trailing * matches prefixes
+    A list holds terms already split (e.g. by the shell), each one a phrase
+    """
+    if isinstance(query, str):
+        try:
+            terms = shlex.split(query)
+        except ValueError:
+            terms = query.split()
+    else:
+        terms = query
+    parts = []
+    for term in terms:
+        prefix = term.endswith("*") and len(term) > 1
+        term = term.rstrip("*") if prefix else term
+        tokens = segment(term).split()
+        if not tokens:
+            continue
+        phrase = '"' + " ".join(tokens).replace('"', '""') + '"'
+        parts.append(phrase + " *" if prefix else phrase)
+    return " ".join(parts)
+
+
+def file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class SearchIndex:
+    """
+    SQLite FTS5 index over the tweets of every daily note in the vault
+
+    Notes are tracked by mtime and size, then by content hash, so update()
+    only reparses notes that were added or actually changed.
+    """
+
+    def __init__(self, obsidian_dir: str, path: Optional[str] = None):
+        self.obsidian_dir = obsidian_dir
+        self.path = path or os.path.join(obsidian_dir, INDEX_NAME)
+        self._db = sqlite3.connect(self.path)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS notes (
+                    name TEXT PRIMARY KEY,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    digest TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS tweets (
+                    id INTEGER PRIMARY KEY,
+                    note TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    tweet_id TEXT NOT NULL,
+                    author TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    likes INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    translated TEXT NOT NULL,
+                    images TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS tweets_note ON tweets (note);
+                CREATE INDEX IF NOT EXISTS tweets_likes ON tweets (likes);
+                CREATE INDEX IF NOT EXISTS tweets_date ON tweets (date);
+                CREATE INDEX IF NOT EXISTS tweets_author
+                    ON tweets (author COLLATE NOCASE);
+                CREATE VIRTUAL TABLE IF NOT EXISTS tweets_fts USING fts5 (
+                    author, text, translated,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                );
+                """)
+
+    def update(self) -> Tuple[int, int]:
+        """
+        Bring the index in line with the notes on disk
+        Returns (notes reindexed, notes removed)
+        """
+        known = {
+            row["name"]: row
+            for row in self._db.execute("SELECT name, mtime, size, digest FROM notes")
+        }
+        indexed = 0
+        with self._db:
+            for name in iter_note_files(self.obsidian_dir):
+                path = os.path.join(self.obsidian_dir, name)
+                stat = os.stat(path)
+                row = known.pop(name, None)
+                if (
+                    row
+                    and row["mtime"] == stat.st_mtime
+                    and row["size"] == stat.st_size
+                ):
+                    continue
+                digest = file_digest(path)
+                if row is None or row["digest"] != digest:
+                    with open(path, "r", encoding="utf-8") as f:
+                        self._index_note(name, parse_note(f.read()))
+                    indexed += 1
+                self._db.execute(
+                    "INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?)",
+                    (name, stat.st_mtime, stat.st_size, digest),
+                )
+            # Notes that disappeared from the vault
+            for name in known:
+                self._remove_note(name)
+                self._db.execute("DELETE FROM notes WHERE name = ?", (name,))
+        if indexed or known:
+            logging.info(f"Search index: {indexed} notes indexed, {len(known)} removed")
+        return indexed, len(known)
+
+    def _remove_note(self, name: str):
+        self._db.execute(
+            "DELETE FROM tweets_fts WHERE rowid IN "
+            "(SELECT id FROM tweets WHERE note = ?)",
+            (name,),
+        )
+        self._db.execute("DELETE FROM tweets WHERE note = ?", (name,))
+
+    def _index_note(self, name: str, records: List[Dict]):
+        self._remove_note(name)
+        for position, record in enumerate(records):
+            cursor = self._db.execute(
+                "INSERT INTO tweets (note, position, tweet_id, author, url, date, "
+                "likes, text, translated, images) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    name,
+                    position,
+                    record["id"],
+                    record["author"],
+                    record["url"],
+                    record["date"],
+                    record["likes"],
+                    record["text"],
+                    record["translated"],
+                    json.dumps(record["images"]),
+                ),
+            )
+            self._db.execute(
+                "INSERT INTO tweets_fts (rowid, author, text, translated) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    cursor.lastrowid,
+                    record["author"],
+                    segment(record["text"]),
+                    segment(record["translated"]),
+                ),
+            )
+
+    def search(
+        self,
+        query: Union[str, List[str]] = "",
+        author: Optional[str] = None,
+        min_likes: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 20,
+        order: str = "rank",
+    ) -> List[Dict]:
+        """
+        Find tweets matching the full-text query and filters
+        since/until are inclusive YYYY-MM-DD dates; results are ranked by bm25
+        unless ordered by likes or date
+        """
+        expression = match_expression(query)
+        clauses, params = [], []
+        if expression:
+            clauses.append("tweets_fts MATCH ?")
+            params.append(expression)
+        if author:
+            clauses.append("t.author = ? COLLATE NOCASE")
+            params.append(author.lstrip("@"))
+        if min_likes is not None:
+            clauses.append("t.likes >= ?")
+            params.append(min_likes)
+        if since:
+            clauses.append("t.date >= ?")
+            params.append(since)
+        if until:
+            # Dates carry a time, so the whole last day sorts before its successor
+            clauses.append("t.date < ?")
+            params.append(until + "~")
+
+        if expression:
+            source = "tweets_fts JOIN tweets t ON t.id = tweets_fts.rowid"
+            order_by = ORDERS.get(order, "rank")
+        else:
+            source = "tweets t"
+            order_by = ORDERS["date"] if order == "rank" else ORDERS[order]
+        sql = (
+            f"SELECT t.* FROM {source}"
+            + (" WHERE " + " AND ".join(clauses) if clauses else "")
+            + f" ORDER BY {order_by} LIMIT ?"
+        )
+        rows = self._db.execute(sql, params + [limit]).fetchall()
+        return [
+            {
+                "note": row["note"],
+                "id": row["tweet_id"],
+                "author": row["author"],
+                "url": row["url"],
+                "date": row["date"],
+                "likes": row["likes"],
+                "text": row["text"],
+                "translated": row["translated"],
+                "images": json.loads(row["images"]),
+            }
+            for row in rows
+        ]
+
+    def close(self):
+        self._db.close()
+
+
+def format_result(record: Dict, width: int = 160) -> str:
+    text = " ".join(record["text"].split())
+    if len(text) > width:
+        text = text[: width - 1] + "…"
+    return (
+        f"{record['date']} | ❤️ {record['likes']} | @{record['author']}\n"
+        f"  {text}\n"
+        f"  {record['url']}"
+    )
+
+
+def main(argv=None) -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Search the Daily Pulse archive")
+    parser.add_argument("query", nargs="*", help='words or "exact phrases"')
+    parser.add_argument("--vault", default=os.getenv("OBSIDIAN_DIR"))
+    parser.add_argument("--author")
+    parser.add_argument("--min-likes", type=int)
+    parser.add_argument("--since", help="YYYY-MM-DD")
+    parser.add_argument("--until", help="YYYY-MM-DD")
+    parser.add_argument("--sort", choices=sorted(ORDERS), default="rank")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print JSON lines")
+    args = parser.parse_args(argv)
+    if not args.vault:
+        parser.error("--vault or OBSIDIAN_DIR is required")
+
+    # The shell already split the terms, so each argument is one phrase; only
+    # a lone argument with its own quotes is parsed like a search box query
+    query = args.query
+    if len(query) == 1 and '"' in query[0]:
+        query = query[0]
+    index = SearchIndex(args.vault)
+    try:
+        index.update()
+        results = index.search(
+            query,
+            author=args.author,
+            min_likes=args.min_likes,
+            since=args.since,
+            until=args.until,
+            limit=args.limit,
+            order=args.sort,
+        )
+    finally:
+        index.close()
+
+    for record in results:
+        if args.json:
+            print(json.dumps(record, ensure_ascii=False))
+        else:
+            print(format_result(record) + "\n")
+    return 0 if results else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from vault import iter_note_files, read_note
+
+INDEX_NAME = ".seen_index.tsv"
+
+URL_PATTERN = re.compile(r"https?://\S+")
+MENTION_PATTERN = re.compile(r"@\w+")
+# Short texts ("gm", a lone emoji) collide too easily to match on
+MIN_FINGERPRINT_CHARS = 30
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercased text without links, mentions or repeated whitespace
+    """
+    normalized = MENTION_PATTERN.sub("", URL_PATTERN.sub("", text or "")).lower()
+    return " ".join(normalized.split())
+
+
+def text_fingerprint(text: str) -> str:
+    """
+    Hash of the text with links, mentions, case and whitespace normalized away
+    """
+    normalized = normalize_text(text)
+    if len(normalized) < MIN_FINGERPRINT_CHARS:
+        return ""
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class SeenIndex:
+    """
+    Append-only index of tweets already published in the vault's daily notes
+
+    Lines are "N<TAB>note" for every note scanned and
+    "T<TAB>rest_id<TAB>fingerprint<TAB>note" for every tweet it contains.
+    Notes missing from the index are scanned on load, so it is built from the
+    archive the first time and catches up with notes written elsewhere.
+    """
+
+    def __init__(self, obsidian_dir: str, path: Optional[str] = None, match_text=True):
+        self.obsidian_dir = obsidian_dir
+        self.path = path or os.path.join(obsidian_dir, INDEX_NAME)
+        self.match_text = match_text
+        self.notes = set()
+        self.ids: Dict[str, str] = {}  # rest_id -> note
+        self.fingerprints: Dict[str, str] = {}  # fingerprint -> note
+        self._lock = threading.Lock()
+        self._load()
+        self.sync()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    if fields[0] == "N" and len(fields) == 2:
+                        self.notes.add(fields[1])
+                    elif fields[0] == "T" and len(fields) == 4:
+                        self._remember(fields[1], fields[2], fields[3])
+        except FileNotFoundError:
+            pass
+
+    def _remember(self, tweet_id: str, fingerprint: str, note: str):
+        if tweet_id:
+            self.ids[tweet_id] = note
+        if fingerprint:
+            self.fingerprints[fingerprint] = note
+
+    def sync(self):
+        """
+        Index any daily note not seen before
+        """
+        missing = [
+            name
+            for name in iter_note_files(self.obsidian_dir)
+            if name not in self.notes
+        ]
+        for name in missing:
+            try:
+                records = read_note(self.obsidian_dir, name)
+            except (OSError, UnicodeDecodeError) as e:
+                logging.warning(f"Skipping unreadable note {name}: {str(e)}")
+                continue
+            self.add(records, name)
+        if missing:
+            logging.info(f"Seen index caught up with {len(missing)} notes")
+
+    def add(self, tweets: Iterable[Dict], note: str):
+        """
+        Record the tweets published in note and persist them
+        """
+        lines = []
+        with self._lock:
+            for tweet in tweets:
+                tweet_id = tweet.get("id", "")
+                fingerprint = text_fingerprint(tweet.get("text", ""))
+                self._remember(tweet_id, fingerprint, note)
+                lines.append(f"T\t{tweet_id}\t{fingerprint}\t{note}\n")
+            if note not in self.notes:
+                self.notes.add(note)
+                lines.append(f"N\t{note}\n")
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+
+    def seen(self, tweet: Dict, current_note: Optional[str] = None) -> bool:
+        """
+        Whether the tweet was published in a note other than current_note
+        """
+        note = self.ids.get(tweet.get("id", ""))
+        if note is None and self.match_text:
+            fingerprint = text_fingerprint(tweet.get("text", ""))
+            note = self.fingerprints.get(fingerprint) if fingerprint else None
+        return note is not None and note != current_note
+
+    def filter(
+        self, tweets: List[Dict], current_note: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Drop tweets already published, keeping those of the note being regenerated
+        """
+        fresh = [tweet for tweet in tweets if not self.seen(tweet, current_note)]
+        if len(fresh) < len(tweets):
+            logging.info(f"Skipped {len(tweets) - len(fresh)} already published tweets")
+        return fresh
+
+
+_indexes: Dict[str, SeenIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_seen_index(obsidian_dir: str, path: Optional[str] = None) -> SeenIndex:
+    """
+    Open (once per process) the vault's seen index, catching up with notes
+    written since it was last used
+    """
+    key = os.path.abspath(path or os.path.join(obsidian_dir, INDEX_NAME))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = SeenIndex(obsidian_dir, path)
+            return index
+    index.sync()
+    return index
@@ -0,0 +1,112 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+Key = Tuple[str, ...]
+
+
+class SqliteCache:
+    """
+    Persistent SQLite table of cached strings with an in-memory LRU in front of it
+
+    New entries and hits read from disk are buffered and written in one
+    transaction by flush(), so a run does not commit once per lookup.
+    Subclasses name the table, its key columns and value column, and create it.
+    """
+
+    table = ""
+    key_columns: Tuple[str, ...] = ("key",)
+    value_column = "value"
+
+    def __init__(self, path: str, memory_size: int, max_entries: int):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[Key, str]" = OrderedDict()
+        self._pending: Dict[Key, str] = {}
+        self._used = set()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            for statement in self.schema():
+                self._db.execute(statement)
+        where = " AND ".join(f"{column} = ?" for column in self.key_columns)
+        self._select = f"SELECT {self.value_column} FROM {self.table} WHERE {where}"
+        self._touch = f"UPDATE {self.table} SET used = ? WHERE {where}"
+        columns = len(self.row(("",) * len(self.key_columns), "", 0))
+        self._insert = (
+            f"INSERT OR REPLACE INTO {self.table} VALUES ({', '.join('?' * columns)})"
+        )
+
+    def schema(self) -> Iterable[str]:
+        """
+        Statements creating the table and its indexes
+        """
+        raise NotImplementedError
+
+    def row(self, key: Key, value: str, now: float) -> tuple:
+        """
+        Values of the row inserted for a new entry
+        """
+        return (*key, value, now)
+
+    def lookup(self, key: Key) -> Optional[str]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is None:
+                value = self._pending.get(key)
+            if value is None:
+                row = self._db.execute(self._select, key).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                value = row[0]
+                self._used.add(key)
+            self._remember(key, value)
+            self.hits += 1
+            return value
+
+    def store(self, key: Key, value: str):
+        with self._lock:
+            self._remember(key, value)
+            self._pending[key] = value
+
+    def _remember(self, key: Key, value: str):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def flush(self):
+        """
+        Write new entries, mark entries read from disk as recently used and
+        drop the least recently used entries beyond max_entries
+        """
+        now = time.time()
+        with self._lock, self._db:
+            pending, used = self._pending, self._used - set(self._pending)
+            self._pending, self._used = {}, set()
+            if not pending and not used:
+                return
+            self._db.executemany(
+                self._insert,
+                [self.row(key, value, now) for key, value in pending.items()],
+            )
+            self._db.executemany(self._touch, [(now, *key) for key in used])
+            self._db.execute(
+                f"""
+                DELETE FROM {self.table} WHERE rowid IN (
+                    SELECT rowid FROM {self.table} ORDER BY used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._db.close()
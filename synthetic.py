@@ -0,0 +1,117 @@
+import random
+import time
+from typing import Dict, List, Optional
+
+
+def make_tweet_entry(
+    rest_id: str,
+    author: str = "author",
+    text: Optional[str] = None,
+    likes: int = 1000,
+    created_at_ms: Optional[int] = None,
+    images: Optional[List[str]] = None,
+    long_text: Optional[str] = None,
+) -> Dict:
+    """
+    Build a TimelineTimelineEntry shaped like the search-v3 response
+    """
+    created_at_ms = created_at_ms or int(time.time() * 1000)
+    tweet = {
+        "__typename": "Tweet",
+        "rest_id": rest_id,
+        "core": {
+            "user_results": {
+                "result": {
+                    "__typename": "User",
+                    "core": {"screen_name": author, "name": author.title()},
+                }
+            }
+        },
+        "details": {
+            "full_text": f"tweet {rest_id}" if text is None else text,
+            "created_at_ms": created_at_ms,
+        },
+        "counts": {"favorite_count": likes, "retweet_count": likes // 10},
+    }
+    if images:
+        tweet["media_entities"] = [
+            {"media_results": {"result": {"media_info": {"original_img_url": url}}}}
+            for url in images
+        ]
+    if long_text:
+        tweet["note_tweet"] = {"note_tweet_results": {"result": {"text": long_text}}}
+
+    return {
+        "__typename": "TimelineTimelineEntry",
+        "entry_id": f"tweet-{rest_id}",
+        "content": {
+            "__typename": "TimelineTimelineItem",
+            "content": {
+                "__typename": "TimelineTweet",
+                "tweet_results": {"result": tweet},
+            },
+        },
+    }
+
+
+def make_cursor_entry(value: str, cursor_type: str = "Bottom") -> Dict:
+    return {
+        "__typename": "TimelineTimelineEntry",
+        "entry_id": f"cursor-{cursor_type.lower()}-{value}",
+        "content": {
+            "__typename": "TimelineTimelineCursor",
+            "cursor_type": cursor_type,
+            "value": value,
+        },
+    }
+
+
+def make_page(entries: List[Dict], bottom_cursor: Optional[str] = None) -> Dict:
+    page = {
+        "result": {
+            "timeline": {
+                "instructions": [
+                    {"type": "TimelineClearCache"},
+                    {"type": "TimelineAddEntries", "entries": entries},
+                ]
+            }
+        }
+    }
+    if bottom_cursor:
+        page["cursor"] = {"bottom": bottom_cursor, "top": "top-" + bottom_cursor}
+    return page
+
+
+def make_timeline(count: int, seed: int = 0) -> Dict:
+    """
+    Generate a realistic search response with `count` tweet entries
+    Mixes in media, note_tweet long text, entries without text and cursors
+    """
+    rng = random.Random(seed)
+    now_ms = int(time.time() * 1000)
+    words = "market AI launch stock crypto model chip rate growth deal".split()
+    entries = []
+    for i in range(count):
+        rest_id = str(2000000000000000000 + i)
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(8, 40)))
+        images = [
+            f"https://pbs.twimg.com/media/{rest_id}_{n}.jpg"
+            for n in range(rng.choice((0, 0, 1, 2, 4)))
+        ]
+        long_text = text * 6 if rng.random() < 0.1 else None
+        if rng.random() < 0.02:
+            text = ""  # Skipped by the parser
+        entries.append(
+            make_tweet_entry(
+                rest_id,
+                author=f"user{rng.randint(0, count // 5 + 1)}",
+                text=text,
+                likes=rng.randint(500, 200000),
+                created_at_ms=now_ms - rng.randint(0, 86400000),
+                images=images,
+                long_text=long_text,
+            )
+        )
+    entries.append(make_cursor_entry("top-0", "Top"))
+    entries.append(make_cursor_entry(f"bottom-{count}"))
+    return make_page(entries, bottom_cursor=f"bottom-{count}")
@@ -0,0 +1,48 @@
+import os
+
+import benchmark
+import processor
+
+
+def test_benchmarks_run_on_a_small_timeline(tmp_path):
+    translate_backend = processor._translate_backend
+    history_path = str(tmp_path / "history.json")
+
+    status = benchmark.main([20], history_path=history_path, names=["parse_tweets"])
+
+    assert status == 0
+    [run] = benchmark.load_history(history_path)
+    assert run["environment"] == benchmark.environment()
+    assert run["results"]["parse_tweets"]["20"]["seconds"] > 0
+
+    results = benchmark.run_benchmarks([20], ["generate_markdown", "mime_build"])
+    assert set(results) == {"generate_markdown", "mime_build"}
+    # Stubs are removed again once the benchmark finishes
+    assert processor._translate_backend is translate_backend
+    assert "TRANSLATION_CACHE" not in os.environ
+
+
+def test_find_regressions_compares_against_recent_median():
+    def run(seconds, env=None):
+        return {
+            "environment": env or benchmark.environment(),
+            "results": {"parse_tweets": {"1000": {"seconds": seconds}}},
+        }
+
+    history = [run(10.0), run(1.0), run(1.1), run(0.9), run(0.1, env="other")]
+    slow = {"parse_tweets": {"1000": {"seconds": 1.6}}}
+    fine = {"parse_tweets": {"1000": {"seconds": 1.4}}}
+
+    assert benchmark.find_regressions(fine, history) == []
+    [regression] = benchmark.find_regressions(slow, history)
+    assert regression.startswith("parse_tweets [1000 tweets]")
+    assert benchmark.find_regressions(slow, history, threshold=2.0) == []
+    # The lenient default for tiny inputs does not override an explicit threshold
+    tiny = {"parse_tweets": {"20": {"seconds": 2.0}}}
+    tiny_history = [
+        {**entry, "results": {"parse_tweets": {"20": {"seconds": 1.0}}}}
+        for entry in history[1:4]
+    ]
+    assert benchmark.find_regressions(tiny, tiny_history) == []
+    assert benchmark.find_regressions(tiny, tiny_history, threshold=1.5)
+    assert benchmark.find_regressions(slow, []) == []
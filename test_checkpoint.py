@@ -0,0 +1,162 @@
+import json
+import os
+
+import main
+import processor
+from checkpoint import RunCheckpoint
+from delivery import DeliveryResult
+from vault import note_filename
+
+
+def test_checkpoint_round_trips_and_prunes(tmp_path):
+    checkpoint = RunCheckpoint(str(tmp_path), "2026-05-10")
+    assert checkpoint.resume_stage() == "tweets"
+    assert checkpoint.load("tweets") is None
+
+    tweets = [{"id": "1", "text": "héllo ❤️", "likes": 3, "images": []}]
+    checkpoint.save("tweets", tweets)
+    checkpoint.save("translations", {"héllo ❤️": "你好"})
+    assert checkpoint.load("tweets") == tweets
+    assert checkpoint.resume_stage() == "images"
+    assert not any(name.endswith(".tmp") for name in os.listdir(checkpoint.path))
+
+    checkpoint.clear(["tweets"])
+    assert checkpoint.resume_stage() == "tweets"
+    assert checkpoint.load("translations") == {"héllo ❤️": "你好"}
+
+    old = RunCheckpoint(str(tmp_path), "2000-01-01")
+    old.save("tweets", [])
+    checkpoint.prune(7)
+    assert sorted(os.listdir(checkpoint.runs_dir)) == ["2026-05-10"]
+
+
+def test_main_resumes_from_the_failed_stage(monkeypatch, tmp_path):
+    monkeypatch.setenv("OBSIDIAN_DIR", str(tmp_path))
+    monkeypatch.setenv("SEEN_INDEX", "off")
+    monkeypatch.setenv("TRANSLATION_CACHE", "off")
+    tweets = [
+        {"id": str(i), "text": f"tweet {i}", "url": f"u{i}", "images": []}
+        for i in range(3)
+    ]
+    calls = {"fetch": 0, "translate": [], "email": []}
+
+    def fake_fetch(snapshot_path=None, exclude=None):
+        calls["fetch"] += 1
+        return [dict(tweet) for tweet in tweets]
+
+    def fake_translate(text):
+        calls["translate"].append(text)
+        return text.upper()
+
+    outcomes = [None, {"a@example.com": DeliveryResult("a@example.com", True)}]
+
+    def fake_send(md_content, local_images, html_content=None, recipients=None):
+        calls["email"].append(md_content)
+        return outcomes.pop(0)
+
+    monkeypatch.setattr(main, "fetch_tweets", fake_fetch)
+    monkeypatch.setattr(main, "send_email", fake_send)
+    monkeypatch.setattr(processor, "_translate_backend", fake_translate)
+
+    # The first run fails at the email stage
+    main.main()
+    assert calls["fetch"] == 1
+    translated = len(calls["translate"])
+    assert translated > 0
+
+    with open(tmp_path / ".metrics" / "latest.json", "r", encoding="utf-8") as f:
+        record = json.load(f)
+    assert set(record["stages"]) == {"fetch", "pipeline", "email"}
+    assert record["counters"]["translate.cache_misses"] == 3
+
+    # The rerun neither fetches nor translates again and sends the same note
+    main.main()
+    assert calls["fetch"] == 1
+    assert len(calls["translate"]) == translated
+    assert calls["email"][0] == calls["email"][1]
+    with open(tmp_path / note_filename(), "r", encoding="utf-8") as f:
+        assert f.read() == calls["email"][0]
+
+    # A completed run is not repeated unless a re-fetch is forced
+    main.main()
+    assert len(calls["email"]) == 2
+    outcomes.append({"a@example.com": DeliveryResult("a@example.com", True)})
+    main.main(force_fetch=True)
+    assert calls["fetch"] == 2
+    # Translations are still reused after a forced re-fetch
+    assert len(calls["translate"]) == translated
+    assert len(calls["email"]) == 3
+
+
+def test_main_runs_each_slot_of_the_day_once(monkeypatch, tmp_path):
+    monkeypatch.setenv("OBSIDIAN_DIR", str(tmp_path))
+    monkeypatch.setenv("TRANSLATION_CACHE", "off")
+    feed = [
+        {"id": str(i), "text": f"story number {i} " * 3, "url": f"u{i}", "images": []}
+        for i in range(4)
+    ]
+    fetched = []
+
+    def fake_fetch(snapshot_path=None, exclude=None):
+        tweets = [dict(t) for t in feed if not (exclude and exclude(t))][:2]
+        fetched.append([t["id"] for t in tweets])
+        return tweets
+
+    monkeypatch.setattr(main, "fetch_tweets", fake_fetch)
+    monkeypatch.setattr(
+        main, "send_email", lambda *args, **kwargs: {"a": DeliveryResult("a", True)}
+    )
+    monkeypatch.setattr(processor, "_translate_backend", str.upper)
+
+    assert main.main(slot="08:00")
+    assert main.main(slot="20:00")
+    assert main.main(slot="20:00")
+    # The evening slot is not taken for the finished morning run, skips what
+    # the morning note published and writes a note of its own
+    assert fetched == [["0", "1"], ["2", "3"]]
+    assert os.path.exists(tmp_path / note_filename(slot="08:00"))
+    assert os.path.exists(tmp_path / note_filename(slot="20:00"))
+    assert sorted(os.listdir(tmp_path / ".runs")) == [
+        RunCheckpoint(str(tmp_path), slot=slot).run_id for slot in ("08:00", "20:00")
+    ]
+
+
+def test_rerun_rebuilds_a_lost_note_and_resends_only_the_undelivered(
+    monkeypatch, tmp_path
+):
+    monkeypatch.setenv("OBSIDIAN_DIR", str(tmp_path))
+    monkeypatch.setenv("TRANSLATION_CACHE", "off")
+    monkeypatch.setenv("RECEIVER_EMAIL", "a@example.com, b@example.com")
+    tweets = [{"id": "1", "text": "tweet 1", "url": "u1", "images": []}]
+    translated, sent = [], []
+
+    def fake_translate(text):
+        translated.append(text)
+        return text.upper()
+
+    def fake_send(md_content, local_images, html_content=None, recipients=None):
+        sent.append(recipients)
+        return {
+            r: DeliveryResult(r, ok=r == "a@example.com" or len(sent) > 1)
+            for r in recipients
+        }
+
+    monkeypatch.setattr(
+        main, "fetch_tweets", lambda *args, **kwargs: [dict(t) for t in tweets]
+    )
+    monkeypatch.setattr(main, "send_email", fake_send)
+    monkeypatch.setattr(processor, "_translate_backend", fake_translate)
+
+    # b@example.com is not reached, so nothing is marked as published yet
+    assert not main.main()
+    assert sent == [["a@example.com", "b@example.com"]]
+    assert not os.path.exists(tmp_path / ".seen_index.tsv")
+
+    # The note was never committed, the rerun rebuilds it from the checkpoints
+    os.remove(tmp_path / note_filename())
+    assert main.main()
+    assert sent[1] == ["b@example.com"]
+    assert translated == ["tweet 1"]
+    assert os.path.exists(tmp_path / note_filename())
+    with open(tmp_path / ".seen_index.tsv", "r", encoding="utf-8") as f:
+        assert note_filename() in f.read()
@@ -0,0 +1,127 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import daemon
+import profiles
+from pipeline import generate_markdown
+from seen_index import get_seen_index
+
+
+def test_next_run_picks_the_following_slot():
+    times = ["20:00", "08:00"]
+    assert daemon.next_run(times, datetime(2026, 5, 1, 7, 59)) == datetime(
+        2026, 5, 1, 8, 0
+    )
+    assert daemon.next_run(times, datetime(2026, 5, 1, 8, 0)) == datetime(
+        2026, 5, 1, 20, 0
+    )
+    assert daemon.next_run(times, datetime(2026, 5, 1, 21, 0)) == datetime(
+        2026, 5, 2, 8, 0
+    )
+
+
+def test_daemon_runs_due_jobs_and_reports_status(tmp_path):
+    now = [datetime(2026, 5, 1, 7, 0)]
+    calls = []
+
+    def ok():
+        calls.append("ok")
+        now[0] += timedelta(minutes=5)
+        return True
+
+    def broken():
+        calls.append("broken")
+        raise RuntimeError("smtp down")
+
+    status_path = str(tmp_path / "status.json")
+    jobs = [
+        daemon.Job("digest", ["08:00"], ok),
+        daemon.Job("evening", ["20:00"], broken),
+    ]
+    runner = daemon.Daemon(jobs, status_path, poll=10, clock=lambda: now[0])
+
+    assert runner.run_pending() == 0
+    assert runner.seconds_to_next_run() == 3600
+    now[0] = datetime(2026, 5, 1, 8, 0)
+    assert runner.run_pending() == 1
+    now[0] = datetime(2026, 5, 1, 22, 0)
+    assert runner.run_pending() == 1
+    assert calls == ["ok", "broken"]
+
+    with open(status_path, "r", encoding="utf-8") as f:
+        status = json.load(f)
+    digest, evening = status["jobs"]["digest"], status["jobs"]["evening"]
+    assert digest["runs"] == 1 and digest["failures"] == 0
+    assert digest["last_run"]["finished"] == "2026-05-01T08:05:00"
+    assert digest["next_run"] == "2026-05-02T08:00:00"
+    assert evening["failures"] == 1
+    assert evening["last_run"]["error"] == "smtp down"
+    assert evening["next_run"] == "2026-05-02T20:00:00"
+
+    # The heartbeat counts as healthy for a few poll intervals
+    assert daemon.check_status(status_path, now[0] + timedelta(seconds=20))
+    assert daemon.check_status(status_path, now[0] + timedelta(seconds=60)) is None
+
+
+def test_serve_forever_stops_cleanly(tmp_path):
+    status_path = str(tmp_path / "status.json")
+    runner = daemon.Daemon([], status_path, poll=0.01)
+    runner.jobs = [daemon.Job("once", ["08:00"], lambda: runner.stop() or True)]
+    runner.status["jobs"]["once"] = {
+        "times": ["08:00"],
+        "next_run": datetime.now().isoformat(),
+        "runs": 0,
+        "failures": 0,
+        "last_run": None,
+    }
+    runner.serve_forever()
+    assert runner.status["jobs"]["once"]["runs"] == 1
+    assert daemon.check_status(status_path) is None
+    assert daemon.main(["--status", "--status-file", status_path]) == 1
+
+
+def test_profile_jobs_group_profiles_by_time(monkeypatch, tmp_path):
+    config = {
+        "profiles": [
+            {"name": "ai", "query": "(ai)", "vault": "ai", "times": "07:30,19:30"},
+            {"name": "web3", "query": "(web3)", "vault": "web3"},
+            {"name": "news", "query": "(news)", "vault": "news"},
+        ]
+    }
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps(config), encoding="utf-8")
+    calls = []
+    monkeypatch.setattr(profiles, "main", lambda argv: calls.append(argv) or 0)
+
+    jobs = daemon.profile_jobs(str(path), ["07:30"])
+
+    assert [(job.name, job.times) for job in jobs] == [
+        ("profiles@07:30", ["07:30"]),
+        ("profiles@19:30", ["19:30"]),
+    ]
+    assert all(job.run() for job in jobs)
+    assert calls == [
+        [str(path), "--only", "ai", "--only", "web3", "--only", "news"]
+        + ["--slot", "07:30"],
+        [str(path), "--only", "ai", "--slot", "19:30"],
+    ]
+
+
+def test_seen_index_stays_open_between_runs(tmp_path):
+    index = get_seen_index(str(tmp_path))
+    tweet = {
+        "id": "42",
+        "author": "alice",
+        "text": "hello there",
+        "date": "2026-05-01 10:00:00",
+        "likes": 10,
+        "url": "https://twitter.com/alice/status/42",
+        "images": [],
+    }
+    md_content, _ = generate_markdown([tweet], str(tmp_path), ["你好"])
+    (tmp_path / "2026-05-01-Daily-Pulse.md").write_text(md_content, encoding="utf-8")
+    # The same instance comes back, caught up with the new note
+    assert get_seen_index(str(tmp_path)) is index
+    assert index.seen({"id": "42"})
+    assert os.path.exists(tmp_path / ".seen_index.tsv")
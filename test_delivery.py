@@ -0,0 +1,78 @@
+import smtplib
+import time
+
+import delivery
+from test_notifier import MockSMTPServer
+
+
+def plain_factory(mock):
+    return lambda: smtplib.SMTP(mock.host, mock.port)
+
+
+def message_factory(batch):
+    return [f"To: {', '.join(batch)}\r\nSubject: test\r\n\r\n.hello\r\n".encode()]
+
+
+def test_deliver_batches_hundreds_of_recipients_over_pooled_connections():
+    recipients = [f"user{i}@example.com" for i in range(500)]
+    with MockSMTPServer(delay=0.05, max_rcpt=50) as mock:
+        pool = delivery.SMTPPool(plain_factory(mock), size=4)
+        start = time.perf_counter()
+        results = delivery.deliver(
+            pool, "pulse@example.com", recipients, message_factory, 50, 4
+        )
+        elapsed = time.perf_counter() - start
+        pool.close()
+
+    assert len(results) == 500 and all(r.ok for r in results.values())
+    # Ten batches over four reused connections, in roughly three rounds
+    assert len(mock.messages) == 10
+    assert mock.connections == pool.created == 4
+    assert elapsed < 10 * 0.05
+    delivered = [rcpt for _, rcpts, _ in mock.messages for rcpt in rcpts]
+    assert sorted(delivered) == sorted(recipients)
+    assert all(data.endswith(b".hello\r\n") for _, _, data in mock.messages)
+
+
+def test_deliver_retries_transient_failures_and_reports_each_recipient():
+    recipients = ["ok@example.com", "bad@example.com", "busy@example.com"]
+    with MockSMTPServer(fail_data=2, reject={"bad@example.com": 550}) as mock:
+        pool = delivery.SMTPPool(plain_factory(mock), size=2)
+        results = delivery.deliver(
+            pool, "pulse@example.com", recipients, message_factory, 2, 2, 3, 0.01
+        )
+        pool.close()
+
+    assert results["ok@example.com"].ok
+    assert results["busy@example.com"].ok
+    assert not results["bad@example.com"].ok
+    assert results["bad@example.com"].error.startswith("550")
+    # Two DATA commands were refused with 421 before the batches went through
+    assert sum(r.attempts for r in results.values()) > len(recipients)
+    assert len(mock.messages) == 2
+    # Broken connections were replaced
+    assert mock.connections >= 3
+
+
+def test_deliver_gives_up_after_retries():
+    with MockSMTPServer(fail_data=10) as mock:
+        pool = delivery.SMTPPool(plain_factory(mock), size=1)
+        results = delivery.deliver(
+            pool, "pulse@example.com", ["a@example.com"], message_factory, 10, 1, 2, 0
+        )
+        pool.close()
+
+    assert results["a@example.com"] == delivery.DeliveryResult(
+        "a@example.com", False, results["a@example.com"].error, 3
+    )
+    assert "421" in results["a@example.com"].error
+
+
+def test_is_transient_retries_only_connection_and_reply_failures():
+    assert delivery.is_transient(ConnectionResetError())
+    assert delivery.is_transient(TimeoutError())
+    assert delivery.is_transient(smtplib.SMTPServerDisconnected())
+    assert delivery.is_transient(smtplib.SMTPDataError(421, b"busy"))
+    assert not delivery.is_transient(smtplib.SMTPDataError(554, b"rejected"))
+    assert not delivery.is_transient(FileNotFoundError("images/img_1.jpg"))
+    assert not delivery.is_transient(PermissionError())
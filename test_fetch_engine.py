@@ -0,0 +1,252 @@
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import fetcher
+import http_client
+from synthetic import make_cursor_entry, make_page, make_tweet_entry
+
+
+class MockSearchServer:
+    """
+    Serves paginated search-v3 responses, one tweet id range per query term
+    """
+
+    def __init__(
+        self, pages_per_query=3, page_size=5, delay=0.05, pages=None, truncate=()
+    ):
+        self.pages_per_query = pages_per_query
+        self.page_size = page_size
+        self.delay = delay
+        self.pages = pages
+        self.truncate = set(truncate)  # cursors whose body is cut off halfway
+        self.requests = []
+        self.clients = set()
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                with mock.lock:
+                    mock.requests.append(params)
+                    mock.clients.add(self.client_address)
+                    mock.active += 1
+                    mock.max_active = max(mock.max_active, mock.active)
+                time.sleep(mock.delay)
+                body = json.dumps(mock.page_for(params)).encode("utf-8")
+                with mock.lock:
+                    mock.active -= 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if params.get("cursor", ["0"])[0] in mock.truncate:
+                    self.wfile.write(body[: len(body) // 2])
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/search-v3"
+
+    def page_for(self, params):
+        if self.pages is not None:
+            cursor = params.get("cursor", ["0"])[0]
+            return self.pages[int(cursor)]
+
+        query = params["query"][0]
+        page = int(params.get("cursor", ["0"])[0])
+        # Every sub-query yields its own ids plus one id shared by all queries
+        base = sum(ord(c) for c in query.split(")")[0]) * 1000
+        entries = [
+            make_tweet_entry(str(base + page * self.page_size + i))
+            for i in range(self.page_size - 1)
+        ]
+        entries.append(make_tweet_entry("shared", likes=99999))
+        if page + 1 < self.pages_per_query:
+            entries.append(make_cursor_entry(str(page + 1)))
+        return make_page(entries)
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def fresh_session(monkeypatch):
+    monkeypatch.setattr(http_client, "_session", None)
+
+
+def test_split_query_keeps_quoted_terms_and_filters():
+    queries = fetcher.split_query(
+        '(tech OR AI OR "stock market" OR crypto) min_faves:500', 2
+    )
+    assert queries == [
+        "(tech OR AI) min_faves:500",
+        '("stock market" OR crypto) min_faves:500',
+    ]
+    assert fetcher.split_query("plain query", 4) == ["plain query"]
+
+
+def test_fetch_query_follows_bottom_cursors(monkeypatch):
+    fresh_session(monkeypatch)
+    with MockSearchServer(pages_per_query=3, page_size=5, delay=0) as server:
+        session = fetcher.get_session()
+        tweets = fetcher.fetch_query(
+            session, "(tech) since:2026-01-01", 100, url=server.url
+        )
+
+    # The timeline runs out after three pages and the shared id is kept once
+    assert len(server.requests) == 3
+    assert [r.get("cursor") for r in server.requests] == [None, ["1"], ["2"]]
+    assert len(tweets) == 3 * 4 + 1
+    assert len({t["id"] for t in tweets}) == len(tweets)
+
+
+def test_fetch_query_stops_at_target_and_cutoff(monkeypatch):
+    fresh_session(monkeypatch)
+    with MockSearchServer(pages_per_query=10, page_size=5, delay=0) as server:
+        tweets = fetcher.fetch_query(fetcher.get_session(), "(tech)", 7, url=server.url)
+    assert len(tweets) == 7
+    assert len(server.requests) == 2
+
+    old = int((time.time() - 3 * 86400) * 1000)
+    pages = [
+        make_page([make_tweet_entry("1"), make_cursor_entry("1")]),
+        make_page([make_tweet_entry("2", created_at_ms=old), make_cursor_entry("2")]),
+        make_page([make_tweet_entry("3")]),
+    ]
+    fresh_session(monkeypatch)
+    with MockSearchServer(pages=pages, delay=0) as server:
+        tweets = fetcher.fetch_query(
+            fetcher.get_session(),
+            "(tech)",
+            100,
+            cutoff=datetime.now() - timedelta(days=1),
+            url=server.url,
+        )
+    assert [t["id"] for t in tweets] == ["1", "2"]
+    assert len(server.requests) == 2
+
+
+def test_fetch_query_pages_past_excluded_tweets(monkeypatch):
+    fresh_session(monkeypatch)
+    published = set()
+    with MockSearchServer(pages_per_query=10, page_size=5, delay=0) as server:
+        first = fetcher.fetch_query(fetcher.get_session(), "(tech)", 7, url=server.url)
+        published.update(t["id"] for t in first)
+        tweets = fetcher.fetch_query(
+            fetcher.get_session(),
+            "(tech)",
+            7,
+            url=server.url,
+            exclude=lambda tweet: tweet["id"] in published,
+        )
+    # Already published tweets neither appear nor count towards the target
+    assert len(tweets) == 7
+    assert not published & {t["id"] for t in tweets}
+
+
+def test_fetch_query_drops_near_duplicates_before_the_target(monkeypatch):
+    story = "Open source inference server 2.0 ships with speculative decoding"
+    pages = [
+        make_page(
+            [
+                make_tweet_entry("1", text=story),
+                make_tweet_entry("2", text=story + " https://t.co/a"),
+                make_cursor_entry("1"),
+            ]
+        ),
+        make_page([make_tweet_entry("3", text="An unrelated story about the weather")]),
+    ]
+    fresh_session(monkeypatch)
+    with MockSearchServer(pages=pages, delay=0) as server:
+        tweets = fetcher.fetch_query(fetcher.get_session(), "(tech)", 2, url=server.url)
+    # The copy does not fill the second slot, so the next page is fetched
+    assert [t["id"] for t in tweets] == ["1", "3"]
+    assert len(server.requests) == 2
+
+
+def test_fetch_query_keeps_earlier_pages_when_a_body_is_cut_off(monkeypatch):
+    fresh_session(monkeypatch)
+    with MockSearchServer(
+        pages_per_query=3, page_size=5, delay=0, truncate={"1"}
+    ) as server:
+        tweets = fetcher.fetch_query(
+            fetcher.get_session(), "(tech)", 100, url=server.url
+        )
+    assert len(server.requests) == 2
+    assert len(tweets) == 5
+
+    fresh_session(monkeypatch)
+    with MockSearchServer(delay=0, truncate={"0"}) as server:
+        assert (
+            fetcher.fetch_query(fetcher.get_session(), "(tech)", 100, url=server.url)
+            is None
+        )
+
+
+def test_fetch_tweets_runs_sub_queries_concurrently(monkeypatch, tmp_path):
+    fresh_session(monkeypatch)
+    monkeypatch.setenv("SEARCH_BASE_QUERY", "(a OR b OR c OR d) min_faves:500")
+    monkeypatch.setenv("SEARCH_SUBQUERIES", "4")
+    monkeypatch.setenv("FETCH_PAGE_SIZE", "5")
+    # Pace far above the request rate, this measures concurrency only
+    monkeypatch.setenv("RAPIDAPI_RATE", "1000")
+    monkeypatch.chdir(tmp_path)
+
+    with MockSearchServer(pages_per_query=3, page_size=5, delay=0.1) as server:
+        start = time.perf_counter()
+        tweets = fetcher.fetch_tweets(target_count=200, max_workers=4, url=server.url)
+        elapsed = time.perf_counter() - start
+
+    assert len(server.requests) == 12
+    assert server.max_active == 4
+    # Four queries of three pages each should take about three round trips
+    assert elapsed < 12 * 0.1
+    # Connections are kept alive and reused, one per worker
+    assert len(server.clients) <= 4
+
+    ids = [t["id"] for t in tweets]
+    assert len(ids) == len(set(ids)) == 4 * 3 * 4 + 1
+    # Merged results are ranked by likes, the shared tweet comes first
+    assert ids[0] == "shared"
+
+
+def test_fetch_tweets_snapshot_is_opt_in_and_compressed(monkeypatch, tmp_path):
+    fresh_session(monkeypatch)
+    monkeypatch.setenv("SEARCH_BASE_QUERY", "(a) min_faves:500")
+    monkeypatch.chdir(tmp_path)
+
+    with MockSearchServer(pages_per_query=2, page_size=5, delay=0) as server:
+        fetcher.fetch_tweets(target_count=10, url=server.url)
+        assert os.listdir(tmp_path) == []
+
+        snapshot = tmp_path / "run" / "response.json.gz"
+        tweets = fetcher.fetch_tweets(
+            target_count=10, url=server.url, snapshot_path=str(snapshot)
+        )
+
+    # Only the first page is kept, as raw JSON
+    with gzip.open(snapshot, "rt", encoding="utf-8") as f:
+        page = json.load(f)
+    assert fetcher.parse_tweets(page) == tweets[:5]
+    assert fetcher.find_bottom_cursor(page) == "1"
+    assert len(tweets) == 9
@@ -0,0 +1,87 @@
+import io
+
+import markdown
+
+import html_cache
+import pipeline
+from metrics import metrics
+from renderer import render_markdown
+
+
+def make_items(count):
+    return [
+        (
+            {
+                "author": f"user{i}",
+                "url": f"https://twitter.com/user{i}/status/{i}",
+                "date": "2026-05-01 10:00:00",
+                "likes": 100 - i,
+                # Rules, lists and lazy blockquote lines inside tweet text
+                "text": f"tweet {i}\n\n---\n\n- a\n- b\nstill quoted *{i}*",
+            },
+            f"译文 {i}",
+            [f"images/img_{i}.jpg"] if i % 2 else [],
+        )
+        for i in range(count)
+    ]
+
+
+def digest(items, title="Daily Pulse"):
+    buffer = io.StringIO()
+    render_markdown(items, buffer, "2026-05-01", title)
+    return buffer.getvalue()
+
+
+def test_split_digest_matches_rendered_fragments():
+    items = make_items(5)
+
+    class Fragments(list):
+        def write(self, fragment):
+            self.append(fragment)
+
+    written = Fragments()
+    render_markdown(items, written, "2026-05-01")
+    content = "".join(written)
+
+    assert html_cache.split_digest(content) == written
+    assert html_cache.split_digest("just *text*") == ["just *text*"]
+    assert html_cache.markdown_to_html(content) == markdown.markdown(content)
+
+
+def test_cached_fragments_are_not_parsed_again(tmp_path):
+    path = str(tmp_path / "html.sqlite")
+    cache = html_cache.HtmlCache(path)
+    items = make_items(6)
+    content = digest(items)
+
+    # The vault note is converted while it is written
+    metrics.reset()
+    builder = pipeline.HtmlBuilder(cache)
+    render_markdown(items, builder, "2026-05-01")
+    html = builder.close()
+    assert html == markdown.markdown(content)
+    # The header, six tweets and the rule, which repeats between every tweet
+    assert metrics.snapshot()["counters"]["html.cache_misses"] == 8
+
+    # A resend from another process parses nothing
+    cache.close()
+    cache = html_cache.HtmlCache(path)
+    metrics.reset()
+    assert html_cache.markdown_to_html(content, cache) == html
+    assert "html.cache_misses" not in metrics.snapshot()["counters"]
+
+    # A rollup of some of the same tweets only parses its own header
+    rollup = digest(items[::2], "Weekly Pulse")
+    metrics.reset()
+    assert html_cache.markdown_to_html(rollup, cache) == markdown.markdown(rollup)
+    assert metrics.snapshot()["counters"]["html.cache_misses"] == 1
+
+
+def test_cache_keeps_the_most_recently_used_fragments(tmp_path):
+    cache = html_cache.HtmlCache(str(tmp_path / "html.sqlite"), memory_size=2)
+    cache.max_entries = 3
+    for i in range(5):
+        cache.put(f"fragment {i}", f"<p>fragment {i}</p>")
+        cache.flush()
+    assert cache.get("fragment 0") is None
+    assert cache.get("fragment 2") == "<p>fragment 2</p>"
@@ -0,0 +1,87 @@
+import os
+import time
+import zipfile
+from datetime import date
+
+import image_gc
+from checkpoint import RunCheckpoint
+from image_store import ImageStore
+
+
+def make_vault(tmp_path):
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    store = ImageStore(str(image_dir))
+    for name in ("a", "b", "c", "d", "e"):
+        temp = image_dir / f".dl_{name}.part"
+        temp.write_bytes(name.encode() * 100)
+        store.put(f"https://pbs.twimg.com/{name}.jpg", str(temp), name * 32)
+    # A partial download and the store's own files must survive every sweep
+    (image_dir / ".dl_x.part").write_bytes(b"partial")
+
+    def note(name, images):
+        body = "".join(f"\n\n![Image](images/img_{i * 32}.jpg)" for i in images)
+        (tmp_path / name).write_text(f"# Daily Pulse{body}\n", encoding="utf-8")
+
+    note("2026-01-10-Daily-Pulse.md", ["a", "b"])
+    note("2026-05-01-Daily-Pulse.md", ["b"])
+    note("2026-W18-Weekly-Pulse.md", ["c"])
+    # d is still held by the checkpoint of an unfinished run, e is an orphan
+    RunCheckpoint(str(tmp_path), "2026-05-02").save(
+        "images",
+        {"https://pbs.twimg.com/d.jpg": str(image_dir / f"img_{'d' * 32}.jpg")},
+    )
+    old = time.time() - 3 * 86400
+    for name in os.listdir(image_dir):
+        os.utime(image_dir / name, (old, old))
+    return image_dir, note
+
+
+def test_sweep_removes_only_unreferenced_images(tmp_path):
+    image_dir, note = make_vault(tmp_path)
+    before = sorted(os.listdir(image_dir))
+
+    preview = image_gc.collect_garbage(str(tmp_path), dry_run=True)
+    assert preview.removed == [f"img_{'e' * 32}.jpg"]
+    assert sorted(os.listdir(image_dir)) == before
+
+    result = image_gc.collect_garbage(str(tmp_path))
+    assert result.referenced == 4 and result.freed_bytes == 100
+    assert sorted(os.listdir(image_dir)) == [n for n in before if "eeee" not in n]
+    store = ImageStore(str(image_dir))
+    assert store.get("https://pbs.twimg.com/e.jpg") is None
+    assert store.get("https://pbs.twimg.com/a.jpg")
+
+    # A regenerated note no longer holds its old images; only the changed
+    # note is reparsed
+    note("2026-05-01-Daily-Pulse.md", [])
+    refs = image_gc.ReferenceIndex(str(tmp_path))
+    assert refs.update()[f"img_{'b' * 32}.jpg"] == "2026-01-10"
+    assert refs.parsed == 1
+    # Fresh files may belong to a run in progress
+    (image_dir / "img_new.jpg").write_bytes(b"new")
+    image_gc.collect_garbage(str(tmp_path))
+    assert "img_new.jpg" in os.listdir(image_dir)
+
+
+def test_old_images_are_packed_and_restorable(tmp_path):
+    image_dir, _ = make_vault(tmp_path)
+
+    result = image_gc.collect_garbage(
+        str(tmp_path), archive_orphans=True, archive_after=30, today=date(2026, 5, 3)
+    )
+
+    # a is only linked from January, b also from May
+    assert result.removed == []
+    assert sorted(result.archived) == [f"img_{'a' * 32}.jpg", f"img_{'e' * 32}.jpg"]
+    archive_dir = tmp_path / image_gc.ARCHIVE_DIR
+    assert sorted(os.listdir(archive_dir)) == [
+        "images-2026-01.zip",
+        "images-orphans.zip",
+    ]
+    with zipfile.ZipFile(archive_dir / "images-2026-01.zip") as archive:
+        assert archive.read(f"img_{'a' * 32}.jpg") == b"a" * 100
+    assert not (image_dir / f"img_{'a' * 32}.jpg").exists()
+
+    assert image_gc.restore(str(tmp_path), "images-2026-01.zip") == 1
+    assert (image_dir / f"img_{'a' * 32}.jpg").read_bytes() == b"a" * 100
@@ -0,0 +1,52 @@
+import json
+import os
+import pstats
+import threading
+import time
+
+from metrics import HISTORY_NAME, LATEST_NAME, Metrics, metrics, write_report
+
+
+def test_metrics_aggregate_across_threads():
+    registry = Metrics()
+
+    def work():
+        for _ in range(1000):
+            registry.incr("requests")
+            registry.incr("bytes", 10)
+            registry.observe("latency", 0.001)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with registry.timer("latency"):
+        time.sleep(0.01)
+
+    record = registry.snapshot()
+    assert record["counters"] == {"requests": 8000, "bytes": 80000}
+    latency = record["timers"]["latency"]
+    assert latency["count"] == 8001
+    assert latency["max"] >= 0.01
+    assert abs(latency["mean"] - latency["total"] / 8001) < 1e-9
+
+
+def test_write_report_keeps_rolling_history_and_slowest_profile(tmp_path):
+    metrics.reset()
+    with metrics.stage("fast", profile=True):
+        pass
+    with metrics.stage("slow", profile=True):
+        sum(range(200000))
+        time.sleep(0.02)
+
+    for _ in range(4):
+        record = write_report(str(tmp_path), keep=3)
+
+    with open(tmp_path / LATEST_NAME, "r", encoding="utf-8") as f:
+        assert json.load(f) == record
+    with open(tmp_path / HISTORY_NAME, "r", encoding="utf-8") as f:
+        assert len(f.readlines()) == 3
+    assert record["profile"] == os.path.join(str(tmp_path), "profile-slow.prof")
+    assert pstats.Stats(record["profile"]).total_calls > 0
+    metrics.reset()
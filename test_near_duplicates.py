@@ -0,0 +1,78 @@
+import random
+
+import fetcher
+from near_duplicates import SimHashIndex, drop_near_duplicates, shingles, simhash
+
+ANNOUNCEMENT = (
+    "We just released version 2.0 of our open source inference server with "
+    "speculative decoding, paged attention and a brand new scheduler"
+)
+
+
+def tweet(i, text, likes):
+    return {"id": str(i), "text": text, "likes": likes}
+
+
+def test_drop_near_duplicates_keeps_the_most_liked_copy():
+    tweets = [
+        tweet(1, ANNOUNCEMENT + " https://t.co/aaa", 10),
+        tweet(2, "Completely unrelated thoughts about the weather in Lisbon today", 5),
+        tweet(3, "@someone " + ANNOUNCEMENT.upper() + " https://t.co/bbb", 50),
+        tweet(4, ANNOUNCEMENT.replace("brand new", "new"), 20),
+        tweet(5, "gm", 1),
+        tweet(6, "gm", 2),
+        tweet(7, "今天发布了开源推理服务器二点零版本，支持推测解码和分页注意力机制", 3),
+        tweet(
+            8, "今天发布了开源推理服务器二点零版本，支持推测解码和分页注意力机制！", 4
+        ),
+    ]
+
+    kept = drop_near_duplicates(tweets)
+
+    # Clusters keep their most-liked tweet, in the original order;
+    # short texts are never matched
+    assert [t["id"] for t in kept] == ["2", "3", "5", "6", "8"]
+    assert drop_near_duplicates(tweets, max_distance=-1) == tweets
+
+
+def test_simhash_is_close_for_small_edits():
+    base = simhash(shingles(ANNOUNCEMENT.lower()))
+    edited = simhash(shingles(ANNOUNCEMENT.lower().replace("2.0", "2.1")))
+    other = simhash(shingles("a completely different tweet about football scores"))
+    assert (base ^ edited).bit_count() <= 6
+    assert (base ^ other).bit_count() > 6
+
+
+def test_lsh_index_finds_every_pair_within_distance():
+    rng = random.Random(7)
+    signatures = []
+    for _ in range(300):
+        signature = rng.getrandbits(64)
+        signatures.append(signature)
+        # Plant near copies with a few flipped bits
+        for bit in rng.sample(range(64), rng.randint(0, 8)):
+            signature ^= 1 << bit
+        signatures.append(signature)
+
+    index = SimHashIndex(max_distance=5)
+    for key, signature in enumerate(signatures):
+        expected = [
+            other
+            for other in range(key)
+            if (signatures[other] ^ signature).bit_count() <= 5
+        ]
+        assert index.query(signature) == expected
+        index.add(key, signature)
+
+
+def test_merge_tweets_drops_near_duplicates_before_the_limit(monkeypatch):
+    results = [
+        [tweet(1, ANNOUNCEMENT, 30), tweet(2, "Another story " * 4, 20)],
+        [tweet(3, ANNOUNCEMENT + " https://t.co/x", 40), tweet(4, "Third " * 6, 1)],
+    ]
+    merged = fetcher.merge_tweets(results, 3)
+    assert [t["id"] for t in merged] == ["3", "2", "4"]
+
+    monkeypatch.setenv("NEAR_DUPLICATES", "off")
+    assert len(fetcher.merge_tweets(results, 3)) == 3
+    assert fetcher.merge_tweets(results, 3)[0]["id"] == "3"
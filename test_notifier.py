@@ -0,0 +1,265 @@
+import email
+import os
+import smtplib
+import socketserver
+import threading
+import time
+from email import policy
+
+import attachments
+import delivery
+import notifier
+from PIL import Image
+
+
+class MockSMTPServer:
+    """
+    Minimal in-process SMTP stand-in that records every delivered message
+    """
+
+    def __init__(self, delay=0.0, fail_data=0, reject=None, max_rcpt=None):
+        self.messages = []  # (mail_from, [rcpt_to], data bytes)
+        self.connections = 0
+        self.delay = delay
+        self.fail_data = fail_data  # Number of DATA commands answered with 421
+        self.reject = reject or {}  # Recipient -> reply code
+        self.max_rcpt = max_rcpt
+        self.lock = threading.Lock()
+
+        mock = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode("ascii") + b"\r\n")
+
+            def handle(self):
+                with mock.lock:
+                    mock.connections += 1
+                self.reply("220 localhost ESMTP mock")
+                mail_from, rcpt_to = None, []
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode("ascii", "replace").strip()
+                    verb = command.split(" ", 1)[0].upper()
+                    if verb in ("EHLO", "HELO"):
+                        self.reply("250 localhost")
+                    elif verb == "MAIL":
+                        mail_from, rcpt_to = command.split(":", 1)[1].strip("<> "), []
+                        self.reply("250 OK")
+                    elif verb == "RCPT":
+                        rcpt = command.split(":", 1)[1].strip("<> ")
+                        code = mock.reject.get(rcpt)
+                        if code:
+                            self.reply(f"{code} Rejected")
+                        elif mock.max_rcpt and len(rcpt_to) >= mock.max_rcpt:
+                            self.reply("452 Too many recipients")
+                        else:
+                            rcpt_to.append(rcpt)
+                            self.reply("250 OK")
+                    elif verb == "DATA":
+                        with mock.lock:
+                            fail = mock.fail_data > 0
+                            mock.fail_data -= fail
+                        if fail:
+                            self.reply("421 Try again later")
+                            return
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        data = []
+                        for raw in iter(self.rfile.readline, b""):
+                            if raw == b".\r\n":
+                                break
+                            # Undo dot-stuffing
+                            data.append(raw[1:] if raw.startswith(b"..") else raw)
+                        time.sleep(mock.delay)
+                        with mock.lock:
+                            mock.messages.append((mail_from, rcpt_to, b"".join(data)))
+                        self.reply("250 OK queued")
+                    elif verb == "RSET":
+                        mail_from, rcpt_to = None, []
+                        self.reply("250 OK")
+                    elif verb == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Command not implemented")
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_rewrite_image_sources_is_exact_and_single_pass():
+    html = (
+        '<p><img alt="Image" src="images/img_a.jpg" /></p>'
+        '<p><img alt="Image" src="images/xximg_a.jpg" /></p>'
+        '<p><img alt="Image" src="images/img_b+c.png" /></p>'
+        '<p><a href="images/img_a.jpg">link</a></p>'
+    )
+    rewritten = notifier.rewrite_image_sources(
+        html, ["/vault/images/img_a.jpg", "/vault/images/img_b+c.png"]
+    )
+    assert rewritten == (
+        '<p><img alt="Image" src="cid:img_a.jpg" /></p>'
+        '<p><img alt="Image" src="images/xximg_a.jpg" /></p>'
+        '<p><img alt="Image" src="cid:img_b+c.png" /></p>'
+        '<p><a href="images/img_a.jpg">link</a></p>'
+    )
+
+
+def test_streamed_message_round_trips_through_smtp(tmp_path):
+    images = []
+    for idx, size in enumerate((10, 57 * 1024, 200 * 1024 + 3)):
+        path = tmp_path / f"img_{idx}.jpg"
+        path.write_bytes(bytes(range(256)) * (size // 256) + b"\xff" * (size % 256))
+        images.append(str(path))
+    html = '<p>.leading dot</p>\n.<img alt="Image" src="images/img_0.jpg" />'
+    headers = [
+        ("From", "pulse@example.com"),
+        ("To", "a@example.com, b@example.com"),
+        ("Subject", "[Daily Pulse] X 热门资讯 - 2026-05-01"),
+    ]
+
+    with MockSMTPServer() as mock:
+        with smtplib.SMTP(mock.host, mock.port) as server:
+            refused = delivery.sendmail_streamed(
+                server,
+                "pulse@example.com",
+                ["a@example.com", "b@example.com"],
+                notifier.iter_message_bytes(headers, html, images),
+            )
+
+    assert refused == {}
+    [(mail_from, rcpt_to, data)] = mock.messages
+    assert mail_from == "pulse@example.com"
+    assert rcpt_to == ["a@example.com", "b@example.com"]
+
+    msg = email.message_from_bytes(data, policy=policy.default)
+    assert msg["Subject"] == "[Daily Pulse] X 热门资讯 - 2026-05-01"
+    parts = list(msg.iter_parts())
+    assert parts[0].get_content() == html
+    for part, path in zip(parts[1:], images):
+        assert part["Content-ID"] == f"<{path.rsplit('/', 1)[-1]}>"
+        assert part.get_content_type() == "image/jpeg"
+        with open(path, "rb") as f:
+            assert part.get_content() == f.read()
+
+
+def make_noise_jpeg(path, size=(2400, 1800)):
+    # Random noise compresses badly, so the file is large like a real photo
+    Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3)).save(
+        path, "JPEG", quality=95
+    )
+    return str(path)
+
+
+def test_plan_attachments_degrades_then_drops_lowest_ranked(tmp_path):
+    images = [make_noise_jpeg(tmp_path / f"img_{i}.jpg") for i in range(3)]
+    originals = {path: os.path.getsize(path) for path in images}
+
+    chosen, dropped = attachments.plan_attachments(
+        images, 1000, max_bytes=10**9, max_dim=1200, quality=70
+    )
+    assert not dropped
+    first_pass = {path: os.path.getsize(chosen[path]) for path in images}
+    assert all(first_pass[path] < originals[path] for path in images)
+    with Image.open(chosen[images[0]]) as img:
+        assert max(img.size) == 1200
+
+    # Tighten the budget so only the lowest-ranked image has to shrink further
+    budget = sum(attachments.encoded_size(s) + 300 for s in first_pass.values())
+    chosen, dropped = attachments.plan_attachments(
+        images, 1000, max_bytes=budget, max_dim=1200, quality=70
+    )
+    assert not dropped
+    assert os.path.getsize(chosen[images[-1]]) < first_pass[images[-1]]
+    assert os.path.getsize(chosen[images[0]]) == first_pass[images[0]]
+
+    # A budget that fits one fully degraded image drops from the bottom
+    smallest = attachments.optimize_image(
+        images[0], str(tmp_path / attachments.CACHE_DIR_NAME), 600, 30
+    )
+    budget = 1000 * 4 // 3 + attachments.encoded_size(os.path.getsize(smallest)) + 300
+    chosen, dropped = attachments.plan_attachments(
+        images, 1000, max_bytes=budget, max_dim=1200, quality=70
+    )
+    assert dropped == [images[2], images[1]]
+    assert chosen == {images[0]: smallest}
+
+    # Originals in the vault are untouched and variants are cached by hash
+    assert {path: os.path.getsize(path) for path in images} == originals
+    cached = os.listdir(tmp_path / attachments.CACHE_DIR_NAME)
+    assert len(cached) == len(set(cached)) == 3 * 3
+
+
+def test_optimize_image_flattens_transparency_onto_white(tmp_path):
+    # Noise behind fully transparent pixels, in RGBA and palette form
+    noise = os.urandom(128 * 128)
+    path = str(tmp_path / "img_clear.png")
+    Image.merge(
+        "RGBA",
+        [Image.frombytes("L", (128, 128), noise)] * 3 + [Image.new("L", (128, 128))],
+    ).save(path)
+    palette_path = str(tmp_path / "img_palette.png")
+    palette = Image.frombytes("P", (128, 128), noise)
+    palette.putpalette(os.urandom(768))
+    palette.save(palette_path, transparency=bytes(256))
+    for source in (path, palette_path):
+        variant = attachments.optimize_image(
+            source, str(tmp_path / attachments.CACHE_DIR_NAME), 32, 80
+        )
+        with Image.open(variant) as img:
+            assert img.format == "JPEG"
+            assert img.getpixel((0, 0)) == (255, 255, 255)
+
+
+def test_plan_attachments_prunes_stale_variants(monkeypatch, tmp_path):
+    images = [make_noise_jpeg(tmp_path / "img_0.jpg")]
+    cache_dir = tmp_path / attachments.CACHE_DIR_NAME
+    cache_dir.mkdir()
+    stale = cache_dir / "0123_1600_q80.jpg"
+    stale.write_bytes(b"old")
+    old = time.time() - 30 * 86400
+    os.utime(stale, (old, old))
+
+    chosen, _ = attachments.plan_attachments(images, 1000, max_bytes=10**9)
+    # The variant just used survives, the month-old one is gone
+    assert os.listdir(cache_dir) == [os.path.basename(chosen[images[0]])]
+
+
+def test_send_email_attaches_optimized_images(monkeypatch, tmp_path):
+    images = [make_noise_jpeg(tmp_path / f"img_{i}.jpg") for i in range(2)]
+    md_content = "".join(f"![Image](images/img_{i}.jpg)\n\n" for i in range(2))
+    budget = os.path.getsize(images[0])
+    with MockSMTPServer() as mock:
+        monkeypatch.setattr(smtplib, "SMTP_SSL", smtplib.SMTP)
+        monkeypatch.setattr(smtplib.SMTP, "login", lambda *args: (235, b"ok"))
+        for name, value in {
+            "SMTP_SERVER": mock.host,
+            "SMTP_PORT": str(mock.port),
+            "SENDER_EMAIL": "pulse@example.com",
+            "SENDER_PASSWORD": "secret",
+            "RECEIVER_EMAIL": "a@example.com",
+            "EMAIL_MAX_BYTES": str(budget),
+        }.items():
+            monkeypatch.setenv(name, value)
+        notifier.send_email(md_content, images)
+
+    [(_, _, data)] = mock.messages
+    assert len(data) <= budget
+    msg = email.message_from_bytes(data, policy=policy.default)
+    parts = list(msg.iter_parts())
+    html = parts[0].get_content()
+    assert 'src="cid:img_0.jpg"' in html
+    for part in parts[1:]:
+        assert len(part.get_content()) < os.path.getsize(images[0])
@@ -0,0 +1,107 @@
+import io
+import os
+import time
+
+import markdown
+
+import http_client
+import pipeline
+import processor
+import renderer
+from image_store import ImageStore
+from test_processor import MockImageServer, fake_batch_backend
+
+
+def make_tweets(base, count):
+    return [
+        {
+            "author": f"user{i}",
+            "text": f"tweet number {i}",
+            "date": "2026-05-01 10:00:00",
+            "likes": count - i,
+            "url": f"https://twitter.com/user{i}/status/{i}",
+            # Every third tweet reuses the previous tweet's image
+            "images": [f"{base}/img/{i - (i % 3 == 2)}.jpg"] if i % 2 else [],
+        }
+        for i in range(count)
+    ]
+
+
+def test_pipeline_renders_tweets_in_order(monkeypatch, tmp_path):
+    monkeypatch.setattr(http_client, "_session", None)
+    monkeypatch.setenv("TRANSLATION_CACHE", "off")
+    monkeypatch.setattr(processor, "_translate_backend", fake_batch_backend([]))
+    vault = str(tmp_path)
+
+    with MockImageServer(size=1024, delay=0.01) as mock:
+        tweets = make_tweets(mock.base, 25)
+        buffer = io.StringIO()
+        html_builder = pipeline.HtmlBuilder()
+        local_images = pipeline.run_pipeline(
+            tweets, vault, renderer.Tee(buffer, html_builder), chunk_size=4
+        )
+        html = html_builder.close()
+
+    # Same output as rendering the finished inputs one tweet after another
+    store = ImageStore(os.path.join(vault, "images"))
+    items = [
+        (
+            tweet,
+            tweet["text"].upper(),
+            [os.path.relpath(store.get(url), vault) for url in tweet["images"]],
+        )
+        for tweet in tweets
+    ]
+    expected = io.StringIO()
+    renderer.render_markdown(items, expected)
+    assert buffer.getvalue() == expected.getvalue()
+    assert local_images == list(
+        dict.fromkeys(store.get(url) for tweet in tweets for url in tweet["images"])
+    )
+    assert html == markdown.markdown(expected.getvalue())
+
+
+def test_session_pool_grows_for_the_image_workers(monkeypatch):
+    monkeypatch.setattr(http_client, "_session", None)
+    # The fetcher opens the session first with fewer slots than the pipeline
+    session = http_client.get_session(4)
+    assert http_client.get_session(8) is session
+    assert session.get_adapter("https://x.com")._pool_maxsize == 8
+    # A smaller request keeps the larger pool
+    http_client.get_session(2)
+    assert session.get_adapter("http://x.com")._pool_maxsize == 8
+
+
+def test_pipeline_overlaps_translation_and_downloads(monkeypatch, tmp_path):
+    monkeypatch.setattr(http_client, "_session", None)
+    monkeypatch.setenv("TRANSLATION_CACHE", "off")
+    monkeypatch.setattr(
+        processor, "_translate_backend", fake_batch_backend([], delay=0.2)
+    )
+
+    with MockImageServer(size=1024, delay=0.2) as mock:
+        tweets = make_tweets(mock.base, 8)
+        start = time.perf_counter()
+        pipeline.run_pipeline(
+            tweets, str(tmp_path), io.StringIO(), translate_workers=2, chunk_size=4
+        )
+        elapsed = time.perf_counter() - start
+
+    # Two translation batches and the image downloads all run side by side
+    assert elapsed < 0.2 * 3
+
+
+def test_pipeline_reports_producer_errors(monkeypatch, tmp_path):
+    monkeypatch.setenv("TRANSLATION_CACHE", "off")
+    monkeypatch.setattr(processor, "_translate_backend", fake_batch_backend([]))
+
+    def tweets():
+        yield {"text": "fine", "url": "u1"}
+        raise RuntimeError("upstream failed")
+
+    try:
+        pipeline.run_pipeline(tweets(), str(tmp_path), io.StringIO())
+    except RuntimeError as e:
+        assert str(e) == "upstream failed"
+    else:
+        raise AssertionError("producer error was swallowed")
@@ -0,0 +1,298 @@
+import io
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import http_client
+import processor
+import renderer
+from image_store import canonical_url
+from translation_cache import TranslationCache
+from vault import note_filename
+
+
+class MockImageServer:
+    """
+    Serves deterministic image bytes for /img/<name>, 404 for anything else
+    """
+
+    def __init__(self, size=256 * 1024, delay=0.05):
+        self.size = size
+        self.delay = delay
+        self.hits = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with mock.lock:
+                    mock.hits.append(self.path)
+                    mock.active += 1
+                    mock.max_active = max(mock.max_active, mock.active)
+                time.sleep(mock.delay)
+                with mock.lock:
+                    mock.active -= 1
+                if not self.path.startswith("/img/"):
+                    self.send_error(404)
+                    return
+                body = mock.body(self.path)
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def body(self, path):
+        # Paths differing only after "~" serve identical bytes
+        seed = path.split("~")[0].encode("utf-8")
+        return (seed * (self.size // len(seed) + 1))[: self.size]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def download_all(urls, save_dir):
+    return {url: processor.download_image(url, save_dir) for url in urls}
+
+
+def test_download_image_reports_failures_and_keeps_extensions(monkeypatch, tmp_path):
+    monkeypatch.setattr(http_client, "_session", None)
+    with MockImageServer(delay=0) as server:
+        results = download_all(
+            [
+                f"{server.base}/img/0.jpg",
+                f"{server.base}/img/1b.png",
+                f"{server.base}/missing.jpg",
+            ],
+            str(tmp_path),
+        )
+
+    failed = results[f"{server.base}/missing.jpg"]
+    assert not failed.ok and "404" in failed.error and failed.path == ""
+
+    ok = [r for r in results.values() if r.ok]
+    assert len(ok) == 2
+    for result in ok:
+        with open(result.path, "rb") as f:
+            assert f.read() == server.body(result.url[len(server.base) :])
+    assert results[f"{server.base}/img/1b.png"].path.endswith(".png")
+    # No partial files are left behind
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".part")]
+
+
+def test_image_store_deduplicates_across_runs(monkeypatch, tmp_path):
+    monkeypatch.setattr(http_client, "_session", None)
+    with MockImageServer(delay=0) as server:
+        first = download_all(
+            [f"{server.base}/img/a~1.jpg", f"{server.base}/img/b.jpg"], str(tmp_path)
+        )
+        # Same bytes under another URL are stored once
+        assert first[f"{server.base}/img/a~1.jpg"].ok
+        copy = download_all([f"{server.base}/img/a~2.jpg"], str(tmp_path))
+        assert (
+            copy[f"{server.base}/img/a~2.jpg"].path
+            == first[f"{server.base}/img/a~1.jpg"].path
+        )
+        hits = len(server.hits)
+
+        # A later run, with a fresh store loaded from the index, never refetches
+        second = download_all([f"{server.base}/img/b.jpg?name=orig"], str(tmp_path))
+
+    assert len(server.hits) == hits == 3
+    assert second[f"{server.base}/img/b.jpg?name=orig"].path == (
+        first[f"{server.base}/img/b.jpg"].path
+    )
+    images = [name for name in os.listdir(tmp_path) if not name.startswith(".")]
+    assert len(images) == 2
+    assert all(name.startswith("img_") and len(name) == 40 for name in images)
+
+
+def test_canonical_url_strips_only_size_parameters():
+    base = "https://pbs.twimg.com/media/abc"
+    assert canonical_url(f"{base}?format=jpg&name=small") == (
+        canonical_url(f"{base}?format=jpg&name=orig#frag")
+    )
+    assert canonical_url(f"{base}?format=jpg") != canonical_url(f"{base}?format=png")
+    assert canonical_url("https://Example.com/img?id=1") != (
+        canonical_url("https://example.com/img?id=2")
+    )
+
+
+def test_translate_text_uses_persistent_cache(monkeypatch, tmp_path):
+    calls = []
+
+    def fake_translate(text):
+        calls.append(text)
+        if text == "boom":
+            raise RuntimeError("network down")
+        return f"译:{text}"
+
+    monkeypatch.setattr(processor, "_translate_backend", fake_translate)
+    path = str(tmp_path / "cache.sqlite")
+
+    cache = TranslationCache(path)
+    assert processor.translate_text("hello", cache) == "译:hello"
+    assert processor.translate_text("hello", cache) == "译:hello"
+    # Failures fall back to the original text and are not cached
+    assert processor.translate_text("boom", cache) == "boom"
+    assert processor.translate_text("boom", cache) == "boom"
+    assert calls == ["hello", "boom", "boom"]
+    cache.close()
+
+    # A later run reads the translation from disk
+    cache = TranslationCache(path, memory_size=1)
+    assert processor.translate_text("hello", cache) == "译:hello"
+    assert calls == ["hello", "boom", "boom"]
+    assert cache.get("hello", "en") is None
+    cache.close()
+
+
+def test_translation_cache_evicts_by_size_and_age(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = TranslationCache(path, memory_size=0, max_entries=3)
+    for i in range(5):
+        cache.set(f"text {i}", "zh-CN", f"译 {i}")
+    cache.evict()
+    assert cache.get("text 0", "zh-CN") is None
+    assert cache.get("text 4", "zh-CN") == "译 4"
+    cache.close()
+
+    cache = TranslationCache(path, memory_size=0, max_age_days=-1)
+    assert cache.get("text 4", "zh-CN") is None
+    cache.close()
+
+
+def test_translation_cache_writes_hits_in_one_transaction(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = TranslationCache(path)
+    for i in range(5):
+        cache.set(f"text {i}", "zh-CN", f"译 {i}")
+    cache.close()
+
+    cache = TranslationCache(path, memory_size=0)
+    before = cache._db.execute("SELECT MAX(used) FROM translations").fetchone()[0]
+    changes = cache._db.total_changes
+    assert [cache.get(f"text {i}", "zh-CN") for i in range(5)] == [
+        f"译 {i}" for i in range(5)
+    ]
+    # Hits read from disk are only marked as used when the cache is flushed
+    assert cache._db.total_changes == changes
+    cache.flush()
+    used = cache._db.execute("SELECT MIN(used) FROM translations").fetchone()[0]
+    assert used > before
+    cache.close()
+
+
+def fake_batch_backend(calls, delay=0.0):
+    def translate(text):
+        calls.append(text)
+        time.sleep(delay)
+        if "boom" in text:
+            raise RuntimeError("backend error")
+        # Uppercasing keeps the "||" separators intact, like the real backend
+        return text.upper()
+
+    return translate
+
+
+def test_translate_many_packs_batches_and_keeps_order(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(processor, "_translate_backend", fake_batch_backend(calls))
+    texts = [f"tweet number {i}" for i in range(40)] + ["tweet number 3", ""]
+
+    results = processor.translate_many(texts, max_chars=200, max_workers=4)
+
+    assert results == [t.upper() for t in texts]
+    # 40 unique texts of ~20 chars packed into ~200 char requests
+    assert len(calls) == 5
+    assert all(len(call) <= 200 for call in calls)
+
+
+def test_translate_many_falls_back_per_text(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(processor, "_translate_backend", fake_batch_backend(calls))
+    cache = TranslationCache(str(tmp_path / "cache.sqlite"))
+    cache.set("cached", processor.TRANSLATE_TARGET, "已缓存")
+
+    texts = ["alpha", "boom", "cached", "has || pipes", "beta"]
+    results = processor.translate_many(texts, cache, max_chars=1000)
+
+    assert results == ["ALPHA", "boom", "已缓存", "HAS || PIPES", "BETA"]
+    # The failed batch is retried text by text, the cached text is never sent
+    assert not any("cached" in call for call in calls)
+    assert "boom" in calls and "alpha" in calls
+    assert cache.get("alpha", processor.TRANSLATE_TARGET) == "ALPHA"
+    assert cache.get("boom", processor.TRANSLATE_TARGET) is None
+    cache.close()
+
+
+def test_translate_many_runs_batches_concurrently(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        processor, "_translate_backend", fake_batch_backend(calls, delay=0.1)
+    )
+    texts = [f"text {i} " * 10 for i in range(8)]
+
+    start = time.perf_counter()
+    processor.translate_many(texts, max_chars=100, max_workers=8)
+    elapsed = time.perf_counter() - start
+
+    assert len(calls) == 8
+    assert elapsed < 8 * 0.1 / 2
+
+
+def test_render_markdown_keeps_digest_format_and_tees(monkeypatch, tmp_path):
+    monkeypatch.setenv("OBSIDIAN_DIR", str(tmp_path))
+    tweets = [
+        {
+            "author": "alice",
+            "text": "hello",
+            "date": "2026-05-01 10:00:00",
+            "likes": 12,
+            "url": "https://twitter.com/alice/status/1",
+        },
+        {"text": "no author", "url": "u2"},
+    ]
+    items = [(tweets[0], "你好", ["images/a.jpg", "images/b.png"]), (tweets[1], "", [])]
+
+    buffer = io.StringIO()
+    with processor.open_obsidian_note() as note:
+        renderer.render_markdown(items, renderer.Tee(note, buffer), "2026-05-02")
+
+    expected = (
+        "# Daily Pulse - 2026-05-02\n\n"
+        "### [alice](https://twitter.com/alice/status/1)\n\n"
+        "**发布时间:** 2026-05-01 10:00:00 | ❤️ 12\n\n"
+        "> hello\n\n"
+        "> 🇨🇳 译文：你好\n\n"
+        "![Image](images/a.jpg)\n\n"
+        "![Image](images/b.png)\n\n"
+        "[🔗 查看原帖](https://twitter.com/alice/status/1)\n\n"
+        "---\n\n"
+        "### [Unknown](u2)\n\n"
+        "**发布时间:**  | ❤️ 0\n\n"
+        "> no author\n\n"
+        "> 🇨🇳 译文：\n\n"
+        "[🔗 查看原帖](u2)\n\n"
+    )
+    assert buffer.getvalue() == expected
+    with open(tmp_path / note_filename(), "r", encoding="utf-8") as f:
+        assert f.read() == expected
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
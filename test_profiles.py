@@ -0,0 +1,124 @@
+import json
+import os
+
+import http_client
+import processor
+import profiles
+from delivery import DeliveryResult
+from test_processor import MockImageServer, fake_batch_backend
+from vault import note_filename, read_note
+
+
+def make_tweet(base, i):
+    return {
+        "id": str(i),
+        "author": f"user{i}",
+        "text": f"tweet number {i}",
+        "date": "2026-05-01 10:00:00",
+        "likes": 100 - i,
+        "url": f"https://twitter.com/user{i}/status/{i}",
+        "images": [f"{base}/img/{i}.jpg"],
+    }
+
+
+def write_config(tmp_path):
+    config = {
+        "profiles": [
+            {"name": "ai", "query": "(ai)", "vault": "ai", "recipients": "a@x.com"},
+            {
+                "name": "web3",
+                "query": "(web3)",
+                "vault": "web3",
+                "recipients": ["b@x.com", "c@x.com"],
+                "target_count": 5,
+            },
+        ]
+    }
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps(config), encoding="utf-8")
+    return str(path)
+
+
+def test_load_profiles_resolves_vaults_and_rejects_duplicates(tmp_path):
+    ai, web3 = profiles.load_profiles(write_config(tmp_path))
+    assert ai.vault == os.path.join(str(tmp_path), "ai")
+    assert ai.recipients == ["a@x.com"] and ai.target_count == 20
+    assert web3.recipients == ["b@x.com", "c@x.com"] and web3.target_count == 5
+
+    path = tmp_path / "duplicate.json"
+    path.write_text(
+        json.dumps({"profiles": [{"name": "a", "query": "q", "vault": "v"}] * 2}),
+        encoding="utf-8",
+    )
+    try:
+        profiles.load_profiles(str(path))
+    except ValueError as e:
+        assert "distinct names" in str(e)
+    else:
+        raise AssertionError("duplicate profiles were accepted")
+
+
+def test_profiles_share_translation_and_downloads(monkeypatch, tmp_path):
+    monkeypatch.setattr(http_client, "_session", None)
+    monkeypatch.setenv("TRANSLATION_CACHE", "off")
+    monkeypatch.setenv("SEEN_INDEX", "off")
+    translate_calls, sent = [], {}
+    monkeypatch.setattr(
+        processor, "_translate_backend", fake_batch_backend(translate_calls)
+    )
+
+    def fake_send(md_content, local_images, html_content=None, **kwargs):
+        sent[kwargs["subject"]] = (md_content, local_images, kwargs["recipients"])
+        return {r: DeliveryResult(r, True) for r in kwargs["recipients"]}
+
+    monkeypatch.setattr(profiles, "send_email", fake_send)
+    queries = []
+
+    with MockImageServer(size=1024, delay=0.01) as server:
+        feeds = {
+            "(ai)": [make_tweet(server.base, i) for i in range(0, 6)],
+            "(web3)": [make_tweet(server.base, i) for i in range(3, 8)],
+        }
+
+        def fake_fetch(
+            target_count=None, base_query=None, scheduler=None, exclude=None
+        ):
+            queries.append(base_query)
+            return [dict(tweet) for tweet in feeds[base_query]]
+
+        monkeypatch.setattr(profiles, "fetch_tweets", fake_fetch)
+        results = profiles.run_profiles(profiles.load_profiles(write_config(tmp_path)))
+
+    assert results == {"ai": True, "web3": True}
+    assert sorted(queries) == ["(ai)", "(web3)"]
+    # 8 unique tweets and images across the 11 the two profiles publish
+    assert sorted(server.hits) == sorted(f"/img/{i}.jpg" for i in range(8))
+    assert sum(call.count("tweet number") for call in translate_calls) == 8
+
+    for name, ids in (("ai", range(0, 6)), ("web3", range(3, 8))):
+        vault = str(tmp_path / name)
+        records = read_note(vault, note_filename())
+        assert [r["id"] for r in records] == [str(i) for i in ids]
+        assert all(r["translated"] == r["text"].upper() for r in records)
+        # Every note links images stored in its own vault
+        for record in records:
+            assert os.path.exists(os.path.join(vault, record["images"][0]))
+
+    subjects = {subject.split("]")[0] for subject in sent}
+    assert subjects == {"[Daily Pulse · ai", "[Daily Pulse · web3"}
+    assert sorted(r for _, _, rs in sent.values() for r in rs) == [
+        "a@x.com",
+        "b@x.com",
+        "c@x.com",
+    ]
+
+
+def test_profiles_without_new_tweets_succeed(monkeypatch, tmp_path):
+    monkeypatch.setenv("SEEN_INDEX", "off")
+    feeds = {"(ai)": [], "(web3)": None}
+    monkeypatch.setattr(
+        profiles, "fetch_tweets", lambda count, base_query, **kwargs: feeds[base_query]
+    )
+    results = profiles.run_profiles(profiles.load_profiles(write_config(tmp_path)))
+    # Nothing to publish is not an error, a failed fetch is
+    assert results == {"ai": True, "web3": False}
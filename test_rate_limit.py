@@ -0,0 +1,183 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import fetcher
+import http_client
+from metrics import metrics
+from rate_limit import RequestScheduler, TokenBucket, parse_rate_limit
+from synthetic import make_cursor_entry, make_page, make_tweet_entry
+
+
+class MockRateLimitedServer:
+    """
+    Search endpoint enforcing a per-key quota and a per-key requests per second
+    limit like RapidAPI, with quota headers on every response
+    """
+
+    def __init__(self, quotas, per_second=None, fail_first=0, pages=4):
+        self.quotas = dict(quotas)  # key -> remaining requests
+        self.per_second = per_second
+        self.fail_first = fail_first  # Requests answered with 503 first
+        self.pages = pages
+        self.requests = []  # (key, status)
+        self.windows = {}  # key -> (second, count)
+        self.lock = threading.Lock()
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                key = self.headers.get("x-rapidapi-key")
+                cursor = int(
+                    parse_qs(urlparse(self.path).query).get("cursor", ["0"])[0]
+                )
+                status, headers = mock.admit(key)
+                body = b'{"message": "error"}'
+                if status == 200:
+                    entries = [make_tweet_entry(f"{cursor}{i}") for i in range(3)]
+                    if cursor + 1 < mock.pages:
+                        entries.append(make_cursor_entry(str(cursor + 1)))
+                    body = json.dumps(make_page(entries)).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/search-v3"
+
+    def admit(self, key):
+        with self.lock:
+            if key not in self.quotas:
+                status, headers = 403, {}
+            elif self.fail_first > 0:
+                self.fail_first -= 1
+                status, headers = 503, {}
+            else:
+                second = int(time.monotonic())
+                window, count = self.windows.get(key, (second, 0))
+                count = count + 1 if window == second else 1
+                self.windows[key] = (second, count)
+                if self.quotas[key] <= 0:
+                    status = 429
+                elif self.per_second and count > self.per_second:
+                    status = 429
+                else:
+                    self.quotas[key] -= 1
+                    status = 200
+                headers = {
+                    "X-RateLimit-Requests-Limit": "100",
+                    "X-RateLimit-Requests-Remaining": str(self.quotas[key]),
+                    "X-RateLimit-Requests-Reset": "3600",
+                }
+                if status == 429 and self.quotas[key] > 0:
+                    headers["Retry-After"] = "1"
+            self.requests.append((key, status))
+            return status, headers
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_token_bucket_paces_after_burst():
+    now = [0.0]
+    bucket = TokenBucket(rate=2, capacity=3, clock=lambda: now[0])
+    waits = [bucket.reserve() for _ in range(5)]
+    assert waits == [0.0, 0.0, 0.0, 0.5, 1.0]
+    now[0] = 10.0
+    assert bucket.delay() == 0.0
+    bucket.hold(2.0)
+    assert bucket.delay() == 2.0
+
+
+def test_parse_rate_limit_takes_the_tightest_window():
+    headers = {
+        "X-RateLimit-Requests-Remaining": "40",
+        "X-RateLimit-Requests-Reset": "3600",
+        "X-RateLimit-rapid-free-plans-hard-limit-Remaining": "3",
+        "X-RateLimit-rapid-free-plans-hard-limit-Reset": "120",
+    }
+    assert parse_rate_limit(headers) == (3, 120.0)
+    assert parse_rate_limit({}) == (None, None)
+
+
+def test_scheduler_rotates_keys_when_quota_runs_out(monkeypatch):
+    monkeypatch.setattr(http_client, "_session", None)
+    with MockRateLimitedServer({"key-a": 2, "key-b": 10}, pages=4) as server:
+        scheduler = RequestScheduler(
+            ["bad-key", "key-a", "key-b"], rate=100, backoff=0.01
+        )
+        tweets = fetcher.fetch_query(
+            fetcher.get_session(), "(a)", 100, url=server.url, scheduler=scheduler
+        )
+
+    assert len(tweets) == 12
+    # The rejected key is dropped, key-a is parked once its quota headers hit 0
+    # and the remaining pages go to key-b without a single 429
+    assert server.requests[0] == ("bad-key", 403)
+    assert [status for _, status in server.requests[1:]] == [200] * 4
+    assert [key for key, _ in server.requests[1:]] == ["key-a"] * 2 + ["key-b"] * 2
+    assert [key.remaining for key in scheduler.keys] == [None, 0, 8]
+
+
+def test_scheduler_retries_throttling_and_server_errors(monkeypatch):
+    monkeypatch.setattr(http_client, "_session", None)
+    with MockRateLimitedServer(
+        {"key-a": 100}, per_second=2, fail_first=2, pages=5
+    ) as server:
+        # Allow bursts above the server's limit, so 429s have to be handled
+        scheduler = RequestScheduler(["key-a"], rate=50, backoff=0.01)
+        tweets = fetcher.fetch_query(
+            fetcher.get_session(), "(a)", 100, url=server.url, scheduler=scheduler
+        )
+
+    assert len(tweets) == 15
+    statuses = [status for _, status in server.requests]
+    assert statuses[:2] == [503, 503]
+    assert 429 in statuses
+    assert statuses.count(200) == 5
+
+
+def test_exhausted_keys_fail_fast(monkeypatch):
+    monkeypatch.setattr(http_client, "_session", None)
+    with MockRateLimitedServer({"key-a": 0}) as server:
+        scheduler = RequestScheduler(["key-a"], rate=100, max_wait=5)
+        start = time.perf_counter()
+        response = fetcher.fetch_page(
+            fetcher.get_session(), "(a)", url=server.url, scheduler=scheduler
+        )
+        elapsed = time.perf_counter() - start
+
+    # The quota resets in an hour, far beyond the wait limit
+    assert response is None
+    assert server.requests == [("key-a", 429)]
+    assert elapsed < 1
+
+
+def test_rejected_only_key_returns_its_response(monkeypatch):
+    monkeypatch.setattr(http_client, "_session", None)
+    metrics.reset()
+    with MockRateLimitedServer({}) as server:
+        scheduler = RequestScheduler(["bad-key"], rate=100)
+        response = scheduler.request(fetcher.get_session(), server.url)
+
+    # The 403 is handed back instead of being replaced by "no key available"
+    assert response.status_code == 403
+    assert server.requests == [("bad-key", 403)]
+    assert metrics.snapshot()["timers"]["http.latency"]["count"] == 1
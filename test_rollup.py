@@ -0,0 +1,129 @@
+import os
+import shutil
+from datetime import date
+
+import rollup
+import vault
+from delivery import DeliveryResult
+from renderer import render_markdown
+from vault import note_filename
+
+NOTES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "notes")
+
+
+def write_note(vault_dir, day, tweets):
+    items = [
+        (tweet, f"译文 {tweet['url']}", tweet.get("images", [])) for tweet in tweets
+    ]
+    with open(os.path.join(vault_dir, note_filename(day)), "w", encoding="utf-8") as f:
+        render_markdown(items, f, day)
+
+
+def tweet(rest_id, likes, images=()):
+    return {
+        "author": f"user{rest_id}",
+        "text": f"tweet {rest_id}",
+        "likes": likes,
+        "date": "2026-05-04 10:00:00",
+        "url": f"https://twitter.com/user{rest_id}/status/{rest_id}",
+        "images": list(images),
+    }
+
+
+def test_period_bounds():
+    assert rollup.period_bounds("weekly", date(2026, 1, 1)) == (
+        date(2025, 12, 29),
+        date(2026, 1, 4),
+        "2026-W01",
+    )
+    assert rollup.period_bounds("monthly", date(2026, 2, 14)) == (
+        date(2026, 2, 1),
+        date(2026, 2, 28),
+        "2026-02",
+    )
+
+
+def test_weekly_rollup_merges_days_and_reuses_summaries(tmp_path):
+    (tmp_path / "images").mkdir()
+    (tmp_path / "images" / "img_a.jpg").write_bytes(b"a")
+    write_note(tmp_path, "2026-05-03", [tweet(99, 10**6)])  # Previous week
+    write_note(tmp_path, "2026-05-04", [tweet(1, 500), tweet(2, 300), tweet(3, 50)])
+    write_note(
+        tmp_path,
+        "2026-05-05",
+        [tweet(1, 800, ["images/img_a.jpg"]), tweet(4, 400), tweet(5, 10)],
+    )
+
+    summaries = rollup.DaySummaries(str(tmp_path))
+    result = rollup.build_rollup(
+        str(tmp_path), "weekly", date(2026, 5, 6), 3, summaries
+    )
+
+    assert result.filename == "2026-W19-Weekly-Pulse.md"
+    # The repeated tweet is kept once, with the day it had the most likes
+    assert [(r["id"], r["likes"]) for r in result.records] == [
+        ("1", 800),
+        ("4", 400),
+        ("2", 300),
+    ]
+    assert result.local_images == [str(tmp_path / "images" / "img_a.jpg")]
+    assert result.markdown.startswith(
+        "# Weekly Pulse - 2026-W19 (2026-05-04 ~ 2026-05-10)\n\n### [user1]"
+    )
+    # The rollup is a regular digest, readable with the daily note parser
+    assert vault.parse_note(result.markdown) == result.records
+    assert summaries.parsed == 2
+
+    # Unchanged notes come from the summary file
+    again = rollup.DaySummaries(str(tmp_path))
+    assert rollup.build_rollup(str(tmp_path), "weekly", date(2026, 5, 6), 3, again)
+    assert again.parsed == 0
+
+    write_note(tmp_path, "2026-05-04", [tweet(6, 5000)])
+    again = rollup.DaySummaries(str(tmp_path))
+    result = rollup.build_rollup(str(tmp_path), "weekly", date(2026, 5, 6), 3, again)
+    assert again.parsed == 1
+    assert [r["id"] for r in result.records] == ["6", "1", "4"]
+
+
+def test_top_tweets_matches_full_sort(tmp_path):
+    for name in sorted(os.listdir(NOTES_DIR))[:20]:
+        shutil.copy(os.path.join(NOTES_DIR, name), tmp_path / name)
+    names = list(vault.iter_note_files(str(tmp_path)))
+    summaries = rollup.DaySummaries(str(tmp_path))
+
+    merged = rollup.top_tweets([summaries.top(name, 15) for name in names], 15)
+
+    best = {}
+    for name in names:
+        for record in vault.read_note(str(tmp_path), name):
+            key = record["id"] or record["url"]
+            if key not in best or record["likes"] > best[key]["likes"]:
+                best[key] = record
+    expected = sorted(best.values(), key=lambda r: r["likes"], reverse=True)[:15]
+    assert [r["likes"] for r in merged] == [r["likes"] for r in expected]
+    assert len({r["url"] for r in merged}) == 15
+
+
+def test_main_fails_when_any_recipient_is_not_delivered(monkeypatch, tmp_path):
+    monkeypatch.setenv("OBSIDIAN_DIR", str(tmp_path))
+    monkeypatch.setenv("RECEIVER_EMAIL", "a@x.com,b@x.com")
+    write_note(tmp_path, "2026-05-04", [tweet(1, 500)])
+    outcomes = {
+        "a@x.com": DeliveryResult("a@x.com", True),
+        "b@x.com": DeliveryResult("b@x.com", False, "550 no such user"),
+    }
+    sent = []
+
+    def fake_send(*args, recipients=None, **kwargs):
+        sent.append(recipients)
+        return {r: outcomes[r] for r in recipients}
+
+    monkeypatch.setattr(rollup, "send_email", fake_send)
+    assert rollup.main(["weekly", "--date", "2026-05-06"]) == 1
+
+    # The rerun only resends to the recipient that was not reached
+    outcomes["b@x.com"] = DeliveryResult("b@x.com", True)
+    assert rollup.main(["weekly", "--date", "2026-05-06"]) == 0
+    assert rollup.main(["weekly", "--date", "2026-05-06"]) == 0
+    assert sent == [["a@x.com", "b@x.com"], ["b@x.com"]]
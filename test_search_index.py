@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import time
+
+import search_index
+from renderer import render_markdown
+from search_index import SearchIndex
+from vault import note_filename
+
+NOTES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "notes")
+
+
+def write_note(vault_dir, date, items):
+    path = os.path.join(vault_dir, note_filename(date))
+    with open(path, "w", encoding="utf-8") as f:
+        render_markdown(items, f, date)
+    return path
+
+
+def tweet(rest_id, author, text, likes, date):
+    return {
+        "author": author,
+        "text": text,
+        "likes": likes,
+        "date": f"{date} 10:00:00",
+        "url": f"https://twitter.com/{author}/status/{rest_id}",
+    }
+
+
+def test_search_index_queries_text_translation_and_filters(tmp_path, capsys):
+    write_note(
+        tmp_path,
+        "2026-05-01",
+        [
+            (
+                tweet(1, "alice", "Nvidia ships a new AI chip", 5000, "2026-05-01"),
+                "英伟达发布新的人工智能芯片",
+                ["images/img_a.jpg"],
+            ),
+            (
+                tweet(2, "Bob", "Stock market rallies", 900, "2026-05-01"),
+                "股市上涨",
+                [],
+            ),
+        ],
+    )
+    write_note(
+        tmp_path,
+        "2026-05-02",
+        [
+            (
+                tweet(
+                    3, "carol", "Chipmakers and the stock market", 20000, "2026-05-02"
+                ),
+                "芯片制造商与股市",
+                [],
+            )
+        ],
+    )
+    index = SearchIndex(str(tmp_path))
+    assert index.update() == (2, 0)
+
+    [hit] = index.search("nvidia")
+    assert hit["id"] == "1" and hit["author"] == "alice"
+    assert hit["translated"] == "英伟达发布新的人工智能芯片"
+    assert hit["images"] == ["images/img_a.jpg"]
+    assert hit["note"] == note_filename("2026-05-01")
+
+    assert {r["id"] for r in index.search("芯片")} == {"1", "3"}
+    assert {r["id"] for r in index.search('"stock market"')} == {"2", "3"}
+    assert {r["id"] for r in index.search("chip*")} == {"1", "3"}
+    assert [r["id"] for r in index.search("股市", order="likes")] == ["3", "2"]
+    assert [r["id"] for r in index.search(author="@bob")] == ["2"]
+    assert [r["id"] for r in index.search(min_likes=1000, order="likes")] == ["3", "1"]
+    assert {r["id"] for r in index.search(until="2026-05-01")} == {"1", "2"}
+    assert [r["id"] for r in index.search(since="2026-05-02")] == ["3"]
+    assert index.search("nothing-like-this") == []
+    index.close()
+
+    # Each shell argument is one phrase; a lone quoted argument is a query
+    def ids(*argv):
+        search_index.main(list(argv) + ["--vault", str(tmp_path), "--json"])
+        return {json.loads(line)["id"] for line in capsys.readouterr().out.splitlines()}
+
+    assert ids("stock market") == {"2", "3"}
+    assert ids("market stock") == set()
+    assert ids("market", "stock") == {"2", "3"}
+    assert ids('"stock market" chipmakers') == {"3"}
+
+
+def test_search_index_updates_incrementally(monkeypatch, tmp_path):
+    for name in sorted(os.listdir(NOTES_DIR))[:5]:
+        shutil.copy(os.path.join(NOTES_DIR, name), tmp_path / name)
+    notes = sorted(os.listdir(tmp_path))
+    index = SearchIndex(str(tmp_path))
+    assert index.update() == (5, 0)
+    total = len(index.search(limit=10000))
+    assert total > 0
+
+    parsed = []
+    monkeypatch.setattr(
+        search_index, "parse_note", lambda content: parsed.append(1) or []
+    )
+    # Touched but unchanged notes are hashed, not reparsed
+    os.utime(tmp_path / notes[0], (time.time() + 10, time.time() + 10))
+    assert index.update() == (0, 0)
+    assert index.update() == (0, 0)
+    assert parsed == []
+
+    # A changed note is reparsed, a deleted one is dropped
+    with open(tmp_path / notes[1], "a", encoding="utf-8") as f:
+        f.write("\n")
+    os.remove(tmp_path / notes[2])
+    assert index.update() == (1, 1)
+    assert parsed == [1]
+    remaining = index.search(limit=10000)
+    assert {r["note"] for r in remaining} == {notes[0], notes[3], notes[4]}
+    index.close()
@@ -0,0 +1,74 @@
+import os
+import shutil
+
+import vault
+from pipeline import generate_markdown
+from seen_index import SeenIndex, text_fingerprint
+
+NOTES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "notes")
+
+
+def test_parse_note_reads_back_generated_markdown(tmp_path):
+    tweets = [
+        {
+            "id": "1",
+            "author": "alice",
+            "text": "First line\n\nsecond line with @bob https://t.co/x",
+            "date": "2026-05-01 10:00:00",
+            "likes": 1200,
+            "url": "https://twitter.com/alice/status/1",
+            "images": [],
+        },
+        {
+            "id": "2",
+            "author": "carol",
+            "text": "Another tweet",
+            "date": "2026-05-01 11:00:00",
+            "likes": 900,
+            "url": "https://twitter.com/carol/status/2",
+            "images": [],
+        },
+    ]
+    md_content, _ = generate_markdown(tweets, str(tmp_path), ["第一行", "另一条"])
+
+    records = vault.parse_note(md_content)
+    assert [r["id"] for r in records] == ["1", "2"]
+    assert records[0]["text"] == tweets[0]["text"]
+    assert records[0]["translated"] == "第一行"
+    assert records[1]["likes"] == 900 and records[1]["author"] == "carol"
+
+
+def test_parse_note_handles_every_archived_note():
+    names = list(vault.iter_note_files(NOTES_DIR))
+    assert names
+    for name in names:
+        records = vault.read_note(NOTES_DIR, name)
+        assert records, name
+        assert all(r["id"] and r["author"] for r in records)
+        assert all(r["url"].endswith(r["id"]) for r in records)
+
+
+def test_seen_index_builds_from_notes_and_updates_incrementally(tmp_path):
+    names = list(vault.iter_note_files(NOTES_DIR))[-3:]
+    for name in names:
+        shutil.copy(os.path.join(NOTES_DIR, name), tmp_path)
+    published = vault.read_note(str(tmp_path), names[0])[0]
+
+    index = SeenIndex(str(tmp_path))
+    assert index.notes == set(names)
+    assert index.seen({"id": published["id"]})
+    # The note being regenerated does not count as already published
+    assert not index.seen({"id": published["id"]}, current_note=names[0])
+
+    repost = {"id": "new", "text": published["text"] + " https://t.co/other"}
+    if text_fingerprint(published["text"]):
+        assert index.seen(repost)
+
+    fresh = {"id": "999", "text": "something nobody has published yet at all"}
+    assert index.filter([fresh, {"id": published["id"]}]) == [fresh]
+    index.add([fresh], "2099-01-01-Daily-Pulse.md")
+
+    # Reloading only reads the index file, the notes are already covered
+    reloaded = SeenIndex(str(tmp_path))
+    assert reloaded.seen(fresh)
+    assert reloaded.ids == index.ids
@@ -0,0 +1,80 @@
+import hashlib
+import logging
+import time
+from typing import Optional
+
+from sqlite_cache import SqliteCache
+
+CACHE_NAME = ".translation_cache.sqlite"
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class TranslationCache(SqliteCache):
+    """
+    Persistent SQLite translation cache with an in-memory LRU in front of it
+    Entries are keyed by (sha256 of source text, target language)
+    """
+
+    table = "translations"
+    key_columns = ("key", "target")
+    value_column = "translated"
+
+    def __init__(
+        self,
+        path: str,
+        memory_size: int = 2048,
+        max_entries: int = 100000,
+        max_age_days: float = 365,
+    ):
+        super().__init__(path, memory_size, max_entries)
+        self.max_age_days = max_age_days
+        self.evict()
+
+    def schema(self):
+        return [
+            """
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT NOT NULL,
+                target TEXT NOT NULL,
+                translated TEXT NOT NULL,
+                created REAL NOT NULL,
+                used REAL NOT NULL,
+                PRIMARY KEY (key, target)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS translations_used ON translations (used)",
+        ]
+
+    def row(self, key, translated: str, now: float) -> tuple:
+        return (*key, translated, now, now)
+
+    def get(self, text: str, target: str) -> Optional[str]:
+        return self.lookup((text_key(text), target))
+
+    def set(self, text: str, target: str, translated: str):
+        self.store((text_key(text), target), translated)
+
+    def evict(self):
+        """
+        Drop entries unused for max_age_days, then the least recently used ones
+        beyond max_entries
+        """
+        self.flush()
+        cutoff = time.time() - self.max_age_days * 86400
+        with self._lock, self._db:
+            expired = self._db.execute(
+                "DELETE FROM translations WHERE used < ?", (cutoff,)
+            ).rowcount
+            overflow = self._db.execute(
+                """
+                DELETE FROM translations WHERE rowid IN (
+                    SELECT rowid FROM translations ORDER BY used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            ).rowcount
+        if expired or overflow:
+            logging.info(f"Evicted {expired + overflow} cached translations")
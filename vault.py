@@ -0,0 +1,98 @@
+import os
+import re
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+NOTE_SUFFIX = "-Daily-Pulse.md"
+# Daily notes, with an HHMM slot when the digest runs several times a day
+NOTE_NAME = re.compile(
+    r"^(\d{4}-\d{2}-\d{2})(?:-(\d{4}))?" + re.escape(NOTE_SUFFIX) + "$"
+)
+
+# One match per tweet section written by render_markdown
+TWEET_HEADER = re.compile(
+    r"^### \[(?P<author>[^\]]*)\]\((?P<url>[^)]*)\)\n\n"
+    r"\*\*发布时间:\*\* (?P<date>[^|\n]*?) \| ❤️ (?P<likes>-?\d+)\n\n",
+    re.M,
+)
+TRANSLATION_MARK = "\n\n> 🇨🇳 译文："
+LINK_MARK = "\n\n[🔗 查看原帖]("
+TRAILING_IMAGES = re.compile(r"(?:\n\n!\[Image\]\([^)\n]*\))+$")
+IMAGE_REF = re.compile(r"!\[Image\]\(([^)\n]*)\)")
+STATUS_ID = re.compile(r"/status/(\d+)")
+
+
+def run_id(date: Optional[str] = None, slot: Optional[str] = None) -> str:
+    """
+    Date (YYYY-MM-DD), today by default, followed by the HH:MM slot if any
+    """
+    date = date or datetime.now().strftime("%Y-%m-%d")
+    return f"{date}-{slot.replace(':', '')}" if slot else date
+
+
+def note_filename(date: Optional[str] = None, slot: Optional[str] = None) -> str:
+    """
+    Name of the daily note for date (YYYY-MM-DD), today by default
+    A slot (HH:MM) gives each of several runs a day its own note
+    """
+    return f"{run_id(date, slot)}{NOTE_SUFFIX}"
+
+
+def iter_note_files(obsidian_dir: str) -> Iterator[str]:
+    """
+    Yield the daily note filenames in the vault, oldest first
+    """
+    try:
+        names = os.listdir(obsidian_dir)
+    except FileNotFoundError:
+        return
+    yield from sorted(name for name in names if NOTE_NAME.match(name))
+
+
+def tweet_id_from_url(url: str) -> str:
+    match = STATUS_ID.search(url or "")
+    return match.group(1) if match else ""
+
+
+def parse_note(content: str) -> List[Dict]:
+    """
+    Parse a digest written by render_markdown back into per-tweet records
+    """
+    headers = list(TWEET_HEADER.finditer(content))
+    records = []
+    for idx, header in enumerate(headers):
+        end = headers[idx + 1].start() if idx + 1 < len(headers) else len(content)
+        body = content[header.end() : end]
+        # Drop the link line and the separator that close the section
+        link_at = body.rfind(LINK_MARK)
+        if link_at != -1:
+            body = body[:link_at]
+
+        text, _, translated = body.partition(TRANSLATION_MARK)
+        if text.startswith("> "):
+            text = text[2:]
+        images_block = TRAILING_IMAGES.search(translated)
+        images = []
+        if images_block:
+            images = IMAGE_REF.findall(images_block.group(0))
+            translated = translated[: images_block.start()]
+
+        url = header.group("url")
+        records.append(
+            {
+                "id": tweet_id_from_url(url),
+                "author": header.group("author"),
+                "url": url,
+                "date": header.group("date"),
+                "likes": int(header.group("likes")),
+                "text": text,
+                "translated": translated,
+                "images": images,
+            }
+        )
+    return records
+
+
+def read_note(obsidian_dir: str, filename: str) -> List[Dict]:
+    with open(os.path.join(obsidian_dir, filename), "r", encoding="utf-8") as f:
+        return parse_note(f.read())